@@ -0,0 +1,204 @@
+"""
+R2 客户端注册表
+
+boto3.client(...) 每次创建都要新建 session、解析 endpoint、加载凭据并建立新的连接池，
+在任何 R2 请求之前就要花费 100ms 以上。这里按 (endpoint, access key, 密钥摘要, bucket)
+缓存已创建的客户端，浏览和下载复用同一个客户端的长连接。
+
+- 客户端创建超过 TTL 后重新创建（凭据轮换、endpoint 变化后不会一直使用旧连接）
+- 后台线程定期关闭空闲超时的客户端，释放连接池
+- boto3 客户端本身是线程安全的，但创建客户端用到的 Session 不是，创建过程串行执行
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+from botocore.config import Config
+
+# 每个客户端的连接池大小（并发下载/分片上传时需要足够的连接）
+R2_MAX_POOL_CONNECTIONS = int(os.environ.get('R2_MAX_POOL_CONNECTIONS', 32))
+
+# 客户端的最长使用时间和空闲超时（秒）
+R2_CLIENT_TTL = int(os.environ.get('R2_CLIENT_TTL', 3600))
+R2_CLIENT_IDLE_TIMEOUT = int(os.environ.get('R2_CLIENT_IDLE_TIMEOUT', 300))
+
+# 最多缓存的客户端数
+R2_MAX_CLIENTS = int(os.environ.get('R2_MAX_CLIENTS', 32))
+
+
+def make_client_config(max_pool_connections=R2_MAX_POOL_CONNECTIONS):
+    """Cloudflare R2 使用的客户端配置：SigV4、较大的连接池、TCP keep-alive"""
+    return Config(
+        signature_version='s3v4',
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        retries={'max_attempts': 5, 'mode': 'standard'}
+    )
+
+
+class _ClientEntry:
+    def __init__(self, client):
+        self.client = client
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+
+class ClientRegistry:
+    """线程安全的 S3 客户端缓存，支持 TTL 和空闲回收"""
+
+    def __init__(self, ttl=R2_CLIENT_TTL, idle_timeout=R2_CLIENT_IDLE_TIMEOUT,
+                 max_clients=R2_MAX_CLIENTS, max_pool_connections=R2_MAX_POOL_CONNECTIONS):
+        """
+        初始化 ClientRegistry
+
+        Args:
+            ttl: 客户端创建后的最长使用时间（秒）
+            idle_timeout: 空闲超过该时间的客户端由后台线程关闭（秒）
+            max_clients: 最多缓存的客户端数，超出后按最近使用时间淘汰
+            max_pool_connections: 每个客户端的连接池大小
+        """
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.max_pool_connections = max_pool_connections
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.reaped = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _make_key(endpoint_url, aws_access_key_id, aws_secret_access_key, bucket):
+        # 只保存密钥的摘要，同一 access key 换了密钥时使用新的客户端
+        secret_digest = hashlib.sha256((aws_secret_access_key or '').encode('utf-8')).hexdigest()
+        return endpoint_url, aws_access_key_id, secret_digest, bucket
+
+    def get(self, endpoint_url, aws_access_key_id, aws_secret_access_key, bucket=None):
+        """
+        获取（必要时创建）客户端
+
+        Args:
+            endpoint_url: R2 endpoint
+            aws_access_key_id: Access Key ID
+            aws_secret_access_key: Secret Access Key
+            bucket: 存储桶名称
+
+        Returns:
+            boto3 S3 客户端
+        """
+        key = self._make_key(endpoint_url, aws_access_key_id, aws_secret_access_key, bucket)
+        now = time.time()
+        stale = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at < self.ttl:
+                entry.last_used = now
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.client
+            if entry is not None:
+                # 超过 TTL，重新创建
+                stale.append(self._entries.pop(key))
+                self.expired += 1
+            self.misses += 1
+        self._close_all(stale)
+
+        with self._create_lock:
+            with self._lock:
+                # 其他线程可能已经创建好
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.last_used = time.time()
+                    return entry.client
+            client = boto3.session.Session().client(
+                's3',
+                endpoint_url=endpoint_url,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                region_name='auto',
+                config=make_client_config(self.max_pool_connections)
+            )
+            with self._lock:
+                self._entries[key] = _ClientEntry(client)
+                while len(self._entries) > self.max_clients:
+                    stale.append(self._entries.popitem(last=False)[1])
+                    self.evictions += 1
+        self._close_all(stale)
+        self._ensure_reaper()
+        return client
+
+    def reap_idle(self):
+        """关闭空闲超时和超过 TTL 的客户端"""
+        now = time.time()
+        with self._lock:
+            stale_keys = [key for key, entry in self._entries.items()
+                          if now - entry.last_used >= self.idle_timeout or
+                          now - entry.created_at >= self.ttl]
+            stale = [self._entries.pop(key) for key in stale_keys]
+            self.reaped += len(stale)
+        self._close_all(stale)
+
+    def clear(self):
+        """关闭并移除所有客户端"""
+        with self._lock:
+            stale = list(self._entries.values())
+            self._entries.clear()
+        self._close_all(stale)
+
+    def stats(self):
+        """统计信息"""
+        now = time.time()
+        with self._lock:
+            return {
+                'clients': len(self._entries),
+                'max_clients': self.max_clients,
+                'max_pool_connections': self.max_pool_connections,
+                'ttl': self.ttl,
+                'idle_timeout': self.idle_timeout,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'reaped': self.reaped,
+                'evictions': self.evictions,
+                'oldest_idle_seconds': round(max((now - entry.last_used
+                                                  for entry in self._entries.values()),
+                                                 default=0), 1)
+            }
+
+    def _ensure_reaper(self):
+        """第一次创建客户端时启动后台回收线程"""
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name='r2-client-reaper',
+                                            daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1, min(self.idle_timeout, self.ttl) / 2)
+        while True:
+            time.sleep(interval)
+            try:
+                self.reap_idle()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _close_all(entries):
+        for entry in entries:
+            try:
+                entry.client.close()
+            except Exception:
+                pass
+
+
+# 进程级共享注册表
+client_registry = ClientRegistry()
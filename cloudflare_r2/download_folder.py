@@ -1,50 +1,289 @@
-
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import boto3
-import os
+from boto3.s3.transfer import TransferConfig
+
+# Objects downloaded in parallel (each large object is also split into parts)
+DEFAULT_MAX_WORKERS = 8
+
+# Multipart settings for large objects
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 64 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+IO_CHUNKSIZE = 1024 * 1024
+
+# Sync state (ETag/size/mtime of every downloaded object), kept in local_dir
+MANIFEST_NAME = '.r2sync-manifest.json'
+MANIFEST_SAVE_INTERVAL = 10
+
+# Suffix of in-progress downloads; renamed into place only when complete
+TEMP_SUFFIX = '.r2tmp'
+
+PROGRESS_INTERVAL = 5
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def make_transfer_config(multipart_threshold=MULTIPART_THRESHOLD,
+                         multipart_chunksize=MULTIPART_CHUNKSIZE,
+                         max_concurrency=MULTIPART_CONCURRENCY):
+    """
+    Transfer settings for large objects: ranged parts fetched concurrently
+    """
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        io_chunksize=IO_CHUNKSIZE,
+        use_threads=True
+    )
+
+
+class _Manifest:
+    """
+    Records what has been downloaded, so an interrupted sync resumes where it stopped
+    """
+
+    def __init__(self, local_dir, name=MANIFEST_NAME):
+        self.path = os.path.join(local_dir, name)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        with self._lock:
+            return self.entries.get(key)
+
+    def record(self, key, etag, size, mtime_ns):
+        with self._lock:
+            self.entries[key] = {'etag': etag, 'size': size, 'mtime_ns': mtime_ns}
+            self._dirty = True
+            due = time.time() - self._saved_at >= MANIFEST_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        """Write atomically, so a crash never leaves a truncated manifest"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self.entries)
+                self._dirty = False
+                self._saved_at = time.time()
+            temp_path = self.path + TEMP_SUFFIX
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+
+
+def _is_up_to_date(obj, local_path, manifest):
+    """
+    Whether the local file already matches the object
+
+    A file matches when its size equals the object size and the manifest recorded
+    the same ETag for it (and the file was not touched since). Files without a
+    manifest entry are checked by _matches_md5 in the pool.
+    """
+    try:
+        stat = os.stat(local_path)
+    except OSError:
+        return False
+    if stat.st_size != obj['Size']:
+        return False
+    entry = manifest.get(obj['Key'])
+    if entry is not None:
+        return entry['etag'] == obj['ETag'] and entry['mtime_ns'] == stat.st_mtime_ns
+    return False
+
+
+def _matches_md5(obj, local_path, manifest):
+    """
+    Whether a same-size local file without a manifest entry has the object's content
 
-def download_folder(s3_client, bucket_name, folder_prefix, local_dir):
+    Only single-part objects can be checked: their ETag is the MD5 of the content.
+    Multipart ETags depend on the part size, so those files are downloaded again.
+    A match is recorded in the manifest, so the file is not hashed again.
+    """
+    etag = obj['ETag'].strip('"')
+    if '-' in etag:
+        return False
+    try:
+        stat = os.stat(local_path)
+        if stat.st_size != obj['Size']:
+            return False
+        md5 = hashlib.md5()
+        with open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                md5.update(block)
+    except OSError:
+        return False
+    if md5.hexdigest() != etag:
+        return False
+    manifest.record(obj['Key'], obj['ETag'], stat.st_size, stat.st_mtime_ns)
+    return True
+
+
+def _download_one(s3_client, bucket_name, obj, local_path, transfer_config, manifest):
+    """
+    Download into a temp file and rename it into place when complete
+
+    Returns:
+        Bytes downloaded, or None when the existing file already has the same MD5
+    """
+    if _matches_md5(obj, local_path, manifest):
+        return None
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    temp_path = local_path + TEMP_SUFFIX
+    try:
+        # s3transfer pins the parts of a multipart download to the ETag of the first response
+        s3_client.download_file(bucket_name, obj['Key'], temp_path, Config=transfer_config)
+        # Keep the object's modification time, so later runs can compare it
+        modified = obj['LastModified'].timestamp()
+        os.utime(temp_path, (modified, modified))
+        os.replace(temp_path, local_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    manifest.record(obj['Key'], obj['ETag'], obj['Size'], os.stat(local_path).st_mtime_ns)
+    return obj['Size']
+
+
+def download_folder(s3_client, bucket_name, folder_prefix, local_dir,
+                    max_workers=DEFAULT_MAX_WORKERS, transfer_config=None):
     """
     Download all objects in a folder from S3 to local directory
+
+    Objects are downloaded concurrently by a bounded thread pool, and large objects
+    are fetched in parallel parts. Files that already match (size plus ETag from the
+    sync manifest, or the MD5 of single-part objects) are skipped, so re-running after
+    an interruption only transfers what is missing or changed. Resuming works per
+    file: each file is written to a temp file and renamed into place, so a crash never
+    leaves a truncated file behind, and a partly downloaded file starts over.
+
+    The client's connection pool should allow max_workers * max_concurrency connections
+    (botocore Config(max_pool_connections=...)).
+
+    Returns:
+        Summary dict with counts of downloaded/skipped/failed objects, bytes and throughput
     """
     # Create local directory if it doesn't exist
     os.makedirs(local_dir, exist_ok=True)
-    
+    local_root = os.path.abspath(local_dir)
+    transfer_config = transfer_config or make_transfer_config()
+    manifest = _Manifest(local_dir)
+
+    summary = {
+        'downloaded': 0,
+        'skipped': 0,
+        'failed': 0,
+        'downloaded_bytes': 0,
+        'skipped_bytes': 0,
+        'errors': []
+    }
+    started = time.time()
+    last_report = started
+
+    def report(final=False):
+        elapsed = time.time() - started
+        mb = summary['downloaded_bytes'] / (1024 * 1024)
+        rate = mb / elapsed if elapsed > 0 else 0.0
+        prefix = 'Done' if final else 'Progress'
+        print(f"{prefix}: {summary['downloaded']} downloaded ({mb:.2f} MB), "
+              f"{summary['skipped']} skipped, {summary['failed']} failed, "
+              f"{elapsed:.1f}s, {rate:.2f} MB/s")
+
+    def collect(done):
+        for future in done:
+            obj = pending.pop(future)
+            key = obj['Key']
+            try:
+                downloaded = future.result()
+                if downloaded is None:
+                    summary['skipped'] += 1
+                    summary['skipped_bytes'] += obj['Size']
+                else:
+                    summary['downloaded_bytes'] += downloaded
+                    summary['downloaded'] += 1
+            except Exception as e:
+                summary['failed'] += 1
+                summary['errors'].append({'key': key, 'error': str(e)})
+                print(f"Failed: {key}: {e}")
+
+    pending = {}
     try:
-        # List all objects in the folder
-        paginator = s3_client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=bucket_name, Prefix=folder_prefix)
-        
-        downloaded_count = 0
-        total_size = 0
-        
-        for page in pages:
-            if 'Contents' in page:
-                for obj in page['Contents']:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='r2-download') as executor:
+            # List all objects in the folder
+            paginator = s3_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=bucket_name, Prefix=folder_prefix)
+
+            for page in pages:
+                for obj in page.get('Contents', []):
                     key = obj['Key']
-                    
+
                     # Skip folder objects (keys ending with '/')
                     if key.endswith('/'):
-                        print(f"Skipping folder object: {key}")
                         continue
-                    
+
                     # Create local file path
-                    local_path = os.path.join(local_dir, key)
-                    
-                    # Create subdirectories if needed
-                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                    
-                    # Download the file
-                    print(f"Downloading: {key} -> {local_path}")
-                    s3_client.download_file(bucket_name, key, local_path)
-                    
-                    downloaded_count += 1
-                    total_size += obj['Size']
-        
-        print(f"\nDownload completed!")
-        print(f"Downloaded {downloaded_count} files")
-        print(f"Total size: {total_size / (1024*1024):.2f} MB")
-        print(f"Files saved to: {os.path.abspath(local_dir)}")
-        
+                    local_path = os.path.abspath(os.path.join(local_dir, key))
+                    if not local_path.startswith(local_root + os.sep):
+                        print(f"Skipping key outside of {local_dir}: {key}")
+                        continue
+
+                    if _is_up_to_date(obj, local_path, manifest):
+                        summary['skipped'] += 1
+                        summary['skipped_bytes'] += obj['Size']
+                        continue
+
+                    # Bound the number of queued downloads, so listing millions of keys
+                    # does not build an unbounded backlog
+                    while len(pending) >= max_workers * 4:
+                        done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                        collect(done)
+                        if time.time() - last_report >= PROGRESS_INTERVAL:
+                            report()
+                            last_report = time.time()
+
+                    future = executor.submit(_download_one, s3_client, bucket_name, obj,
+                                             local_path, transfer_config, manifest)
+                    pending[future] = obj
+
+            while pending:
+                done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                collect(done)
+                if time.time() - last_report >= PROGRESS_INTERVAL:
+                    report()
+                    last_report = time.time()
+
     except Exception as e:
         print(f"Error downloading folder: {e}")
+        summary['errors'].append({'key': None, 'error': str(e)})
+    finally:
+        manifest.save()
+
+    elapsed = time.time() - started
+    summary['elapsed_seconds'] = round(elapsed, 2)
+    summary['throughput_mb_s'] = round(summary['downloaded_bytes'] / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0
+
+    print(f"\nDownload completed!")
+    report(final=True)
+    print(f"Skipped {summary['skipped']} up-to-date files "
+          f"({summary['skipped_bytes'] / (1024*1024):.2f} MB)")
+    print(f"Files saved to: {os.path.abspath(local_dir)}")
+    return summary
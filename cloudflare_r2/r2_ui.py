@@ -1,8 +1,13 @@
 from flask import Flask, render_template, request, jsonify, session
-import boto3
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import os
+import threading
+import time
+import uuid
+from client_registry import client_registry
+from upload_folder import DEFAULT_PART_SIZE, upload_folder
 
 app = Flask(__name__)
 app.secret_key = 'r2_ui_secret_key_2024'  # 用于session
@@ -39,6 +44,9 @@ def get_config():
     config = session.get('r2_config', {})
     return jsonify(config)
 
+# 每页最多返回的对象数（S3 ListObjectsV2 单次上限为 1000）
+LIST_PAGE_SIZE = 1000
+
 @app.route('/list_objects', methods=['POST'])
 def list_objects():
     try:
@@ -48,6 +56,9 @@ def list_objects():
         aws_secret_access_key = request.form.get('aws_secret_access_key')
         bucket = request.form.get('bucket')
         prefix = request.form.get('prefix', '')
+        # 上一页返回的 next_continuation_token，为空表示第一页
+        continuation_token = request.form.get('continuation_token')
+        max_keys = min(int(request.form.get('max_keys') or LIST_PAGE_SIZE), LIST_PAGE_SIZE)
         
         # 验证必需参数
         if not all([endpoint_url, aws_access_key_id, aws_secret_access_key, bucket]):
@@ -56,78 +67,60 @@ def list_objects():
                 'error': '请填写所有必需参数'
             })
         
-        # 创建S3客户端 - 为Cloudflare R2配置SigV4
-        s3_client = boto3.client('s3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name='auto',
-            config=boto3.session.Config(
-                signature_version='s3v4'
-            )
-        )
+        # 复用已缓存的S3客户端（SigV4、长连接池），避免每次请求重新建立连接
+        s3_client = client_registry.get(endpoint_url, aws_access_key_id,
+                                        aws_secret_access_key, bucket)
         
-        # 列出对象
-        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
+        # 按 '/' 分隔只列出当前层级：子文件夹由服务端归并为 CommonPrefixes，
+        # 不再下载子文件夹中的全部对象；超过一页时通过 ContinuationToken 继续
+        params = {
+            'Bucket': bucket,
+            'Prefix': prefix,
+            'Delimiter': '/',
+            'MaxKeys': max_keys
+        }
+        if continuation_token:
+            params['ContinuationToken'] = continuation_token
+        response = s3_client.list_objects_v2(**params)
         
-        # 检查是否超过1000个对象
         is_truncated = response.get('IsTruncated', False)
-        total_count = len(response.get('Contents', []))
+        next_token = response.get('NextContinuationToken') if is_truncated else None
         
-        # 处理结果
-        if 'Contents' in response:
-            objects = []
-            folders = set()
-            
-            for obj in response['Contents']:
-                key = obj['Key']
-                
-                # 跳过当前目录本身
-                if key == prefix:
-                    continue
-                
-                # 检查是否是文件夹（包含子路径）
-                if '/' in key[len(prefix):]:
-                    # 提取文件夹路径
-                    folder_path = prefix + key[len(prefix):].split('/')[0] + '/'
-                    
-                    if folder_path not in folders:
-                        folders.add(folder_path)
-                        objects.append({
-                            'key': folder_path,
-                            'name': folder_path.rstrip('/').split('/')[-1] + '/',
-                            'type': 'folder',
-                            'size': 0,
-                            'size_mb': 0,
-                            'last_modified': None
-                        })
-                else:
-                    # 文件
-                    objects.append({
-                        'key': obj['Key'],
-                        'name': obj['Key'].split('/')[-1],
-                        'type': 'file',
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat() if obj['LastModified'] else None,
-                        'size_mb': round(obj['Size'] / (1024 * 1024), 2)
-                    })
-            
-            return jsonify({
-                'success': True,
-                'count': len(objects),
-                'objects': objects,
-                'is_truncated': is_truncated,
-                'total_count': total_count
+        objects = []
+        for common_prefix in response.get('CommonPrefixes', []):
+            folder_path = common_prefix['Prefix']
+            objects.append({
+                'key': folder_path,
+                'name': folder_path.rstrip('/').split('/')[-1] + '/',
+                'type': 'folder',
+                'size': 0,
+                'size_mb': 0,
+                'last_modified': None
             })
-        else:
-            return jsonify({
-                'success': True,
-                'count': 0,
-                'objects': [],
-                'message': '未找到对象或存储桶为空',
-                'is_truncated': False,
-                'total_count': 0
+        
+        for obj in response.get('Contents', []):
+            # 跳过当前目录本身
+            if obj['Key'] == prefix:
+                continue
+            objects.append({
+                'key': obj['Key'],
+                'name': obj['Key'].split('/')[-1],
+                'type': 'file',
+                'size': obj['Size'],
+                'last_modified': obj['LastModified'].isoformat() if obj['LastModified'] else None,
+                'size_mb': round(obj['Size'] / (1024 * 1024), 2)
             })
+        
+        result = {
+            'success': True,
+            'count': len(objects),
+            'objects': objects,
+            'is_truncated': is_truncated,
+            'next_continuation_token': next_token
+        }
+        if not objects and not continuation_token:
+            result['message'] = '未找到对象或存储桶为空'
+        return jsonify(result)
             
     except Exception as e:
         return jsonify({
@@ -135,6 +128,33 @@ def list_objects():
             'error': str(e)
         })
 
+# 代理下载时每次从 R2 读取并写给客户端的块大小（默认 1MB，块越大 Python 层循环越少）
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('R2_DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# 为 1 时 /download_file 默认返回预签名 URL 的 302 跳转，浏览器直接从 R2 下载，数据不经过 Flask
+DOWNLOAD_REDIRECT = os.environ.get('R2_DOWNLOAD_REDIRECT', '0') in ('1', 'true')
+
+# 预签名 URL 的有效期（秒）
+PRESIGN_EXPIRES = int(os.environ.get('R2_PRESIGN_EXPIRES', 3600))
+
+def if_range_matches(if_range, response):
+    """
+    If-Range 是否与当前对象一致：带引号的值按 ETag 强比较（弱 ETag 不匹配），
+    其他值按 HTTP 日期与 LastModified 比较（精确到秒）
+    """
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == response.get('ETag')
+    last_modified = response.get('LastModified')
+    if last_modified is None:
+        return False
+    try:
+        date = parsedate_to_datetime(if_range)
+    except (TypeError, ValueError):
+        return False
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date == last_modified.replace(microsecond=0)
+
 @app.route('/download_file', methods=['POST', 'GET'])
 def download_file():
     try:
@@ -146,6 +166,7 @@ def download_file():
             bucket = request.form.get('bucket')
             key = request.form.get('key')
             download_type = request.form.get('type', 'file')
+            redirect_mode = request.form.get('redirect')
         else:  # GET
             endpoint_url = request.args.get('endpoint_url')
             aws_access_key_id = request.args.get('aws_access_key_id')
@@ -153,6 +174,7 @@ def download_file():
             bucket = request.args.get('bucket')
             key = request.args.get('key')
             download_type = request.args.get('type', 'file')
+            redirect_mode = request.args.get('redirect')
         
         # 验证必需参数
         if not all([endpoint_url, aws_access_key_id, aws_secret_access_key, bucket, key]):
@@ -161,16 +183,9 @@ def download_file():
                 'error': '缺少必需参数'
             })
         
-        # 创建S3客户端 - 为Cloudflare R2配置SigV4
-        s3_client = boto3.client('s3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name='auto',
-            config=boto3.session.Config(
-                signature_version='s3v4'
-            )
-        )
+        # 复用已缓存的S3客户端（SigV4、长连接池），避免每次请求重新建立连接
+        s3_client = client_registry.get(endpoint_url, aws_access_key_id,
+                                        aws_secret_access_key, bucket)
         
         # 下载单个文件
         try:
@@ -187,32 +202,79 @@ def download_file():
                 file_ext = filename.split('.')[-1] if '.' in filename else 'txt'
                 safe_filename = f"{file_hash}.{file_ext}"
             
+            from flask import Response, redirect, stream_with_context
+            
+            # 预签名跳转模式：签名在本地完成，不请求 R2；浏览器拿到 URL 后直接下载（同样支持 Range）
+            use_redirect = DOWNLOAD_REDIRECT if redirect_mode is None else redirect_mode in ('1', 'true')
+            if use_redirect:
+                url = s3_client.generate_presigned_url(
+                    'get_object',
+                    Params={
+                        'Bucket': bucket,
+                        'Key': key,
+                        'ResponseContentDisposition': f'attachment; filename="{safe_filename}"'
+                    },
+                    ExpiresIn=PRESIGN_EXPIRES
+                )
+                return redirect(url, code=302)
+            
+            # Range 请求原样转发给 R2，支持断点续传和多段并行下载
+            range_header = request.headers.get('Range')
+            if_range = request.headers.get('If-Range')
+            get_kwargs = {'Bucket': bucket, 'Key': key}
+            if range_header:
+                get_kwargs['Range'] = range_header
+            
             # 从S3获取对象
-            response = s3_client.get_object(Bucket=bucket, Key=key)
+            try:
+                response = s3_client.get_object(**get_kwargs)
+            except s3_client.exceptions.ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'InvalidRange':
+                    raise
+                # 请求的范围超出文件大小
+                size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+                return Response(status=416, headers={
+                    'Content-Range': f'bytes */{size}',
+                    'Accept-Ranges': 'bytes'
+                })
             
-            # 创建流式响应，让浏览器后台下载
-            from flask import Response, stream_with_context
+            # If-Range 与当前 ETag / Last-Modified 不一致（文件已变化）时返回完整文件
+            if range_header and if_range and not if_range_matches(if_range, response):
+                response['Body'].close()
+                response = s3_client.get_object(Bucket=bucket, Key=key)
             
+            # 创建流式响应，让浏览器后台下载
             def generate():
-                # 分块读取和传输文件内容
-                chunk_size = 8192  # 8KB chunks
+                # 按较大的块读取和传输文件内容
                 body = response['Body']
-                
-                while True:
-                    chunk = body.read(chunk_size)
-                    if not chunk:
-                        break
-                    yield chunk
+                try:
+                    for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                        yield chunk
+                finally:
+                    body.close()
+            
+            headers = {
+                'Content-Disposition': f'attachment; filename="{safe_filename}"',
+                'Content-Length': str(response.get('ContentLength', 0)),
+                'Accept-Ranges': 'bytes',
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # 禁用nginx缓冲
+            }
+            # ETag / Last-Modified 供客户端续传时通过 If-Range 校验文件未变化
+            if response.get('ETag'):
+                headers['ETag'] = response['ETag']
+            if response.get('LastModified'):
+                headers['Last-Modified'] = response['LastModified'].strftime('%a, %d %b %Y %H:%M:%S GMT')
+            status = 200
+            if response.get('ContentRange'):
+                status = 206
+                headers['Content-Range'] = response['ContentRange']
             
             return Response(
                 stream_with_context(generate()),
+                status=status,
                 mimetype=response.get('ContentType', 'application/octet-stream'),
-                headers={
-                    'Content-Disposition': f'attachment; filename="{safe_filename}"',
-                    'Content-Length': str(response.get('ContentLength', 0)),
-                    'Cache-Control': 'no-cache',
-                    'X-Accel-Buffering': 'no'  # 禁用nginx缓冲
-                }
+                headers=headers
             )
         except Exception as e:
             return jsonify({
@@ -226,5 +288,139 @@ def download_file():
             'error': str(e)
         })
 
+# 允许上传的本地根目录，local_dir 必须位于其中（相对路径相对于该目录）；未设置时禁用上传
+UPLOAD_ROOT = os.environ.get('R2_UPLOAD_ROOT')
+
+def resolve_upload_dir(local_dir):
+    """把 local_dir 解析到 UPLOAD_ROOT 下，解析符号链接后超出根目录时抛出 ValueError"""
+    if not UPLOAD_ROOT:
+        raise ValueError('未配置 R2_UPLOAD_ROOT，上传功能已禁用')
+    root = os.path.realpath(UPLOAD_ROOT)
+    path = os.path.realpath(os.path.join(root, local_dir))
+    if path != root and not path.startswith(root + os.sep):
+        raise ValueError(f'本地目录必须位于 {root} 下')
+    if not os.path.isdir(path):
+        raise ValueError(f'本地目录不存在: {local_dir}')
+    return path
+
+# 后台上传/预览任务：{task_id: (最新的进度摘要, 更新时间)}
+upload_tasks = {}
+upload_tasks_lock = threading.Lock()
+
+# 已结束的任务保留多久后移除（秒）
+UPLOAD_TASK_TTL = int(os.environ.get('R2_UPLOAD_TASK_TTL', 3600))
+
+def prune_upload_tasks():
+    """移除结束超过 UPLOAD_TASK_TTL 的任务（调用方持有 upload_tasks_lock）"""
+    now = time.time()
+    for task_id in [task_id for task_id, (summary, updated_at) in upload_tasks.items()
+                    if summary.get('status') in ('completed', 'failed') and
+                    now - updated_at >= UPLOAD_TASK_TTL]:
+        del upload_tasks[task_id]
+
+@app.route('/upload_folder', methods=['POST'])
+def upload_folder_route():
+    """
+    把服务器上的本地目录同步到 R2（并行分片上传，已存在且 size/ETag 一致的对象跳过）
+
+    在后台线程执行并返回 task_id，通过 /upload_status/<task_id> 查询进度；
+    dry_run=1 时只比较差异（首次需要计算本地文件的 MD5，大目录耗时较长），结束后摘要的 plan 为需要上传的文件；
+    正式上传只保留需要上传的文件数和字节数
+    """
+    try:
+        endpoint_url = request.form.get('endpoint_url')
+        aws_access_key_id = request.form.get('aws_access_key_id')
+        aws_secret_access_key = request.form.get('aws_secret_access_key')
+        bucket = request.form.get('bucket')
+        local_dir = request.form.get('local_dir')
+        prefix = request.form.get('upload_prefix', '')
+        dry_run = request.form.get('dry_run') in ('1', 'true', 'on')
+        part_size = int(float(request.form.get('part_size_mb') or DEFAULT_PART_SIZE / (1024 * 1024)) * 1024 * 1024)
+        max_workers = int(request.form.get('max_workers') or 8)
+        max_concurrency = int(request.form.get('max_concurrency') or 4)
+        
+        # 验证必需参数
+        if not all([endpoint_url, aws_access_key_id, aws_secret_access_key, bucket, local_dir]):
+            return jsonify({
+                'success': False,
+                'error': '缺少必需参数'
+            })
+        try:
+            local_dir = resolve_upload_dir(local_dir)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            })
+        # S3 分片最小 5MB
+        if part_size < 5 * 1024 * 1024:
+            return jsonify({
+                'success': False,
+                'error': '分片大小不能小于 5MB'
+            })
+        
+        s3_client = client_registry.get(endpoint_url, aws_access_key_id,
+                                        aws_secret_access_key, bucket)
+        options = {
+            'folder_prefix': prefix,
+            'max_workers': max_workers,
+            'part_size': part_size,
+            'max_concurrency': max_concurrency
+        }
+        
+        task_id = uuid.uuid4().hex
+        
+        def progress(summary):
+            with upload_tasks_lock:
+                upload_tasks[task_id] = (summary, time.time())
+        
+        def run():
+            try:
+                upload_folder(s3_client, bucket, local_dir, dry_run=dry_run,
+                              progress=progress, **options)
+            except Exception as e:
+                with upload_tasks_lock:
+                    summary = upload_tasks.get(task_id, ({}, 0))[0]
+                    upload_tasks[task_id] = (dict(summary, status='failed', error=str(e)), time.time())
+        
+        with upload_tasks_lock:
+            prune_upload_tasks()
+        progress({'status': 'listing', 'dry_run': dry_run})
+        threading.Thread(target=run, name=f'r2-upload-{task_id[:8]}', daemon=True).start()
+        return jsonify({
+            'success': True,
+            'task_id': task_id
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/upload_status/<task_id>', methods=['GET'])
+def upload_status(task_id):
+    """后台上传任务的进度"""
+    with upload_tasks_lock:
+        prune_upload_tasks()
+        entry = upload_tasks.get(task_id)
+    if entry is None:
+        return jsonify({
+            'success': False,
+            'error': '任务不存在或已过期'
+        })
+    return jsonify({
+        'success': True,
+        'data': entry[0]
+    })
+
+@app.route('/client_stats', methods=['GET'])
+def client_stats():
+    """S3客户端缓存的命中情况"""
+    return jsonify({
+        'success': True,
+        'data': client_registry.stats()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,91 @@
+import datetime
+import hashlib
+import io
+import os
+
+import boto3
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from download_folder import MANIFEST_NAME, download_folder
+
+BUCKET = 'bucket'
+MODIFIED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_client():
+    return boto3.client('s3', region_name='auto', endpoint_url='https://example.r2.cloudflarestorage.com',
+                        aws_access_key_id='key', aws_secret_access_key='secret')
+
+
+def listing(objects):
+    return {
+        'IsTruncated': False,
+        'KeyCount': len(objects),
+        'Contents': [{'Key': key, 'Size': len(data), 'ETag': f'"etag-{key}"', 'LastModified': MODIFIED}
+                     for key, data in objects.items()]
+    }
+
+
+def stub_download(stubber, key, data):
+    stubber.add_response('head_object', {'ContentLength': len(data), 'ETag': f'"etag-{key}"',
+                                         'LastModified': MODIFIED},
+                         {'Bucket': BUCKET, 'Key': key})
+    stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(data), len(data)),
+                                        'ContentLength': len(data), 'ETag': f'"etag-{key}"'},
+                         {'Bucket': BUCKET, 'Key': key})
+
+
+def test_download_folder_downloads_then_skips(tmp_path):
+    objects = {'raw/a.txt': b'aaa', 'raw/sub/b.txt': b'bbbb'}
+    client = make_client()
+
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', listing(objects), {'Bucket': BUCKET, 'Prefix': 'raw'})
+        for key, data in objects.items():
+            stub_download(stubber, key, data)
+        summary = download_folder(client, BUCKET, 'raw', str(tmp_path), max_workers=1)
+        stubber.assert_no_pending_responses()
+
+    assert summary['failed'] == 0, summary['errors']
+    assert summary['downloaded'] == 2
+    assert summary['downloaded_bytes'] == 7
+    for key, data in objects.items():
+        assert (tmp_path / key).read_bytes() == data
+        assert os.path.getmtime(tmp_path / key) == MODIFIED.timestamp()
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+    # A second run only lists: everything matches the manifest
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', listing(objects), {'Bucket': BUCKET, 'Prefix': 'raw'})
+        summary = download_folder(client, BUCKET, 'raw', str(tmp_path), max_workers=1)
+        stubber.assert_no_pending_responses()
+
+    assert summary['downloaded'] == 0
+    assert summary['skipped'] == 2
+
+
+def test_download_folder_checks_md5_without_manifest(tmp_path):
+    objects = {'raw/same.txt': b'same', 'raw/diff.txt': b'newer', 'raw/multi.txt': b'multi'}
+    etags = {'raw/same.txt': hashlib.md5(b'same').hexdigest(),
+             'raw/diff.txt': hashlib.md5(b'newer').hexdigest(),
+             'raw/multi.txt': 'ffffffffffffffffffffffffffffffff-2'}
+    # Same sizes as the objects, written after them, but no manifest
+    for key, data in {'raw/same.txt': b'same', 'raw/diff.txt': b'older', 'raw/multi.txt': b'multi'}.items():
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(data)
+    page = listing(objects)
+    for item in page['Contents']:
+        item['ETag'] = f'"{etags[item["Key"]]}"'
+    client = make_client()
+
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', page, {'Bucket': BUCKET, 'Prefix': 'raw'})
+        for key in ('raw/diff.txt', 'raw/multi.txt'):
+            stub_download(stubber, key, objects[key])
+        summary = download_folder(client, BUCKET, 'raw', str(tmp_path), max_workers=1)
+        stubber.assert_no_pending_responses()
+
+    assert summary['failed'] == 0, summary['errors']
+    assert (summary['downloaded'], summary['skipped']) == (2, 1)
+    assert (tmp_path / 'raw/diff.txt').read_bytes() == b'newer'
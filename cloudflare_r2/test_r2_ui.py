@@ -0,0 +1,93 @@
+import datetime
+import io
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+import r2_ui
+
+BUCKET = 'bucket'
+KEY = 'raw/a.txt'
+DATA = b'0123456789'
+ETAG = '"etag-a"'
+MODIFIED = datetime.datetime(2024, 1, 1, 12, 30, 15, tzinfo=datetime.timezone.utc)
+MODIFIED_HTTP = 'Mon, 01 Jan 2024 12:30:15 GMT'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    s3_client = boto3.client('s3', region_name='auto', endpoint_url='https://example.r2.cloudflarestorage.com',
+                             aws_access_key_id='key', aws_secret_access_key='secret')
+    monkeypatch.setattr(r2_ui.client_registry, 'get', lambda *args: s3_client)
+    with Stubber(s3_client) as stubber:
+        yield r2_ui.app.test_client(), stubber
+        stubber.assert_no_pending_responses()
+
+
+def download(test_client, headers=None, **params):
+    query = dict(endpoint_url='https://example.r2.cloudflarestorage.com', aws_access_key_id='key',
+                 aws_secret_access_key='secret', bucket=BUCKET, key=KEY, redirect='0')
+    query.update(params)
+    return test_client.get('/download_file', query_string=query, headers=headers or {})
+
+
+def stub_get(stubber, start=None, end=None):
+    data = DATA if start is None else DATA[start:end + 1]
+    response = {'Body': StreamingBody(io.BytesIO(data), len(data)), 'ContentLength': len(data),
+                'ETag': ETAG, 'LastModified': MODIFIED}
+    params = {'Bucket': BUCKET, 'Key': KEY}
+    if start is not None:
+        response['ContentRange'] = f'bytes {start}-{end}/{len(DATA)}'
+        params['Range'] = f'bytes={start}-{end}'
+    stubber.add_response('get_object', response, params)
+
+
+def test_range_returns_206(client):
+    test_client, stubber = client
+    stub_get(stubber, 2, 5)
+    response = download(test_client, {'Range': 'bytes=2-5'})
+    assert response.status_code == 206
+    assert response.data == b'2345'
+    assert response.headers['Content-Range'] == 'bytes 2-5/10'
+    assert response.headers['ETag'] == ETAG
+    assert response.headers['Last-Modified'] == MODIFIED_HTTP
+
+
+def test_unsatisfiable_range_returns_416(client):
+    test_client, stubber = client
+    stubber.add_client_error('get_object', service_error_code='InvalidRange', http_status_code=416,
+                             expected_params={'Bucket': BUCKET, 'Key': KEY, 'Range': 'bytes=20-'})
+    stubber.add_response('head_object', {'ContentLength': len(DATA)}, {'Bucket': BUCKET, 'Key': KEY})
+    response = download(test_client, {'Range': 'bytes=20-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */10'
+
+
+@pytest.mark.parametrize('if_range', [ETAG, MODIFIED_HTTP])
+def test_matching_if_range_keeps_range(client, if_range):
+    test_client, stubber = client
+    stub_get(stubber, 2, 5)
+    response = download(test_client, {'Range': 'bytes=2-5', 'If-Range': if_range})
+    assert response.status_code == 206
+    assert response.data == b'2345'
+
+
+@pytest.mark.parametrize('if_range', ['"etag-old"', 'W/"etag-a"', 'Sun, 31 Dec 2023 12:30:15 GMT', 'garbage'])
+def test_stale_if_range_returns_full_file(client, if_range):
+    test_client, stubber = client
+    stub_get(stubber, 2, 5)
+    stub_get(stubber)
+    response = download(test_client, {'Range': 'bytes=2-5', 'If-Range': if_range})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_redirect_returns_presigned_url(client):
+    test_client, stubber = client
+    response = download(test_client, redirect='1')
+    assert response.status_code == 302
+    location = response.headers['Location']
+    assert location.startswith(f'https://example.r2.cloudflarestorage.com/{BUCKET}/{KEY}?')
+    assert 'X-Amz-Signature=' in location
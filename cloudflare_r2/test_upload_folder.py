@@ -0,0 +1,71 @@
+import datetime
+import hashlib
+
+import boto3
+from botocore.stub import ANY, Stubber
+
+import upload_folder as upload_module
+from upload_folder import ETAG_MANIFEST_NAME, upload_folder
+
+BUCKET = 'bucket'
+MODIFIED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_client():
+    return boto3.client('s3', region_name='auto', endpoint_url='https://example.r2.cloudflarestorage.com',
+                        aws_access_key_id='key', aws_secret_access_key='secret')
+
+
+def listing(objects):
+    return {
+        'IsTruncated': False,
+        'KeyCount': len(objects),
+        'Contents': [{'Key': key, 'Size': len(data), 'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+                      'LastModified': MODIFIED}
+                     for key, data in objects.items()]
+    }
+
+
+def test_upload_folder_hashes_only_touched_files(tmp_path, monkeypatch):
+    (tmp_path / 'a.txt').write_bytes(b'aaa')
+    (tmp_path / 'b.txt').write_bytes(b'bbbb')
+    remote = {'out/a.txt': b'aaa'}
+    client = make_client()
+
+    # First run: a.txt is hashed and matches, b.txt is new and uploaded
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', listing(remote), {'Bucket': BUCKET, 'Prefix': 'out/'})
+        stubber.add_response('put_object', {'ETag': f'"{hashlib.md5(b"bbbb").hexdigest()}"'},
+                             {'Bucket': BUCKET, 'Key': 'out/b.txt', 'Body': ANY, 'ChecksumAlgorithm': ANY})
+        stubber.add_response('head_object', {'ContentLength': 4, 'ETag': f'"{hashlib.md5(b"bbbb").hexdigest()}"'},
+                             {'Bucket': BUCKET, 'Key': 'out/b.txt'})
+        summary = upload_folder(client, BUCKET, str(tmp_path), 'out', max_workers=1)
+        stubber.assert_no_pending_responses()
+
+    assert summary['failed'] == 0, summary['errors']
+    assert (summary['skipped'], summary['uploaded'], summary['planned']) == (1, 1, 1)
+    assert summary['plan'] == []
+    assert (tmp_path / ETAG_MANIFEST_NAME).exists()
+
+    # Second run: both files match the manifest, nothing is hashed
+    remote['out/b.txt'] = b'bbbb'
+    hashed = []
+    real_local_etag = upload_module.local_etag
+    monkeypatch.setattr(upload_module, 'local_etag',
+                        lambda path, *args: hashed.append(path) or real_local_etag(path, *args))
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', listing(remote), {'Bucket': BUCKET, 'Prefix': 'out/'})
+        summary = upload_folder(client, BUCKET, str(tmp_path), 'out', dry_run=True)
+        stubber.assert_no_pending_responses()
+
+    assert summary['skipped'] == 2
+    assert hashed == []
+
+    # Touching a file with the same size hashes (and plans) only that file
+    (tmp_path / 'a.txt').write_bytes(b'xyz')
+    with Stubber(client) as stubber:
+        stubber.add_response('list_objects_v2', listing(remote), {'Bucket': BUCKET, 'Prefix': 'out/'})
+        summary = upload_folder(client, BUCKET, str(tmp_path), 'out', dry_run=True)
+
+    assert hashed == [str(tmp_path / 'a.txt')]
+    assert [item['key'] for item in summary['plan']] == ['out/a.txt']
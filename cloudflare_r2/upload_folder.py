@@ -0,0 +1,268 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from download_folder import DEFAULT_MAX_WORKERS, MULTIPART_CONCURRENCY, PROGRESS_INTERVAL, _Manifest, make_transfer_config
+
+# Part size of multipart uploads; also used to compute the expected ETag of local files
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+
+# Part sizes other tools commonly use (boto3 defaults to 8 MB)
+_COMMON_PART_SIZES = (8 * 1024 * 1024, 16 * 1024 * 1024, 5 * 1024 * 1024)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Remote ETag each local file was last verified against or uploaded as, with the
+# size/mtime it had then, kept in local_dir; unchanged files are not hashed again
+ETAG_MANIFEST_NAME = '.r2upload-manifest.json'
+
+
+def list_remote_objects(s3_client, bucket_name, folder_prefix):
+    """
+    List every object under the prefix once
+
+    Returns:
+        {key: {'size': ..., 'etag': ...}}
+    """
+    remote = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=folder_prefix):
+        for obj in page.get('Contents', []):
+            remote[obj['Key']] = {'size': obj['Size'], 'etag': obj['ETag'].strip('"')}
+    return remote
+
+
+def _candidate_part_sizes(size, parts, part_size):
+    """Part sizes that split `size` bytes into exactly `parts` parts, most likely first"""
+    candidates = [part_size, *_COMMON_PART_SIZES]
+    # Part size inferred from the part count, rounded up to a whole MB
+    mb = 1024 * 1024
+    candidates.append(int(math.ceil(size / parts / mb)) * mb)
+    seen = []
+    for candidate in candidates:
+        if candidate not in seen and int(math.ceil(size / candidate)) == parts:
+            seen.append(candidate)
+    return seen
+
+
+def local_etag(path, size, remote_etag, part_size=DEFAULT_PART_SIZE):
+    """
+    Compute the ETag the object would have if `path` was uploaded
+
+    Single-part objects have the MD5 of the content. Multipart objects have the MD5
+    of the concatenated part MD5s plus '-<parts>', so the part size has to match the
+    one used for the remote object; it is inferred from the remote part count.
+
+    Returns:
+        ETag without quotes, or None when no part size explains the remote part count
+    """
+    if '-' not in remote_etag:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                md5.update(block)
+        return md5.hexdigest()
+
+    parts = int(remote_etag.rsplit('-', 1)[1])
+    for candidate in _candidate_part_sizes(size, parts, part_size):
+        digests = []
+        with open(path, 'rb') as f:
+            for _ in range(parts):
+                md5 = hashlib.md5()
+                remaining = candidate
+                while remaining > 0:
+                    block = f.read(min(HASH_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    md5.update(block)
+                    remaining -= len(block)
+                digests.append(md5.digest())
+        etag = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{parts}"
+        if etag == remote_etag:
+            return etag
+    return None
+
+
+def _scan_local(local_dir, folder_prefix):
+    """Yield (local path, key, stat) for every file under local_dir"""
+    local_root = os.path.realpath(local_dir)
+    for root, dirs, files in os.walk(local_dir):
+        # Skip hidden directories and sync state (e.g. the download manifest)
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            # Never follow symlinks out of local_dir
+            if not os.path.realpath(path).startswith(local_root + os.sep):
+                print(f"Skipping link outside of {local_dir}: {path}")
+                continue
+            relative = os.path.relpath(path, local_dir).replace(os.sep, '/')
+            yield path, folder_prefix + relative, os.stat(path)
+
+
+def _plan_one(path, key, stat, remote, part_size, manifest):
+    """Decide whether a file needs uploading: returns None (in sync), 'new' or 'changed'"""
+    existing = remote.get(key)
+    if existing is None:
+        return 'new'
+    if existing['size'] != stat.st_size:
+        return 'changed'
+    entry = manifest.get(key)
+    if (entry is not None and entry['etag'] == existing['etag'] and
+            entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns):
+        return None
+    if local_etag(path, stat.st_size, existing['etag'], part_size) == existing['etag']:
+        manifest.record(key, existing['etag'], stat.st_size, stat.st_mtime_ns)
+        return None
+    return 'changed'
+
+
+def upload_folder(s3_client, bucket_name, local_dir, folder_prefix='',
+                  max_workers=DEFAULT_MAX_WORKERS, part_size=DEFAULT_PART_SIZE,
+                  max_concurrency=MULTIPART_CONCURRENCY, dry_run=False, progress=None):
+    """
+    Upload all files in a local directory to a folder in S3
+
+    The bucket is listed once up front; files whose size and ETag already match the
+    remote object are skipped without any per-file HEAD request. Local ETags are
+    cached in a manifest in local_dir, so only new or modified files are hashed
+    (uploaded files are recorded with the ETag from one HEAD). Files are uploaded
+    concurrently by a bounded thread pool, and files larger than part_size are sent
+    as parallel multipart uploads.
+
+    Args:
+        local_dir: local directory, uploaded recursively (hidden files are skipped)
+        folder_prefix: key prefix, e.g. 'noval/processed/'
+        max_workers: files uploaded in parallel
+        part_size: multipart part size (and threshold)
+        max_concurrency: parts uploaded in parallel per file
+        dry_run: only compare and return the diff, upload nothing
+        progress: optional callback receiving the summary dict as it changes
+
+    Returns:
+        Summary dict; in dry-run mode 'plan' lists the files that would be uploaded,
+        otherwise only their count ('planned') and size ('planned_bytes') are kept.
+        Progress callbacks get the counts only; the final one also gets the plan.
+    """
+    if folder_prefix and not folder_prefix.endswith('/'):
+        folder_prefix += '/'
+    transfer_config = make_transfer_config(multipart_threshold=part_size,
+                                           multipart_chunksize=part_size,
+                                           max_concurrency=max_concurrency)
+    summary = {
+        'dry_run': dry_run,
+        'status': 'listing',
+        'scanned': 0,
+        'skipped': 0,
+        'uploaded': 0,
+        'failed': 0,
+        'uploaded_bytes': 0,
+        'skipped_bytes': 0,
+        'planned': 0,
+        'planned_bytes': 0,
+        'plan': [],
+        'errors': []
+    }
+    lock = threading.Lock()
+    started = time.time()
+    manifest = _Manifest(local_dir, ETAG_MANIFEST_NAME)
+
+    def notify():
+        if progress is not None:
+            with lock:
+                plan = list(summary['plan']) if summary['status'] == 'completed' else []
+                progress(dict(summary, plan=plan, errors=list(summary['errors'])))
+
+    def upload_one(path, key, stat):
+        s3_client.upload_file(path, bucket_name, key, Config=transfer_config)
+        try:
+            etag = s3_client.head_object(Bucket=bucket_name, Key=key)['ETag'].strip('"')
+        except (BotoCoreError, ClientError):
+            # The upload succeeded; the file is just hashed again on the next run
+            return
+        manifest.record(key, etag, stat.st_size, stat.st_mtime_ns)
+
+    def sync_one(path, key, stat):
+        """Compare with the listing and upload when needed (runs in the pool)"""
+        size = stat.st_size
+        reason = _plan_one(path, key, stat, remote, part_size, manifest)
+        with lock:
+            summary['scanned'] += 1
+            if reason is None:
+                summary['skipped'] += 1
+                summary['skipped_bytes'] += size
+                return
+            summary['planned'] += 1
+            summary['planned_bytes'] += size
+            if dry_run:
+                summary['plan'].append({'key': key, 'path': path, 'size': size, 'reason': reason})
+        if dry_run:
+            return
+        upload_one(path, key, stat)
+        with lock:
+            summary['uploaded'] += 1
+            summary['uploaded_bytes'] += size
+
+    remote = list_remote_objects(s3_client, bucket_name, folder_prefix)
+    summary['status'] = 'running'
+    notify()
+
+    pending = {}
+    last_report = started
+
+    def collect(done):
+        for future in done:
+            key = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                with lock:
+                    summary['failed'] += 1
+                    summary['errors'].append({'key': key, 'error': str(e)})
+                print(f"Failed: {key}: {e}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='r2-upload') as executor:
+            for path, key, stat in _scan_local(local_dir, folder_prefix):
+                while len(pending) >= max_workers * 4:
+                    done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                    collect(done)
+                    if time.time() - last_report >= PROGRESS_INTERVAL:
+                        notify()
+                        last_report = time.time()
+                pending[executor.submit(sync_one, path, key, stat)] = key
+            while pending:
+                done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                collect(done)
+                if time.time() - last_report >= PROGRESS_INTERVAL:
+                    notify()
+                    last_report = time.time()
+    finally:
+        try:
+            manifest.save()
+        except OSError as e:
+            print(f"Could not save {manifest.path}: {e}")
+
+    elapsed = time.time() - started
+    summary['plan'].sort(key=lambda item: item['key'])
+    summary['status'] = 'completed'
+    summary['elapsed_seconds'] = round(elapsed, 2)
+    summary['throughput_mb_s'] = round(summary['uploaded_bytes'] / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0
+    notify()
+
+    planned_mb = summary['planned_bytes'] / (1024 * 1024)
+    if dry_run:
+        print(f"Dry run: {summary['planned']} files ({planned_mb:.2f} MB) would be uploaded, "
+              f"{summary['skipped']} already in sync")
+    else:
+        print(f"\nUpload completed!")
+        print(f"Uploaded {summary['uploaded']} files ({summary['uploaded_bytes'] / (1024*1024):.2f} MB), "
+              f"{summary['skipped']} skipped, {summary['failed']} failed, "
+              f"{summary['throughput_mb_s']:.2f} MB/s")
+    return summary
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+parquet 分组聚合
+
+每个 row group 只读取分组列和聚合列，在线程池中用 Table.group_by 计算部分聚合
+（count/sum/min/max，mean 拆成 sum 和 count），再把所有部分结果拼接后二次 group_by 合并。
+近似去重（approx_distinct）在每个 row group 内把值哈希为 HyperLogLog 的 (寄存器, rank)，
+按 (分组键, 寄存器) 取 rank 最大值作为稀疏寄存器，合并后向量化估计每组的基数。
+pyarrow 的解码和计算会释放 GIL，线程池即可利用多核。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from arrow_serializer import table_to_records
+from hyperloglog import estimate_cardinality, hash_values, register_ranks
+from parquet_cache import parquet_file_cache
+from query_engine import column_array, resolve_type, supports_length, value_lengths
+
+# 支持的聚合函数
+AGGREGATE_OPS = ('count', 'sum', 'mean', 'min', 'max', 'approx_distinct')
+
+# 并行计算部分聚合的线程数
+AGGREGATE_WORKERS = int(os.environ.get('AGGREGATE_WORKERS', os.cpu_count() or 1))
+
+# 近似去重的 HyperLogLog 精度（每组最多 2^12 个稀疏寄存器，标准误差约 1.6%）
+APPROX_DISTINCT_PRECISION = 12
+
+# 默认和最多返回的分组数
+DEFAULT_GROUP_LIMIT = 1000
+MAX_GROUP_LIMIT = 100000
+
+# 不分组时使用的常量分组键
+_GLOBAL_KEY = '__all__'
+
+
+class Aggregation:
+    """单个聚合项"""
+
+    def __init__(self, spec: Dict[str, Any], index: int, schema: pa.Schema):
+        """
+        初始化 Aggregation
+
+        Args:
+            spec: {"op": 聚合函数, "column": 列名（count 可省略）, "length": 是否按长度聚合, "name": 输出列名}
+            index: 聚合项序号，用于生成内部列名
+            schema: 文件的 Arrow schema
+        """
+        self.op = spec.get('op')
+        self.column = spec.get('column')
+        self.length = bool(spec.get('length', False))
+        self.value = f"__v{index}"
+
+        if self.op not in AGGREGATE_OPS:
+            raise ValueError(f"不支持的聚合函数: {self.op}")
+        if self.column is None:
+            if self.op != 'count' or self.length:
+                raise ValueError(f"聚合函数 {self.op} 缺少 column")
+        else:
+            self._validate_type(resolve_type(schema, self.column))
+
+        if spec.get('name'):
+            self.name = spec['name']
+        elif self.column is None:
+            self.name = 'count'
+        else:
+            column = f"length({self.column})" if self.length else self.column
+            self.name = f"{self.op}({column})"
+
+    def _validate_type(self, data_type: pa.DataType):
+        """检查列类型是否支持该聚合函数"""
+        if self.length:
+            if not supports_length(data_type):
+                raise ValueError(f"按长度聚合仅支持字符串、二进制和 list 列: {self.column}")
+            return
+        if pa.types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        if self.op in ('sum', 'mean'):
+            if not (pa.types.is_integer(data_type) or pa.types.is_floating(data_type) or
+                    pa.types.is_decimal(data_type) or pa.types.is_boolean(data_type)):
+                raise ValueError(f"{self.op} 仅支持数值列: {self.column} ({data_type})")
+        elif self.op in ('min', 'max', 'approx_distinct'):
+            if pa.types.is_nested(data_type) or pa.types.is_null(data_type):
+                raise ValueError(f"该列类型不支持 {self.op}: {self.column} ({data_type})")
+
+    def partial_specs(self) -> List[tuple]:
+        """row group 内的部分聚合 (列, 函数[, 选项])"""
+        if self.op == 'count':
+            mode = 'all' if self.column is None else 'only_valid'
+            return [(self.value, 'count', pc.CountOptions(mode=mode))]
+        if self.op == 'mean':
+            return [(self.value, 'sum'), (self.value, 'count')]
+        if self.op in ('sum', 'min', 'max'):
+            return [(self.value, self.op)]
+        return []
+
+    def merge_specs(self) -> List[tuple]:
+        """合并部分聚合的 (列, 函数)：计数和求和再求和，min/max 再取 min/max"""
+        specs = []
+        for column, function, *_ in self.partial_specs():
+            merge_function = 'sum' if function in ('count', 'sum') else function
+            specs.append((f"{column}_{function}", merge_function))
+        return specs
+
+    def finalize(self, merged: pa.Table):
+        """从合并结果计算最终值"""
+        if self.op == 'count':
+            return merged.column(f"{self.value}_count_sum")
+        if self.op == 'mean':
+            total = pc.cast(merged.column(f"{self.value}_sum_sum"), pa.float64())
+            count = pc.cast(merged.column(f"{self.value}_count_sum"), pa.float64())
+            return pc.divide(total, count)
+        return merged.column(f"{self.value}_{self.op}_{self.op}")
+
+
+def _parse_group_by(group_by: List[str], schema: pa.Schema):
+    """检查分组列"""
+    for column in group_by:
+        data_type = resolve_type(schema, column)
+        if pa.types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        if pa.types.is_nested(data_type):
+            raise ValueError(f"不支持按嵌套类型分组: {column} ({data_type})")
+
+
+def _read_row_group(file_path: str, metadata, rg_idx: int, keys: List[str],
+                    aggregations: List[Aggregation]) -> pa.Table:
+    """读取 row group 的分组列和聚合列，组装为 {分组键..., __v0, __v1, ...} 的表"""
+    read_columns = list(dict.fromkeys(
+        keys + [agg.column for agg in aggregations if agg.column is not None]))
+    # 共享句柄上的读取是串行的，每个任务复用已解析的 footer 单独打开文件
+    parquet_file = pq.ParquetFile(file_path, metadata=metadata)
+    try:
+        table = parquet_file.read_row_group(rg_idx, columns=read_columns)
+    finally:
+        parquet_file.close()
+
+    arrays, names = [], []
+    for key in keys:
+        array = column_array(table, key)
+        if pa.types.is_dictionary(array.type):
+            array = array.cast(array.type.value_type)
+        arrays.append(array)
+        names.append(key)
+    if not keys:
+        arrays.append(pa.array(np.zeros(table.num_rows, dtype=np.int8)))
+        names.append(_GLOBAL_KEY)
+    for agg in aggregations:
+        if agg.column is None:
+            array = arrays[0]
+        else:
+            array = column_array(table, agg.column)
+            array = value_lengths(array) if agg.length else array
+            if pa.types.is_dictionary(array.type):
+                array = array.cast(array.type.value_type)
+        arrays.append(array)
+        names.append(agg.value)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _distinct_registers(table: pa.Table, keys: List[str], agg: Aggregation) -> pa.Table:
+    """把一个 row group 内的值哈希为每组的稀疏 HyperLogLog 寄存器 {分组键..., __register, __rank}"""
+    values = table.column(agg.value)
+    valid = pc.is_valid(values)
+    if pa.types.is_floating(values.type):
+        valid = pc.and_(valid, pc.invert(pc.is_nan(values)))
+    rows = table.select(keys).filter(valid)
+    values = values.filter(valid)
+    if len(values) == 0:
+        return None
+
+    index, rank = register_ranks(hash_values(values), APPROX_DISTINCT_PRECISION)
+    rows = rows.append_column('__register', pa.array(index.astype(np.int32)))
+    rows = rows.append_column('__rank', pa.array(rank))
+    registers = rows.group_by(keys + ['__register'], use_threads=False).aggregate(
+        [('__rank', 'max')])
+    names = keys + ['__register']
+    return pa.Table.from_arrays([registers.column(name) for name in names] +
+                                [registers.column('__rank_max')], names=names + ['__rank'])
+
+
+def _partial_aggregate(file_path: str, metadata, rg_idx: int, group_by: List[str],
+                       aggregations: List[Aggregation]) -> Dict[str, Any]:
+    """计算单个 row group 的部分聚合"""
+    started = time.perf_counter()
+    table = _read_row_group(file_path, metadata, rg_idx, group_by, aggregations)
+    keys = group_by or [_GLOBAL_KEY]
+
+    specs = [spec for agg in aggregations for spec in agg.partial_specs()]
+    partial = table.group_by(keys, use_threads=False).aggregate(specs)
+    registers = {}
+    for i, agg in enumerate(aggregations):
+        if agg.op == 'approx_distinct':
+            registers[i] = _distinct_registers(table, keys, agg)
+
+    return {
+        "partial": partial,
+        "registers": registers,
+        "rows": table.num_rows,
+        "elapsed": time.perf_counter() - started
+    }
+
+
+def _row_positions(target: pa.Table, source: pa.Table, keys: List[str]):
+    """
+    找出 source 每一行的分组键在 target 中所在的行（target 的分组键互不相同）
+
+    逐列用 index_in 编码（空值也参与匹配），多列时把编码两两组合后重新压缩为稠密编码，
+    避免多列编码相乘溢出
+    """
+    target_code = source_code = None
+    for key in keys:
+        target_column = target.column(key).combine_chunks()
+        values = pc.unique(target_column)
+        target_part = pc.index_in(target_column, value_set=values, skip_nulls=False)
+        source_part = pc.index_in(source.column(key), value_set=values, skip_nulls=False)
+        if target_code is None:
+            target_code = pc.cast(target_part, pa.int64())
+            source_code = pc.cast(source_part, pa.int64())
+            continue
+        width = len(values)
+        target_code = pc.add(pc.multiply(target_code, width), pc.cast(target_part, pa.int64()))
+        source_code = pc.add(pc.multiply(source_code, width), pc.cast(source_part, pa.int64()))
+        dense = pc.unique(target_code)
+        target_code = pc.cast(pc.index_in(target_code, value_set=dense), pa.int64())
+        source_code = pc.cast(pc.index_in(source_code, value_set=dense), pa.int64())
+    return pc.index_in(source_code, value_set=target_code)
+
+
+def _merge_distinct(merged: pa.Table, keys: List[str], partials: List[pa.Table]):
+    """合并各 row group 的稀疏寄存器，估计每组的不同值数量"""
+    num_groups = merged.num_rows
+    partials = [partial for partial in partials if partial is not None]
+    if not partials:
+        return pa.array(np.zeros(num_groups, dtype=np.int64))
+
+    registers = pa.concat_tables(partials).group_by(
+        keys + ['__register'], use_threads=False).aggregate([('__rank', 'max')])
+    positions = _row_positions(merged, registers, keys).to_numpy(zero_copy_only=False)
+    ranks = registers.column('__rank_max').to_numpy().astype(np.float64)
+
+    present = np.bincount(positions, minlength=num_groups)
+    zeros = (1 << APPROX_DISTINCT_PRECISION) - present
+    inverse_sum = np.bincount(positions, weights=np.power(2.0, -ranks),
+                              minlength=num_groups) + zeros
+    estimate = estimate_cardinality(inverse_sum, zeros, APPROX_DISTINCT_PRECISION)
+    return pa.array(np.round(estimate).astype(np.int64))
+
+
+def aggregate_parquet(file_path: str, aggregations: List[Dict[str, Any]],
+                      group_by: Optional[List[str]] = None, order_by: Optional[str] = None,
+                      order: str = 'asc', limit: int = DEFAULT_GROUP_LIMIT,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    按列分组聚合
+
+    Args:
+        file_path: parquet 文件路径
+        aggregations: 聚合项列表 [{"op": ..., "column": ..., "length": ..., "name": ...}]
+        group_by: 分组列（支持 "a.b.c" 形式的嵌套字段路径），为空时对全表聚合
+        order_by: 结果排序的输出列名，默认按分组列排序
+        order: asc 或 desc
+        limit: 最多返回的分组数
+        progress: 进度回调 progress(已完成的 row group 数, row group 总数)
+
+    Returns:
+        分组结果、分组总数、row group 和各阶段耗时
+    """
+    started = time.perf_counter()
+    group_by = list(group_by or [])
+    if not aggregations:
+        raise ValueError("aggregations 不能为空")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"不支持的排序方向: {order}")
+    if limit <= 0 or limit > MAX_GROUP_LIMIT:
+        raise ValueError(f"limit 必须在 1 到 {MAX_GROUP_LIMIT} 之间")
+
+    entry = parquet_file_cache.get(file_path)
+    metadata = entry.metadata
+    with entry.open() as parquet_file:
+        schema = parquet_file.schema_arrow
+    _parse_group_by(group_by, schema)
+    aggs = [Aggregation(spec, i, schema) for i, spec in enumerate(aggregations)]
+    names = group_by + [agg.name for agg in aggs]
+    if len(set(names)) != len(names):
+        raise ValueError("输出列名重复，请为聚合项指定不同的 name")
+    if order_by is not None and order_by not in names:
+        raise ValueError(f"排序列不存在: {order_by}")
+    keys = group_by or [_GLOBAL_KEY]
+    if metadata.num_row_groups == 0:
+        raise ValueError("文件中没有 row group")
+    row_groups = list(range(metadata.num_row_groups))
+    planned = time.perf_counter()
+
+    # 阶段一：并行计算每个 row group 的部分聚合
+    results = [None] * len(row_groups)
+    workers = max(1, min(AGGREGATE_WORKERS, len(row_groups)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_partial_aggregate, file_path, metadata, rg_idx,
+                               group_by, aggs): position
+                   for position, rg_idx in enumerate(row_groups)}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if progress is not None:
+                    progress(done, len(row_groups))
+        except BaseException:
+            # 出错或任务被取消时不再启动尚未开始的 row group
+            for future in futures:
+                future.cancel()
+            raise
+    partial_done = time.perf_counter()
+
+    # 阶段二：拼接部分结果并合并
+    partials = pa.concat_tables([result["partial"] for result in results])
+    merged = partials.group_by(keys, use_threads=False).aggregate(
+        [spec for agg in aggs for spec in agg.merge_specs()])
+
+    columns = [merged.column(key) for key in group_by]
+    for i, agg in enumerate(aggs):
+        if agg.op == 'approx_distinct':
+            columns.append(_merge_distinct(
+                merged, keys, [result["registers"][i] for result in results]))
+        else:
+            columns.append(agg.finalize(merged))
+    merge_done = time.perf_counter()
+
+    # 阶段三：排序并截取
+    output = pa.Table.from_arrays(columns, names=names)
+    sort_keys = [(order_by, 'descending' if order == 'desc' else 'ascending')] if order_by else \
+        [(key, 'descending' if order == 'desc' else 'ascending') for key in group_by]
+    if sort_keys and output.num_rows > 1:
+        output = output.sort_by(sort_keys)
+    total_groups = output.num_rows
+    rows = table_to_records(output.slice(0, limit))
+    finished = time.perf_counter()
+
+    return {
+        "group_by": group_by,
+        "columns": names,
+        "rows": rows,
+        "total_groups": total_groups,
+        "truncated": total_groups > limit,
+        "rows_scanned": sum(result["rows"] for result in results),
+        "row_groups": {
+            "row_groups_total": metadata.num_row_groups,
+            "scanned": len(results)
+        },
+        "timings_ms": {
+            "plan": round((planned - started) * 1000, 2),
+            "partial": round((partial_done - planned) * 1000, 2),
+            "partial_cpu": round(sum(result["elapsed"] for result in results) * 1000, 2),
+            "merge": round((merge_done - partial_done) * 1000, 2),
+            "finalize": round((finished - merge_done) * 1000, 2),
+            "total": round((finished - started) * 1000, 2)
+        }
+    }
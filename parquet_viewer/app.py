@@ -1,10 +1,22 @@
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import os
 import json
+from aggregate import DEFAULT_GROUP_LIMIT, aggregate_parquet
+from arrow_serializer import (ARROW_STREAM_MIMETYPE, preview_nested, table_to_columns, table_to_ipc_stream,
+                              table_to_records)
+from directory_listing import DEFAULT_PAGE_SIZE, directory_lister, footer_previewer, scan_directory
 from file_reader import FileReader
+from jobs import job_manager
+from line_index import LineIndex
+from page_cache import page_cache
+from parquet_cache import parquet_file_cache
+from query_engine import query_parquet
+from search import DEFAULT_SEARCH_LIMIT, search_file
+from top_k import top_k_parquet
+from upload_store import UploadConflict, UploadError, UploadStore
+import time
 import traceback
 from werkzeug.utils import secure_filename
-import uuid
 
 app = Flask(__name__)
 
@@ -14,11 +26,45 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB 限制
+# 上传不限制单个文件大小：大文件通过 /api/uploads 分块续传，逐块流式写盘；
+# 上传目录总量超出预算时按最近查看时间淘汰旧文件
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 20 * 1024 * 1024 * 1024))
+upload_store = UploadStore(UPLOAD_FOLDER, max_bytes=app.config['UPLOAD_MAX_BYTES'])
+
+# parquet 文件句柄/footer 缓存预算
+app.config['PARQUET_CACHE_MAX_ENTRIES'] = int(os.environ.get('PARQUET_CACHE_MAX_ENTRIES', 64))
+app.config['PARQUET_CACHE_MAX_BYTES'] = int(os.environ.get('PARQUET_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+parquet_file_cache.configure(
+    max_entries=app.config['PARQUET_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['PARQUET_CACHE_MAX_BYTES']
+)
+
+# 后台分析任务的并发数
+app.config['ANALYSIS_JOB_WORKERS'] = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+job_manager.configure(max_workers=app.config['ANALYSIS_JOB_WORKERS'])
+
+# 序列化数据页缓存预算和后台预取线程数
+app.config['PAGE_CACHE_MAX_BYTES'] = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+app.config['PAGE_PREFETCH_WORKERS'] = int(os.environ.get('PAGE_PREFETCH_WORKERS', 1))
+page_cache.configure(
+    max_bytes=app.config['PAGE_CACHE_MAX_BYTES'],
+    prefetch_workers=app.config['PAGE_PREFETCH_WORKERS']
+)
 
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'parquet', 'json', 'jsonl', 'ndjson', 'txt', 'csv', 'log'}
 
+# 流式读取数据时每批的行数
+READ_STREAM_BATCH_ROWS = int(os.environ.get('READ_STREAM_BATCH_ROWS', 500))
+
+def json_body(payload):
+    """序列化为JSON字符串，保留列顺序（jsonify 默认会对键排序）"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+def json_response(payload, status=200):
+    """直接序列化为JSON响应，保留列顺序（jsonify 默认会对键排序）"""
+    return app.response_class(json_body(payload), status=status, mimetype='application/json')
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and \
@@ -39,8 +85,13 @@ def get_file_info():
         if not file_path or not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 400
         
-        reader = FileReader(file_path)
+        upload_store.touch(file_path)
+        reader = FileReader(file_path, data.get('dataset'))
         info = reader.get_file_info()
+        # 大文本/JSONL 文件只有估算行数，立即在后台构建行索引统计精确行数
+        # （前端提交同一任务时复用正在执行的任务）
+        if info.get('total_rows_pending'):
+            info['line_count_job_id'] = job_manager.submit('line_count', file_path).id
         
         return jsonify({
             'success': True,
@@ -61,22 +112,260 @@ def read_data():
         file_path = data.get('file_path')
         num_rows = data.get('num_rows', 10)
         start_row = data.get('start_row', 0)
+        # 列投影：只读取请求的列，支持 "a.b.c" 形式的嵌套字段路径
+        columns = data.get('columns') or None
+        # 响应格式：records 为行记录列表，columnar 为 {"columns": [...], "data": {列名: [...]}}，
+        # arrow 为 Arrow IPC 流（也可以通过 Accept: application/vnd.apache.arrow.stream 请求）
+        response_format = data.get('format')
+        # stream=true 时以 NDJSON 逐批返回，边解码边输出，首行的等待时间与页大小无关
+        stream = bool(data.get('stream', False))
+        # 嵌套列预览：list 值只返回前 K 个元素，完整值通过 /api/cell 按单元格读取
+        preview_items = data.get('nested_preview')
+        if response_format is None:
+            accept = request.accept_mimetypes
+            explicit = any(mimetype == ARROW_STREAM_MIMETYPE for mimetype, _ in accept)
+            preferred = accept.best_match([ARROW_STREAM_MIMETYPE, 'application/json'])
+            response_format = 'arrow' if explicit and preferred == ARROW_STREAM_MIMETYPE else 'records'
         
         if not file_path or not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 400
         
-        reader = FileReader(file_path)
+        if columns is not None and not isinstance(columns, list):
+            return jsonify({'error': 'columns 必须是列名数组'}), 400
         
-        if start_row == 0:
-            # 读取前 N 行
-            result = reader.read_top_rows(num_rows)
-        else:
-            # 读取指定范围的行
-            result = reader.read_slice(start_row, num_rows)
+        if response_format not in ('records', 'columnar', 'arrow'):
+            return jsonify({'error': f'不支持的响应格式: {response_format}'}), 400
+        
+        if stream and response_format == 'arrow':
+            return jsonify({'error': '流式响应仅支持 records 和 columnar 格式'}), 400
+        
+        if preview_items is not None:
+            if response_format != 'columnar':
+                return jsonify({'error': 'nested_preview 仅支持 columnar 格式'}), 400
+            if not isinstance(preview_items, int) or preview_items < 0:
+                return jsonify({'error': 'nested_preview 必须是非负整数'}), 400
+        
+        upload_store.touch(file_path)
+        reader = FileReader(file_path, data.get('dataset'))
+        
+        if response_format == 'arrow':
+            # Arrow IPC 流：直接写出解码后的列缓冲区，没有逐值转换
+            if reader.file_type not in ('parquet', 'dataset'):
+                return jsonify({'error': 'Arrow IPC 格式仅支持 parquet 文件和数据集'}), 400
+            table = reader.read_table(start_row, num_rows, columns)
+            buffer = table_to_ipc_stream(table)
+            return app.response_class(
+                buffer.to_pybytes(),
+                mimetype=ARROW_STREAM_MIMETYPE,
+                headers={
+                    'X-Start-Row': str(start_row),
+                    'X-Num-Rows': str(table.num_rows)
+                }
+            )
+        
+        # 大文本/JSONL 文件还没有行索引时不在请求线程中扫描整个文件：
+        # 靠后的页返回 202 和构建索引的后台任务（与 /api/file_info 提交的是同一个任务）
+        if reader.line_index_pending(start_row):
+            job = job_manager.submit('line_count', file_path)
+            return jsonify({
+                'success': False,
+                'pending': True,
+                'job_id': job.id,
+                'error': '正在建立行索引，完成后即可跳转到该行'
+            }), 202
+        
+        # 已序列化的页面直接从缓存返回，返回后在后台预取下一页
+        page = (response_format, stream, start_row, num_rows, columns, preview_items)
+        key = page_cache_key(reader, *page)
+        body, prefetched = page_cache.get(key)
+        mimetype = 'application/x-ndjson' if stream else 'application/json'
+        if body is not None:
+            prefetch_next_page(reader, *page)
+            return app.response_class(body, mimetype=mimetype,
+                                      headers={'X-Page-Cache': 'prefetched' if prefetched else 'hit'})
+        
+        if stream:
+            return app.response_class(
+                stream_and_cache_page(reader, key, *page),
+                mimetype=mimetype,
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Page-Cache': 'miss'}
+            )
+        
+        body = render_page(reader, *page)
+        page_cache.put(key, body)
+        prefetch_next_page(reader, *page)
+        return app.response_class(body, mimetype=mimetype, headers={'X-Page-Cache': 'miss'})
         
+    except Exception as e:
         return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def iter_read_data(reader, response_format, start_row, num_rows, columns, preview_items=None):
+    """
+    逐批产出读取结果，每个对象序列化为 NDJSON 的一行：
+    - {"type": "columns", "columns": [...]}：列名（仅列式格式，在第一批之前）
+    - {"type": "batch", "data": {列名: [...]}, "truncated": {...}}：列式格式的一批数据，
+      truncated 为截断预览的单元格（行号相对于整页，仅在有截断时给出）
+    - {"type": "rows", "rows": [...]}：行记录格式的一批数据
+    - {"type": "summary", "num_rows", "first_row_ms", "elapsed_ms"}：结束
+    - {"type": "error", "error"}：中途出错（响应头已发出，无法再返回错误状态码）
+    """
+    started = time.perf_counter()
+    first_row_ms = None
+    count = 0
+    try:
+        if reader.file_type in ('parquet', 'dataset'):
+            # parquet 文件每解码一批就序列化输出
+            for batch in reader.iter_batches(start_row, num_rows, columns, READ_STREAM_BATCH_ROWS):
+                if response_format == 'columnar':
+                    if count == 0:
+                        yield {'type': 'columns', 'columns': [str(name) for name in batch.schema.names]}
+                    item = {'type': 'batch'}
+                    if preview_items is not None:
+                        batch, truncated = preview_nested(batch, preview_items, row_offset=count)
+                        if truncated:
+                            item['truncated'] = truncated
+                    item['data'] = table_to_columns(batch)
+                    yield item
+                else:
+                    yield {'type': 'rows', 'rows': table_to_records(batch)}
+                if first_row_ms is None:
+                    first_row_ms = round((time.perf_counter() - started) * 1000, 2)
+                count += batch.num_rows
+        else:
+            # 文本和 JSON 文件逐行读取本身很快，读取后分批输出
+            result = read_page(reader, response_format, start_row, num_rows, columns, preview_items)
+            if response_format == 'columnar':
+                yield {'type': 'columns', 'columns': result['columns']}
+                yield {'type': 'batch', 'data': result['data']}
+                count = len(next(iter(result['data'].values()), []))
+            else:
+                records = result
+                for i in range(0, len(records), READ_STREAM_BATCH_ROWS):
+                    yield {'type': 'rows', 'rows': records[i:i + READ_STREAM_BATCH_ROWS]}
+                count = len(records)
+            first_row_ms = round((time.perf_counter() - started) * 1000, 2)
+        yield {
+            'type': 'summary',
+            'num_rows': count,
+            'first_row_ms': first_row_ms,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    except Exception as e:
+        yield {'type': 'error', 'error': str(e)}
+
+def ndjson_line(item):
+    """序列化为 NDJSON 的一行"""
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def read_page(reader, response_format, start_row, num_rows, columns, preview_items=None):
+    """读取一页数据（非流式），返回 records 或 columnar 结构"""
+    if response_format == 'columnar':
+        # 列式结构，前端无需构造行对象即可渲染
+        return reader.read_columnar(start_row, num_rows, columns, preview_items)
+    elif start_row == 0:
+        # 读取前 N 行
+        return reader.read_top_rows(num_rows, columns)
+    else:
+        # 读取指定范围的行
+        return reader.read_slice(start_row, num_rows, columns)
+
+def render_page(reader, response_format, stream, start_row, num_rows, columns, preview_items):
+    """生成一页的完整响应体（与 read_data 的响应一致），用于缓存和预取"""
+    if not stream:
+        result = read_page(reader, response_format, start_row, num_rows, columns, preview_items)
+        return json_body({'success': True, 'data': result}).encode('utf-8')
+    lines = []
+    for item in iter_read_data(reader, response_format, start_row, num_rows, columns, preview_items):
+        if item['type'] == 'error':
+            raise Exception(item['error'])
+        lines.append(ndjson_line(item))
+    return ''.join(lines).encode('utf-8')
+
+def stream_and_cache_page(reader, key, response_format, stream, start_row, num_rows, columns,
+                          preview_items):
+    """流式输出一页，同时收集输出的内容，完整输出且未出错时加入页面缓存"""
+    lines = []
+    size = 0
+    failed = False
+    for item in iter_read_data(reader, response_format, start_row, num_rows, columns, preview_items):
+        line = ndjson_line(item)
+        failed = failed or item['type'] == 'error'
+        if lines is not None:
+            lines.append(line)
+            size += len(line)
+            if not page_cache.accepts(size):
+                # 超出单页缓存上限，不再收集
+                lines = None
+        yield line
+    if not failed and lines is not None:
+        page_cache.put(key, ''.join(lines).encode('utf-8'))
+    # 当前页输出完后再预取，避免与当前页的解码争抢 CPU
+    prefetch_next_page(reader, response_format, stream, start_row, num_rows, columns, preview_items)
+
+def page_cache_key(reader, response_format, stream, start_row, num_rows, columns, preview_items):
+    """页面缓存键：(文件版本, 起始行, 行数, 列, 响应格式, 是否流式, 嵌套预览元素数)"""
+    path = os.path.abspath(reader.file_path)
+    if reader.file_type == 'dataset':
+        # 目录的修改时间不反映分片内容的变化，使用各分片的版本
+        version = (path, reader.dataset.fingerprint,
+                   json.dumps(reader.dataset_options, sort_keys=True))
+    else:
+        stat = os.stat(reader.file_path)
+        version = (path, stat.st_size, stat.st_mtime_ns)
+    return (version, start_row, num_rows, tuple(columns) if columns else None,
+            response_format, stream, preview_items)
+
+def prefetch_next_page(reader, response_format, stream, start_row, num_rows, columns, preview_items):
+    """在后台预取下一页（仅 parquet 文件和数据集，已到末尾时不预取）"""
+    if reader.file_type == 'parquet':
+        total_rows = parquet_file_cache.get(reader.file_path).index.total_rows
+    elif reader.file_type == 'dataset':
+        total_rows = reader.dataset.total_rows
+    else:
+        return
+    next_start = start_row + num_rows
+    if num_rows <= 0 or next_start >= total_rows:
+        return
+    page = (response_format, stream, next_start, num_rows, columns, preview_items)
+    key = page_cache_key(reader, *page)
+    file_path, dataset_options = reader.file_path, reader.dataset_options
+    page_cache.prefetch(key, lambda: render_page(FileReader(file_path, dataset_options), *page))
+
+@app.route('/api/cell', methods=['POST'])
+def read_cell():
+    """读取单个单元格的完整值（仅支持parquet文件和数据集），只读取该列在该行所在 row group 中的数据"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        row = data.get('row')
+        column = data.get('column')
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        if not isinstance(row, int) or row < 0:
+            return jsonify({'error': 'row 必须是非负整数'}), 400
+        if not column:
+            return jsonify({'error': 'column 不能为空'}), 400
+        
+        reader = FileReader(file_path, data.get('dataset'))
+        if reader.file_type not in ('parquet', 'dataset'):
+            return jsonify({'error': '按单元格读取仅支持 parquet 文件和数据集'}), 400
+        
+        try:
+            value = reader.read_cell(row, column)
+        except (IndexError, KeyError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return json_response({
             'success': True,
-            'data': result
+            'data': {
+                'row': row,
+                'column': column,
+                'value': value
+            }
         })
         
     except Exception as e:
@@ -95,8 +384,11 @@ def get_column_stats():
         if not file_path or not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 400
         
+        # deep=true 时流式扫描全部数据，补充精确空值数、近似去重数和缺失的 min/max
+        deep = bool(data.get('deep', False))
+        
         reader = FileReader(file_path)
-        stats = reader.get_column_stats()
+        stats = reader.get_column_stats(deep=deep)
         
         return jsonify({
             'success': True,
@@ -115,61 +407,352 @@ def get_column_stats():
 
 
 
+@app.route('/api/query', methods=['POST'])
+def query_data():
+    """按条件过滤查询（仅支持parquet文件），先用row group统计信息和字典页排除不可能命中的row group"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        predicates = data.get('filters', [])
+        offset = int(data.get('offset', 0))
+        limit = int(data.get('limit', 100))
+        columns = data.get('columns') or None
+        count_total = bool(data.get('count_total', False))
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        
+        reader = FileReader(file_path)
+        if reader.file_type != 'parquet':
+            return jsonify({'error': '过滤查询仅支持 parquet 文件'}), 400
+        
+        if not isinstance(predicates, list):
+            return jsonify({'error': 'filters 必须是过滤条件数组'}), 400
+        
+        try:
+            result = query_parquet(file_path, predicates, offset=offset, limit=limit,
+                                   columns=columns, count_total=count_total)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return json_response({
+            'success': True,
+            'data': result
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/top_k', methods=['POST'])
+def top_k_data():
+    """按列排序取前 K 行（仅支持parquet文件），逐个row group只读取排序列，内存只与K有关"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        column = data.get('column')
+        k = int(data.get('k', 100))
+        order = data.get('order', 'desc')
+        mode = data.get('mode', 'value')
+        columns = data.get('columns') or None
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        if not column:
+            return jsonify({'error': 'column 不能为空'}), 400
+        if columns is not None and not isinstance(columns, list):
+            return jsonify({'error': 'columns 必须是列名数组'}), 400
+        
+        reader = FileReader(file_path)
+        if reader.file_type != 'parquet':
+            return jsonify({'error': '排序取前K行仅支持 parquet 文件'}), 400
+        
+        try:
+            result = top_k_parquet(file_path, column, k=k, order=order, mode=mode, columns=columns)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return json_response({
+            'success': True,
+            'data': result
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/aggregate', methods=['POST'])
+def aggregate_data():
+    """分组聚合（仅支持parquet文件），各row group的部分聚合并行计算后合并，返回各阶段耗时"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        aggregations = data.get('aggregations') or []
+        group_by = data.get('group_by') or []
+        order_by = data.get('order_by') or None
+        order = data.get('order', 'asc')
+        limit = int(data.get('limit', DEFAULT_GROUP_LIMIT))
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        if not isinstance(aggregations, list) or not aggregations:
+            return jsonify({'error': 'aggregations 必须是非空的聚合项数组'}), 400
+        if not isinstance(group_by, list):
+            return jsonify({'error': 'group_by 必须是列名数组'}), 400
+        
+        reader = FileReader(file_path)
+        if reader.file_type != 'parquet':
+            return jsonify({'error': '分组聚合仅支持 parquet 文件'}), 400
+        
+        try:
+            result = aggregate_parquet(file_path, aggregations, group_by=group_by,
+                                       order_by=order_by, order=order, limit=limit)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return json_response({
+            'success': True,
+            'data': result
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/search', methods=['POST'])
+def search_data():
+    """全文/正则搜索，命中结果以 NDJSON 逐行流式返回"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        query = data.get('query')
+        regex = bool(data.get('regex', False))
+        ignore_case = bool(data.get('ignore_case', False))
+        columns = data.get('columns')
+        limit = int(data.get('limit', DEFAULT_SEARCH_LIMIT))
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        if not query:
+            return jsonify({'error': 'query 不能为空'}), 400
+        if columns is not None and not isinstance(columns, list):
+            return jsonify({'error': 'columns 必须是列名数组'}), 400
+        
+        reader = FileReader(file_path)
+        try:
+            # 模式在开始扫描前校验，无效时直接返回 400
+            matches = search_file(file_path, reader.file_type, query, regex=regex,
+                                  ignore_case=ignore_case, columns=columns, limit=limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def generate():
+            started = time.perf_counter()
+            count = 0
+            try:
+                for match in matches:
+                    count += 1
+                    yield json.dumps({'type': 'match', **match}, ensure_ascii=False) + '\n'
+                yield json.dumps({
+                    'type': 'summary',
+                    'total_matches': count,
+                    'truncated': count >= limit,
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+                }, ensure_ascii=False) + '\n'
+            except Exception as e:
+                yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+        
+        return app.response_class(generate(), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """获取缓存统计信息"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'parquet_files': parquet_file_cache.stats(),
+            'pages': page_cache.stats(),
+            'jobs': job_manager.stats(),
+            'uploads': upload_store.stats(),
+            'listings': directory_lister.stats()
+        }
+    })
+
+def line_count_job(file_path, params, job):
+    """后台任务：精确行数，文本/JSONL 文件顺带构建并保存稀疏行索引"""
+    reader = FileReader(file_path)
+    if reader.file_type in ('parquet', 'dataset'):
+        return {'total_lines': reader.get_file_info()['total_rows']}
+    
+    index = LineIndex.load(file_path)
+    if index is None:
+        index = LineIndex.build(
+            file_path,
+            progress=lambda done, total: job.report(done, total, {'bytes_scanned': done})
+        )
+        index.save(file_path)
+    return {'total_lines': index.total_lines}
+
+def deep_stats_job(file_path, params, job):
+    """后台任务：深度列统计"""
+    reader = FileReader(file_path)
+    if reader.file_type != 'parquet':
+        raise ValueError('深度列统计仅支持parquet文件')
+    return reader.get_column_stats(
+        deep=True,
+        progress=lambda done, total: job.report(done, total, {'rows_scanned': done})
+    )
+
+def search_job(file_path, params, job):
+    """后台任务：全文/正则搜索，执行中的阶段性结果为已找到的命中"""
+    reader = FileReader(file_path)
+    limit = int(params.get('limit', DEFAULT_SEARCH_LIMIT))
+    matches = []
+    progress = lambda done, total: job.report(done, total, {'matches': list(matches)})
+    for match in search_file(file_path, reader.file_type, params.get('query'),
+                             regex=bool(params.get('regex', False)),
+                             ignore_case=bool(params.get('ignore_case', False)),
+                             columns=params.get('columns'), limit=limit, progress=progress):
+        matches.append(match)
+    return {'matches': matches, 'truncated': len(matches) >= limit}
+
+def aggregate_job(file_path, params, job):
+    """后台任务：分组聚合，进度为已完成的 row group 数"""
+    reader = FileReader(file_path)
+    if reader.file_type != 'parquet':
+        raise ValueError('分组聚合仅支持 parquet 文件')
+    return aggregate_parquet(
+        file_path, params.get('aggregations') or [], group_by=params.get('group_by') or [],
+        order_by=params.get('order_by') or None, order=params.get('order', 'asc'),
+        limit=int(params.get('limit', DEFAULT_GROUP_LIMIT)),
+        progress=lambda done, total: job.report(done, total)
+    )
+
+job_manager.register('line_count', line_count_job)
+job_manager.register('deep_stats', deep_stats_job)
+job_manager.register('search', search_job)
+job_manager.register('aggregate', aggregate_job)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """提交后台分析任务，立即返回任务 id，相同分析已有缓存结果时直接返回"""
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        job_type = data.get('type')
+        params = data.get('params') or {}
+        
+        if not file_path or not os.path.exists(file_path):
+            return jsonify({'error': '文件不存在'}), 400
+        if job_type not in job_manager.job_types:
+            return jsonify({'error': f'不支持的任务类型: {job_type}，可选: {job_manager.job_types}'}), 400
+        if not isinstance(params, dict):
+            return jsonify({'error': 'params 必须是对象'}), 400
+        
+        job = job_manager.submit(job_type, file_path, params)
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态、进度和结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+def scan_upload_directory(directory):
+    """从上传目录的内存索引生成目录条目"""
+    return [dict(entry, type='file') for entry in upload_store.list_files()]
+
 @app.route('/api/list_files', methods=['GET'])
 def list_files():
-    """列出指定目录下的 parquet 文件"""
+    """分页列出指定目录下的目录和文件，支持排序和名称过滤"""
     try:
         # 获取应用目录
         app_dir = os.path.dirname(os.path.abspath(__file__))
         
         # 获取请求参数，默认使用应用目录
         directory = request.args.get('directory', app_dir)
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        sort = request.args.get('sort', 'name')
+        order = request.args.get('order', 'asc')
+        query = request.args.get('q', '')
         
         # 安全检查：确保目录在允许的范围内
-        if not os.path.exists(directory):
+        if not os.path.isdir(directory):
             directory = app_dir
         
-        parquet_files = []
-        directories = []
+        # 上传目录直接使用内存索引，不逐个访问文件系统
+        scanner = scan_upload_directory if upload_store.is_managed(directory) else scan_directory
         
         try:
-            for item in os.listdir(directory):
-                # 过滤掉以.开头的隐藏文件和文件夹
-                if item.startswith('.'):
-                    continue
-                    
-                item_path = os.path.join(directory, item)
-                
-                if os.path.isdir(item_path):
-                    # 添加目录
-                    directories.append({
-                        'name': item,
-                        'path': item_path,
-                        'type': 'directory'
-                    })
-                else:
-                    # 添加所有文件（不支持的格式当作txt文件处理）
-                    file_size = os.path.getsize(item_path)
-                    parquet_files.append({
-                        'name': item,
-                        'path': item_path,
-                        'size_mb': round(file_size / (1024 * 1024), 2),
-                        'type': 'file'
-                    })
+            page = directory_lister.list(directory, cursor=cursor, limit=limit, sort=sort,
+                                         order=order, query=query, scanner=scanner)
         except PermissionError:
             # 如果没有权限访问目录，返回空列表
-            pass
+            page = {'directories': [], 'files': [], 'total': 0, 'next_cursor': None}
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # 排序：文件夹按文件夹名排序，文件按文件名排序
-        directories.sort(key=lambda x: x['name'].lower())  # 文件夹按名称排序（忽略大小写）
-        parquet_files.sort(key=lambda x: x['name'].lower())  # 文件按名称排序（忽略大小写）
+        files = [{
+            'name': entry['name'],
+            'path': entry['path'],
+            'size_mb': round(entry['size'] / (1024 * 1024), 2),
+            'mtime': entry['mtime'],
+            'type': 'file'
+        } for entry in page['files']]
+        directories = [{
+            'name': entry['name'],
+            'path': entry['path'],
+            'mtime': entry['mtime'],
+            'type': 'directory'
+        } for entry in page['directories']]
         
         return jsonify({
             'success': True,
             'data': {
-                'files': parquet_files,
+                'files': files,
                 'directories': directories,
-                'current_directory': directory
+                'current_directory': directory,
+                'total': page['total'],
+                'next_cursor': page['next_cursor']
             }
         })
         
@@ -179,6 +762,32 @@ def list_files():
             'error': str(e)
         }), 500
 
+@app.route('/api/file_previews', methods=['POST'])
+def file_previews():
+    """批量读取 parquet 文件的 footer 摘要（行数、列数、压缩方式），只用于当前可见的条目"""
+    try:
+        data = request.get_json()
+        paths = data.get('paths') or []
+        
+        if not isinstance(paths, list):
+            return jsonify({'error': 'paths 必须是路径数组'}), 400
+        
+        try:
+            previews = footer_previewer.previews([str(path) for path in paths])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'data': previews
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/upload_file', methods=['POST'])
 def upload_file():
     """上传 parquet 文件"""
@@ -206,22 +815,145 @@ def upload_file():
                 'error': '只允许上传 .parquet 文件'
             }), 400
         
-        # 生成安全的文件名
+        # 生成安全的文件名，文件以内容哈希命名，相同内容只保存一份
         filename = secure_filename(file.filename)
-        # 添加唯一标识符避免文件名冲突
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
+        try:
+            result = upload_store.save_stream(filename, file.stream)
+        except UploadError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        directory_lister.invalidate(app.config['UPLOAD_FOLDER'])
+        return jsonify({
+            'success': True,
+            'data': upload_result(result)
+        })
         
-        # 保存文件
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'文件上传失败: {str(e)}'
+        }), 500
+
+def upload_result(result):
+    """上传完成的响应数据"""
+    return {
+        'file_path': result['file_path'],
+        'original_name': result['original_name'],
+        'size_mb': round(result['size'] / (1024 * 1024), 2),
+        'sha256': result['sha256'],
+        'deduplicated': result['deduplicated']
+    }
+
+def upload_error_response(e):
+    """上传错误响应，偏移冲突时返回 409 和服务端已接收的字节数"""
+    if isinstance(e, UploadConflict):
+        return jsonify({'success': False, 'error': str(e), 'received': e.received}), 409
+    return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/uploads', methods=['POST'])
+def init_upload():
+    """创建分块上传会话"""
+    try:
+        data = request.get_json()
+        filename = secure_filename(data.get('filename') or '')
+        size = data.get('size')
         
+        if not filename or not allowed_file(filename):
+            return jsonify({'success': False, 'error': '不支持的文件类型'}), 400
+        if not isinstance(size, int) or size < 0:
+            return jsonify({'success': False, 'error': 'size 必须是非负整数'}), 400
+        
+        try:
+            session = upload_store.create_session(filename, size)
+        except UploadError as e:
+            return upload_error_response(e)
         return jsonify({
             'success': True,
-            'data': {
-                'file_path': file_path,
-                'original_name': filename,
-                'size_mb': round(os.path.getsize(file_path) / (1024 * 1024), 2)
-            }
+            'data': session.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """查询上传会话，断线后按 received 续传"""
+    session = upload_store.get_session(upload_id)
+    if session is None:
+        return jsonify({'success': False, 'error': '上传会话不存在'}), 404
+    return jsonify({
+        'success': True,
+        'data': session.to_dict()
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """写入一块数据，请求体为原始字节，offset 必须等于已接收的字节数"""
+    try:
+        session = upload_store.get_session(upload_id)
+        if session is None:
+            return jsonify({'success': False, 'error': '上传会话不存在'}), 404
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'success': False, 'error': '缺少 offset 参数'}), 400
+        
+        try:
+            session.write_chunk(offset, request.stream, request.content_length)
+        except UploadError as e:
+            return upload_error_response(e)
+        
+        return jsonify({
+            'success': True,
+            'data': session.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/uploads/<upload_id>/tail', methods=['PUT'])
+def put_upload_tail(upload_id):
+    """预先发送文件尾部，parquet 文件立即检查 footer，无效文件在传输正文前失败"""
+    try:
+        session = upload_store.get_session(upload_id)
+        if session is None:
+            return jsonify({'success': False, 'error': '上传会话不存在'}), 404
+        
+        try:
+            session.check_tail(request.get_data(cache=False))
+        except UploadError as e:
+            upload_store.abort(upload_id)
+            return upload_error_response(e)
+        
+        return jsonify({
+            'success': True,
+            'data': session.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """完成上传：校验文件并按内容哈希去重"""
+    try:
+        try:
+            result = upload_store.complete(upload_id)
+        except UploadError as e:
+            return upload_error_response(e)
+        
+        directory_lister.invalidate(app.config['UPLOAD_FOLDER'])
+        return jsonify({
+            'success': True,
+            'data': upload_result(result)
         })
         
     except Exception as e:
@@ -230,6 +962,13 @@ def upload_file():
             'error': f'文件上传失败: {str(e)}'
         }), 500
 
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """放弃上传"""
+    if not upload_store.abort(upload_id):
+        return jsonify({'success': False, 'error': '上传会话不存在'}), 404
+    return jsonify({'success': True})
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     """提供上传文件的访问"""
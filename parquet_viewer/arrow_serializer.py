@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Arrow 原生 JSON 序列化
+
+按列遍历 Arrow 数组直接生成可 JSON 序列化的 Python 值，不经过 pandas，
+也不在每个单元格上执行 Python 类型转换：
+- 整数、字符串、布尔及只含这些类型的 list/struct 直接由 to_pylist 在 C++ 中转换
+- 时间戳、日期、时间、decimal（包括嵌套在 list/struct 中的）整列 cast 为字符串
+- 浮点数（包括嵌套在 list/struct 中的）的 NaN/Inf 向量化替换为 null
+- 只有 binary、duration 等少数类型所在的列才逐值转换
+
+嵌套列可以只输出预览：list 值向量化截断为前 K 个元素（pc.list_slice），
+同时给出被截断的单元格和原始长度，完整的值按单元格另行读取。
+
+另外提供 Arrow IPC 流序列化，直接写出解码后的列缓冲区，不做任何逐值转换。
+"""
+
+import base64
+import datetime
+import decimal
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Arrow IPC 流的 MIME 类型
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# 表示该类型无法通过 cast 转换，需要逐值转换
+_FALLBACK = object()
+
+
+def _json_safe_type(data_type: pa.DataType):
+    """
+    计算可直接 to_pylist 输出为 JSON 值的目标类型
+
+    Returns:
+        None 表示无需转换；_FALLBACK 表示需要逐值转换；否则为 cast 的目标类型
+    """
+    if (pa.types.is_null(data_type) or pa.types.is_boolean(data_type) or
+            pa.types.is_integer(data_type) or pa.types.is_string(data_type) or
+            pa.types.is_large_string(data_type)):
+        return None
+    if (pa.types.is_timestamp(data_type) or pa.types.is_date(data_type) or
+            pa.types.is_time(data_type) or pa.types.is_decimal(data_type)):
+        return pa.string()
+    if pa.types.is_floating(data_type):
+        # NaN/Inf 由 _clean_floats 预先处理
+        return None
+    if pa.types.is_dictionary(data_type):
+        value_target = _json_safe_type(data_type.value_type)
+        if value_target is _FALLBACK:
+            return _FALLBACK
+        return value_target or data_type.value_type
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        value_target = _json_safe_type(data_type.value_type)
+        if value_target is None or value_target is _FALLBACK:
+            return value_target
+        if pa.types.is_large_list(data_type):
+            return pa.large_list(value_target)
+        return pa.list_(value_target)
+    if pa.types.is_struct(data_type):
+        fields = []
+        changed = False
+        for field in data_type:
+            field_target = _json_safe_type(field.type)
+            if field_target is _FALLBACK:
+                return _FALLBACK
+            if field_target is not None:
+                changed = True
+            fields.append(pa.field(field.name, field_target or field.type, field.nullable))
+        return pa.struct(fields) if changed else None
+    return _FALLBACK
+
+
+def _contains_floating(data_type: pa.DataType) -> bool:
+    """类型中是否包含浮点数（包括嵌套的 list/struct）"""
+    if pa.types.is_floating(data_type):
+        return True
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        return _contains_floating(data_type.value_type)
+    if pa.types.is_struct(data_type):
+        return any(_contains_floating(field.type) for field in data_type)
+    return False
+
+
+def _clean_floats(array: pa.Array) -> pa.Array:
+    """把浮点数中的 NaN/Inf 向量化替换为 null，嵌套的 list/struct 按子数组重建"""
+    data_type = array.type
+    if pa.types.is_floating(data_type):
+        return pc.if_else(pc.is_finite(array), array, pa.scalar(None, data_type))
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        array_class = pa.LargeListArray if pa.types.is_large_list(data_type) else pa.ListArray
+        # 切片后的数组偏移不从0开始，先归一化偏移和子数组
+        offsets = array.offsets
+        first = offsets[0].as_py()
+        values = array.values.slice(first, offsets[-1].as_py() - first)
+        offsets = pc.subtract(offsets, pa.scalar(first, offsets.type))
+        return array_class.from_arrays(offsets, _clean_floats(values), mask=array.is_null())
+    if pa.types.is_struct(data_type):
+        children = [_clean_floats(array.field(i)) for i in range(data_type.num_fields)]
+        return pa.StructArray.from_arrays(children, fields=list(data_type),
+                                          mask=array.is_null())
+    return array
+
+
+def _to_json_value(value: Any) -> Any:
+    """逐值转换无法向量化处理的类型"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {str(k): _to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(v) for v in value]
+    if isinstance(value, bytes):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time,
+                          datetime.timedelta, decimal.Decimal)):
+        return str(value)
+    return str(value)
+
+
+def column_to_pylist(column) -> List[Any]:
+    """
+    把一列 Arrow 数据转换为可 JSON 序列化的 Python 列表
+
+    Args:
+        column: pyarrow Array 或 ChunkedArray
+    """
+    data_type = column.type
+    if _contains_floating(data_type):
+        # NaN/Inf 无法 JSON 序列化，向量化替换为 null
+        if isinstance(column, pa.ChunkedArray):
+            column = pa.chunked_array([_clean_floats(chunk) for chunk in column.chunks],
+                                      type=data_type)
+        else:
+            column = _clean_floats(column)
+
+    target = _json_safe_type(data_type)
+    if target is None:
+        return column.to_pylist()
+    if target is not _FALLBACK:
+        return column.cast(target).to_pylist()
+    return [_to_json_value(value) for value in column.to_pylist()]
+
+
+def table_to_columns(table: pa.Table) -> Dict[str, List[Any]]:
+    """把 Table 转换为 {列名: 值列表}"""
+    return {name: column_to_pylist(table.column(i))
+            for i, name in enumerate(table.column_names)}
+
+
+def table_to_records(table: pa.Table) -> List[Dict[str, Any]]:
+    """把 Table 转换为行记录列表"""
+    names = [str(name) for name in table.column_names]
+    columns = [column_to_pylist(table.column(i)) for i in range(table.num_columns)]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def table_to_columnar(table: pa.Table) -> Dict[str, Any]:
+    """把 Table 转换为列式结构 {"columns": [...], "data": {列名: [...]}}"""
+    return {
+        "columns": [str(name) for name in table.column_names],
+        "data": {str(name): values for name, values in table_to_columns(table).items()}
+    }
+
+
+def records_to_columnar(records: List[Any], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    把行记录列表转换为列式结构（用于 JSON/文本文件）
+
+    Args:
+        records: 行记录列表
+        columns: 列顺序，None 时按记录中字段首次出现的顺序
+    """
+    if columns is None:
+        seen = {}
+        for record in records:
+            if isinstance(record, dict):
+                for key in record:
+                    seen.setdefault(key, None)
+        columns = list(seen)
+    data = {
+        column: [record.get(column) if isinstance(record, dict) else None for record in records]
+        for column in columns
+    }
+    return {"columns": columns, "data": data}
+
+
+def _preview_array(array: pa.Array, max_items: int) -> Tuple[pa.Array, Optional[np.ndarray]]:
+    """
+    把 list 值（包括嵌套在 list/struct 中的）截断为前 max_items 个元素，类型不变
+
+    Returns:
+        (截断后的数组, 每行是否被截断的布尔数组；不含 list 的类型为 None)
+    """
+    data_type = array.type
+    if pa.types.is_list(data_type) or pa.types.is_large_list(data_type):
+        array_class = pa.LargeListArray if pa.types.is_large_list(data_type) else pa.ListArray
+        lengths = pc.list_value_length(array)
+        sliced = pc.list_slice(array, 0, max_items)
+        # 归一化偏移和子数组后递归截断子数组
+        offsets = sliced.offsets
+        first = offsets[0].as_py()
+        values = sliced.values.slice(first, offsets[-1].as_py() - first)
+        offsets = pc.subtract(offsets, pa.scalar(first, offsets.type))
+        values, child_truncated = _preview_array(values, max_items)
+        truncated = pc.fill_null(pc.greater(lengths, max_items), False).to_numpy(zero_copy_only=False)
+        if child_truncated is not None and child_truncated.any():
+            parents = pc.list_parent_indices(sliced).to_numpy()
+            truncated = truncated | (np.bincount(parents[child_truncated],
+                                                 minlength=len(array)) > 0)
+        return array_class.from_arrays(offsets, values, mask=array.is_null()), truncated
+    if pa.types.is_struct(data_type):
+        children = []
+        truncated = None
+        for i in range(data_type.num_fields):
+            child, child_truncated = _preview_array(array.field(i), max_items)
+            children.append(child)
+            if child_truncated is not None:
+                truncated = child_truncated if truncated is None else truncated | child_truncated
+        if truncated is None:
+            return array, None
+        return pa.StructArray.from_arrays(children, fields=list(data_type),
+                                          mask=array.is_null()), truncated
+    return array, None
+
+
+def preview_nested(table, max_items: int, row_offset: int = 0):
+    """
+    生成嵌套列的预览：list 值只保留前 max_items 个元素，用于表格中折叠显示
+
+    Args:
+        table: pyarrow Table 或 RecordBatch
+        max_items: 每个 list 保留的元素个数
+        row_offset: 返回的行号的起始偏移（流式输出时为之前批次的行数）
+
+    Returns:
+        (截断后的 Table/RecordBatch, {列名: [[行号, list 长度], ...]})，
+        第二项只包含被截断的单元格；截断发生在 struct 内部时长度为 None
+    """
+    arrays = []
+    truncated = {}
+    for i, name in enumerate(table.column_names):
+        column = table.column(i)
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        preview, rows = _preview_array(column, max_items)
+        arrays.append(preview)
+        if rows is None or not rows.any():
+            continue
+        indices = np.flatnonzero(rows)
+        if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+            lengths = pc.list_value_length(column).take(pa.array(indices)).to_pylist()
+        else:
+            lengths = [None] * len(indices)
+        truncated[str(name)] = [[int(row) + row_offset, length]
+                                for row, length in zip(indices, lengths)]
+    if not truncated:
+        return table, truncated
+    if isinstance(table, pa.RecordBatch):
+        return pa.RecordBatch.from_arrays(arrays, schema=table.schema), truncated
+    return pa.Table.from_arrays(arrays, schema=table.schema), truncated
+
+
+def table_to_ipc_stream(table: pa.Table) -> pa.Buffer:
+    """把 Table 写为 Arrow IPC 流，列缓冲区原样写出"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+parquet 列统计
+
+基础统计只遍历一次 footer 元数据，示例值来自所有列共享的一个小批次，
+不再为每一列重新打开文件、解码第一个 row group。
+
+深度统计（deep）顺序流式读取全部 row group 一次，按列累计：
+- 精确的空值数量
+- HyperLogLog 近似去重计数
+- footer 中缺少 min/max 统计的列，用 pyarrow.compute 计算 min/max
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrow_serializer import column_to_pylist
+from hyperloglog import HyperLogLog
+
+# 共享示例批次的行数
+SAMPLE_ROWS = 5
+
+# 每列最多保留的示例值数量
+MAX_SAMPLE_VALUES = 3
+
+# 深度统计时每个批次的行数
+DEEP_STATS_BATCH_ROWS = 64 * 1024
+
+
+def _flatten_all(table: pa.Table) -> pa.Table:
+    """逐层展开 struct 列，列名为 a.b.c 形式的路径"""
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    return table
+
+
+def _match_column(path: str, names) -> Optional[str]:
+    """
+    找到叶子列路径对应的展开后列名
+
+    list 列的叶子路径为 a.list.element，对应展开后的 a 列
+    """
+    parts = path.split('.')
+    for end in range(len(parts), 0, -1):
+        name = '.'.join(parts[:end])
+        if name in names:
+            return name
+    return None
+
+
+def footer_column_stats(metadata) -> Dict[str, Dict[str, Any]]:
+    """
+    从 footer 元数据汇总每个叶子列的统计信息
+
+    Args:
+        metadata: parquet FileMetaData
+
+    Returns:
+        {列路径: 统计信息}
+    """
+    schema = metadata.schema
+    stats = {}
+    for i in range(metadata.num_columns):
+        column = schema.column(i)
+        stats[column.path] = {
+            "dtype": str(column.physical_type),
+            "logical_type": str(column.logical_type) if column.logical_type else None,
+            "null_count": 0,
+            "unique_count": None,  # 元数据中通常不包含唯一值统计
+            "sample_values": [],
+            "compression": None,
+            "total_size": 0,
+            "min_value": None,
+            "max_value": None
+        }
+
+    paths = list(stats)
+    min_values = [[] for _ in paths]
+    max_values = [[] for _ in paths]
+
+    for rg_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_idx)
+        for i, path in enumerate(paths):
+            col_chunk = row_group.column(i)
+            column_stats = stats[path]
+
+            stats_info = col_chunk.statistics
+            if stats_info is not None:
+                if stats_info.has_null_count:
+                    column_stats["null_count"] += stats_info.null_count
+                if stats_info.has_min_max:
+                    min_values[i].append(stats_info.min)
+                    max_values[i].append(stats_info.max)
+
+            column_stats["total_size"] += col_chunk.total_compressed_size
+            if column_stats["compression"] is None:
+                column_stats["compression"] = col_chunk.compression
+
+    for i, path in enumerate(paths):
+        try:
+            if min_values[i]:
+                stats[path]["min_value"] = min(min_values[i])
+            if max_values[i]:
+                stats[path]["max_value"] = max(max_values[i])
+        except TypeError:
+            # 统计值类型无法比较时不输出 min/max
+            pass
+
+    return stats
+
+
+def sample_column_values(parquet_file, paths: List[str]) -> Dict[str, List[Any]]:
+    """
+    读取一个共享的小批次，为所有列提取示例值
+
+    Args:
+        parquet_file: 打开的 ParquetFile
+        paths: 叶子列路径列表
+
+    Returns:
+        {列路径: 示例值列表}
+    """
+    if parquet_file.metadata.num_rows == 0:
+        return {}
+
+    batches = parquet_file.iter_batches(batch_size=SAMPLE_ROWS)
+    try:
+        batch = next(batches, None)
+    finally:
+        batches.close()
+    if batch is None:
+        return {}
+
+    table = _flatten_all(pa.Table.from_batches([batch]))
+    names = set(table.column_names)
+    values_by_name = {}
+    samples = {}
+    for path in paths:
+        name = _match_column(path, names)
+        if name is None:
+            continue
+        if name not in values_by_name:
+            values = column_to_pylist(table.column(name))
+            values_by_name[name] = [v for v in values if v is not None][:MAX_SAMPLE_VALUES]
+        samples[path] = values_by_name[name]
+    return samples
+
+
+def _min_max(array) -> Optional[tuple]:
+    """计算数组的 min/max，类型不支持比较时返回 None"""
+    if pa.types.is_dictionary(array.type):
+        array = array.cast(array.type.value_type)
+    try:
+        result = pc.min_max(array)
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return None
+    low, high = result['min'].as_py(), result['max'].as_py()
+    if low is None:
+        return None
+    return low, high
+
+
+def deep_column_stats(parquet_file, stats: Dict[str, Dict[str, Any]],
+                      progress: Optional[Callable[[int, int], None]] = None):
+    """
+    流式读取全部 row group 一次，补充精确空值数、近似去重数和缺失的 min/max
+
+    Args:
+        parquet_file: 打开的 ParquetFile
+        stats: footer_column_stats 的结果，原地更新
+        progress: 进度回调 progress(已扫描行数, 总行数)，每个批次处理完成后调用
+    """
+    metadata = parquet_file.metadata
+    paths = list(stats)
+
+    # 任一 row group 缺少 min/max 统计的列需要扫描计算
+    missing_min_max = set()
+    for rg_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_idx)
+        for i, path in enumerate(paths):
+            stats_info = row_group.column(i).statistics
+            if stats_info is None or not stats_info.has_min_max:
+                missing_min_max.add(path)
+
+    null_counts = {}
+    sketches = {}
+    bounds = {}
+    matched = None
+    rows_scanned = 0
+
+    for batch in parquet_file.iter_batches(batch_size=DEEP_STATS_BATCH_ROWS):
+        table = _flatten_all(pa.Table.from_batches([batch]))
+        if matched is None:
+            # 只有展开后能精确对应的叶子列（不在 list 内）才能逐值统计
+            names = set(table.column_names)
+            matched = [path for path in paths if path in names]
+            for path in matched:
+                null_counts[path] = 0
+                sketches[path] = HyperLogLog()
+
+        for path in matched:
+            column = table.column(path)
+            null_counts[path] += column.null_count
+            values = pc.drop_null(column)
+            if pa.types.is_dictionary(values.type):
+                values = values.cast(values.type.value_type)
+            if len(values) > 0 and not pa.types.is_null(values.type):
+                sketches[path].add(values)
+
+            if path in missing_min_max:
+                current = _min_max(column)
+                if current is not None:
+                    previous = bounds.get(path)
+                    try:
+                        bounds[path] = current if previous is None else (
+                            min(previous[0], current[0]), max(previous[1], current[1]))
+                    except TypeError:
+                        pass
+
+        rows_scanned += batch.num_rows
+        if progress is not None:
+            progress(rows_scanned, metadata.num_rows)
+
+    for path in matched or []:
+        column_stats = stats[path]
+        column_stats["null_count"] = null_counts[path]
+        column_stats["unique_count"] = sketches[path].count()
+        column_stats["unique_count_approximate"] = True
+        column_stats["deep"] = True
+        if path in bounds:
+            column_stats["min_value"], column_stats["max_value"] = bounds[path]
+
+
+def collect_column_stats(parquet_file, deep: bool = False,
+                         progress: Optional[Callable[[int, int], None]] = None
+                         ) -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有列的统计信息
+
+    Args:
+        parquet_file: 打开的 ParquetFile
+        deep: 是否流式扫描全部数据计算深度统计
+        progress: 深度统计的进度回调 progress(已扫描行数, 总行数)
+
+    Returns:
+        {列路径: 统计信息}
+    """
+    stats = footer_column_stats(parquet_file.metadata)
+
+    try:
+        for path, values in sample_column_values(parquet_file, list(stats)).items():
+            stats[path]["sample_values"] = values
+    except Exception:
+        # 如果获取示例值失败，忽略
+        pass
+
+    if deep:
+        deep_column_stats(parquet_file, stats, progress)
+    return stats
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+parquet 数据集（多分片目录）
+
+把一个目录下的多个 parquet 分片（如 part-*.parquet）作为一张表浏览：
+- 按 glob 模式匹配分片，可选 hive 分区（路径中的 key=value 目录解析为分区列）
+- 并行读取各分片的 footer，合并为统一的 schema，并构建全局行偏移索引
+- 全局行号先二分定位到分片，再由分片的 row group 索引定位到 (row group, 局部偏移)，
+  读取时只打开覆盖该范围的分片
+"""
+
+import bisect
+import fnmatch
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+from parquet_cache import load_footer
+from row_group_index import read_rows
+
+# 默认匹配的分片文件
+DEFAULT_DATASET_PATTERN = '**/*.parquet'
+
+# 并行读取 footer 的线程数
+FOOTER_READ_WORKERS = int(os.environ.get('DATASET_FOOTER_WORKERS', 16))
+
+# 缓存的数据集数量
+MAX_CACHED_DATASETS = 8
+
+# 已打开的数据集在该时间（秒）内直接复用，不重新遍历目录和 stat 各分片
+DATASET_RECHECK_SECONDS = float(os.environ.get('DATASET_RECHECK_SECONDS', 5))
+
+
+def _is_hidden(relative_path: str) -> bool:
+    """以 . 或 _ 开头的文件/目录（如 _SUCCESS、_metadata、.crc）不作为分片"""
+    return any(part.startswith(('.', '_')) for part in relative_path.split(os.sep))
+
+
+def discover_shards(directory: str, pattern: str = DEFAULT_DATASET_PATTERN) -> List[str]:
+    """
+    按 glob 模式查找目录下的分片文件，按相对路径排序
+
+    Args:
+        directory: 数据集目录
+        pattern: 相对于目录的 glob 模式，** 匹配任意层子目录
+
+    Returns:
+        分片文件的绝对路径列表
+    """
+    directory = os.path.abspath(directory)
+    recursive = '**' in pattern
+    # fnmatch 的 * 可以匹配路径分隔符，** 与 * 等价，另外允许 **/ 匹配零层目录
+    patterns = {pattern, pattern.replace('**/', '')} if recursive else {pattern}
+
+    shards = []
+    for root, dirs, files in os.walk(directory):
+        relative_root = os.path.relpath(root, directory)
+        if relative_root != '.' and _is_hidden(relative_root):
+            dirs[:] = []
+            continue
+        for name in files:
+            relative = name if relative_root == '.' else os.path.join(relative_root, name)
+            if _is_hidden(relative):
+                continue
+            if not recursive and os.sep in relative:
+                continue
+            if any(fnmatch.fnmatch(relative, p) for p in patterns):
+                shards.append(relative)
+        if not recursive:
+            dirs[:] = []
+    shards.sort()
+    return [os.path.join(directory, relative) for relative in shards]
+
+
+def parse_hive_partitions(directory: str, shard_path: str) -> Dict[str, str]:
+    """从分片相对路径中的 key=value 目录解析分区值"""
+    relative_dir = os.path.dirname(os.path.relpath(shard_path, directory))
+    partitions = {}
+    if relative_dir:
+        for part in relative_dir.split(os.sep):
+            key, sep, value = part.partition('=')
+            if sep and key:
+                partitions[key] = value
+    return partitions
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """把分片的表对齐到统一 schema：缺少的列补空值，类型不同的列转换类型"""
+    arrays = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                column = column.cast(field.type)
+            arrays.append(column)
+        else:
+            arrays.append(pa.nulls(table.num_rows, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class Shard:
+    """数据集中的一个分片"""
+
+    def __init__(self, path: str, entry, partitions: Dict[str, str]):
+        self.path = path
+        # 只保留 footer 元数据和 row group 索引（不持有文件句柄），entry.open() 读取时临时打开
+        self.entry = entry
+        self.partitions = partitions
+
+    @property
+    def num_rows(self) -> int:
+        return self.entry.metadata.num_rows
+
+
+class ParquetDataset:
+    """多分片 parquet 数据集"""
+
+    def __init__(self, directory: str, pattern: str = DEFAULT_DATASET_PATTERN,
+                 partitioning: Optional[str] = 'auto', paths: Optional[List[str]] = None):
+        """
+        初始化 ParquetDataset
+
+        Args:
+            directory: 数据集目录
+            pattern: 分片文件的 glob 模式
+            partitioning: 'hive' 解析 key=value 分区目录，None 不解析，
+                          'auto' 在分片路径中存在 key=value 目录时按 hive 解析
+            paths: 已查找到的分片路径，None 时按 pattern 查找
+        """
+        if partitioning not in (None, 'auto', 'hive'):
+            raise ValueError(f"不支持的分区方式: {partitioning}")
+
+        self.directory = os.path.abspath(directory)
+        self.pattern = pattern
+        if paths is None:
+            paths = discover_shards(self.directory, pattern)
+        if not paths:
+            raise ValueError(f"目录下没有匹配 {pattern} 的 parquet 文件: {directory}")
+
+        partitions = [parse_hive_partitions(self.directory, path) for path in paths]
+        if partitioning == 'auto':
+            partitioning = 'hive' if any(partitions) else None
+        if partitioning is None:
+            partitions = [{} for _ in paths]
+        self.partitioning = partitioning
+
+        # 并行读取各分片的 footer；读取后立即关闭句柄，分片数不受文件描述符上限限制
+        with ThreadPoolExecutor(max_workers=min(FOOTER_READ_WORKERS, len(paths))) as pool:
+            entries = list(pool.map(load_footer, paths))
+        self.shards = [Shard(path, entry, parts)
+                       for path, entry, parts in zip(paths, entries, partitions)]
+        self.fingerprint = tuple(shard.entry.key for shard in self.shards)
+        # 最近一次确认分片未变化的时间
+        self.checked_at = time.time()
+
+        # 全局行偏移：offsets[i] 为第 i 个分片的起始行号，最后一个元素为总行数
+        self.offsets = [0]
+        for shard in self.shards:
+            self.offsets.append(self.offsets[-1] + shard.num_rows)
+
+        # 分区列放在数据列之后，值统一为字符串
+        self.partition_columns = list(OrderedDict.fromkeys(
+            key for shard in self.shards for key in shard.partitions))
+        # schema 直接从 footer 元数据转换，无需打开分片文件
+        data_schema = pa.unify_schemas([shard.entry.metadata.schema.to_arrow_schema()
+                                        for shard in self.shards])
+        self.schema = pa.schema(
+            [field for field in data_schema if field.name not in self.partition_columns] +
+            [pa.field(name, pa.string()) for name in self.partition_columns]
+        )
+
+    @property
+    def total_rows(self) -> int:
+        return self.offsets[-1]
+
+    @property
+    def num_row_groups(self) -> int:
+        return sum(shard.entry.metadata.num_row_groups for shard in self.shards)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(shard.entry.key[1] for shard in self.shards)
+
+    def locate(self, row: int) -> Tuple[int, int, int]:
+        """
+        把全局行号定位到 (分片序号, row group 序号, row group 内偏移)
+
+        Args:
+            row: 全局行号（从0开始）
+        """
+        if row < 0 or row >= self.total_rows:
+            raise IndexError(f"行号超出范围: {row}")
+        shard_idx = bisect.bisect_right(self.offsets, row) - 1
+        # 跳过空分片
+        while self.offsets[shard_idx + 1] <= row:
+            shard_idx += 1
+        rg_idx, local = self.shards[shard_idx].entry.index.locate(row - self.offsets[shard_idx])
+        return shard_idx, rg_idx, local
+
+    def read_table(self, start_row: int, num_rows: int,
+                   columns: Optional[List[str]] = None) -> pa.Table:
+        """
+        读取全局范围 [start_row, start_row + num_rows) 的数据，只打开覆盖该范围的分片
+
+        Args:
+            start_row: 全局起始行号
+            num_rows: 行数
+            columns: 要读取的列（支持 "a.b.c" 形式的嵌套字段路径和分区列），None 表示全部列
+        """
+        start_row = max(0, start_row)
+        end_row = min(self.total_rows, start_row + max(0, num_rows))
+        if columns is not None:
+            partition_columns = [c for c in columns if c in self.partition_columns]
+            data_columns = [c for c in columns if c not in self.partition_columns]
+        else:
+            partition_columns = self.partition_columns
+            data_columns = None
+
+        tables = []
+        if start_row < end_row:
+            first = bisect.bisect_right(self.offsets, start_row) - 1
+            for shard_idx in range(first, len(self.shards)):
+                shard_start = self.offsets[shard_idx]
+                if shard_start >= end_row:
+                    break
+                shard = self.shards[shard_idx]
+                local_start = max(0, start_row - shard_start)
+                local_count = min(shard.num_rows, end_row - shard_start) - local_start
+                if local_count <= 0:
+                    continue
+                tables.append(self._read_shard(shard, local_start, local_count,
+                                               data_columns, partition_columns))
+
+        if not tables:
+            # 空范围返回带 schema 的空表
+            tables.append(self._read_shard(self.shards[0], 0, 0, data_columns, partition_columns))
+
+        if columns is None:
+            schema = self.schema
+        else:
+            # 嵌套字段投影后的 struct 类型由实际读取的表决定，列顺序与请求一致
+            schema = pa.unify_schemas([table.schema for table in tables])
+            order = [name for name in self._output_names(columns) if name in schema.names]
+            schema = pa.schema([schema.field(name) for name in order])
+        return pa.concat_tables([_conform(table, schema) for table in tables])
+
+    def _read_shard(self, shard: Shard, local_start: int, local_count: int,
+                    data_columns: Optional[List[str]], partition_columns: List[str]) -> pa.Table:
+        """读取一个分片的局部范围，并追加常量分区列"""
+        with shard.entry.open() as parquet_file:
+            file_names = set(parquet_file.schema_arrow.names)
+            if data_columns is None:
+                projection = None
+            else:
+                # 该分片中不存在的列由 _conform 补空值
+                projection = [c for c in data_columns if c.split('.')[0] in file_names]
+            table = read_rows(parquet_file, shard.entry.index, local_start, local_count, projection)
+        for name in partition_columns:
+            value = shard.partitions.get(name)
+            table = table.append_column(pa.field(name, pa.string()),
+                                        pa.array([value] * table.num_rows, pa.string()))
+        if data_columns is not None:
+            # 请求的数据列在所有分片中都不存在时，按统一 schema 补空列
+            for name in data_columns:
+                top = name.split('.')[0]
+                if top not in table.column_names and top in self.schema.names:
+                    table = table.append_column(self.schema.field(top),
+                                                pa.nulls(table.num_rows, self.schema.field(top).type))
+        return table
+
+    def _output_names(self, columns: List[str]) -> List[str]:
+        """按请求顺序给出输出的顶层列名（嵌套路径对应其顶层列）"""
+        names = []
+        for column in columns:
+            name = column if column in self.partition_columns else column.split('.')[0]
+            if name not in names:
+                names.append(name)
+        return names
+
+    def get_info(self) -> Dict[str, Any]:
+        """数据集信息"""
+        return {
+            "file_type": "dataset",
+            "file_size_mb": round(self.total_bytes / (1024 * 1024), 2),
+            "total_rows": self.total_rows,
+            "num_columns": len(self.schema.names),
+            "columns": self.schema.names,
+            "row_groups": self.num_row_groups,
+            "num_shards": len(self.shards),
+            "pattern": self.pattern,
+            "partitioning": self.partitioning,
+            "partition_columns": self.partition_columns,
+            "shards": [
+                {
+                    "path": shard.path,
+                    "start_row": self.offsets[i],
+                    "num_rows": shard.num_rows,
+                    "row_groups": shard.entry.metadata.num_row_groups,
+                    "partitions": shard.partitions
+                }
+                for i, shard in enumerate(self.shards)
+            ]
+        }
+
+
+_datasets: "OrderedDict[Tuple, ParquetDataset]" = OrderedDict()
+_datasets_lock = threading.Lock()
+
+
+def open_dataset(directory: str, pattern: Optional[str] = None,
+                 partitioning: Optional[str] = 'auto') -> ParquetDataset:
+    """
+    打开数据集，分片列表、大小和修改时间都未变化时复用已构建的索引
+
+    距上次确认不超过 DATASET_RECHECK_SECONDS 时直接复用，不遍历目录，
+    连续翻页等高频请求不会反复 stat 所有分片
+
+    Args:
+        directory: 数据集目录
+        pattern: 分片文件的 glob 模式，None 使用默认模式
+        partitioning: 分区方式，见 ParquetDataset
+    """
+    pattern = pattern or DEFAULT_DATASET_PATTERN
+    key = (os.path.abspath(directory), pattern, partitioning)
+    with _datasets_lock:
+        dataset = _datasets.get(key)
+        if dataset is not None and time.time() - dataset.checked_at < DATASET_RECHECK_SECONDS:
+            _datasets.move_to_end(key)
+            return dataset
+
+    paths = discover_shards(directory, pattern)
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+    fingerprint = tuple(fingerprint)
+
+    with _datasets_lock:
+        dataset = _datasets.get(key)
+        if dataset is not None and dataset.fingerprint == fingerprint:
+            dataset.checked_at = time.time()
+            _datasets.move_to_end(key)
+            return dataset
+
+    dataset = ParquetDataset(directory, pattern, partitioning, paths)
+    with _datasets_lock:
+        _datasets[key] = dataset
+        _datasets.move_to_end(key)
+        while len(_datasets) > MAX_CACHED_DATASETS:
+            _datasets.popitem(last=False)
+    return dataset
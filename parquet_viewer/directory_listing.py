@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+目录列表
+
+用 os.scandir 一次遍历目录（类型判断不需要额外的 stat），扫描结果按短 TTL 缓存；
+排序、名称过滤和分页都在服务端完成，每次只返回一页。
+分页使用不透明的游标（上一页最后一项的位置和名称），目录在翻页期间有增删时
+按名称重新定位，不会重复或跳过太多条目。
+
+parquet 文件的行数、列数和压缩方式通过批量接口只为当前可见的条目读取 footer，
+在线程池中并行读取，结果按 (路径, 文件大小, 修改时间) 缓存。
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow.parquet as pq
+
+# 目录扫描结果的缓存时间（秒）
+LISTING_CACHE_TTL = 10
+
+# 最多缓存的目录数
+MAX_CACHED_LISTINGS = 16
+
+# 默认和最大的每页条目数
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# 支持的排序字段
+SORT_FIELDS = ('name', 'size', 'mtime')
+
+# 并行读取 footer 预览的线程数和单次请求的最大文件数
+PREVIEW_WORKERS = int(os.environ.get('PREVIEW_WORKERS', 8))
+MAX_PREVIEW_FILES = 500
+
+# 缓存的 footer 预览数量
+MAX_CACHED_PREVIEWS = 8192
+
+
+def scan_directory(directory: str) -> List[Dict[str, Any]]:
+    """
+    扫描目录，忽略以 . 开头的隐藏条目
+
+    Returns:
+        [{"name", "path", "type": "directory"|"file", "size", "mtime"}]
+    """
+    entries = []
+    with os.scandir(directory) as items:
+        for item in items:
+            if item.name.startswith('.'):
+                continue
+            try:
+                is_dir = item.is_dir()
+                stat = item.stat()
+            except OSError:
+                # 扫描期间被删除或无效的符号链接
+                continue
+            entries.append({
+                "name": item.name,
+                "path": os.path.join(directory, item.name),
+                "type": "directory" if is_dir else "file",
+                "size": 0 if is_dir else stat.st_size,
+                "mtime": stat.st_mtime
+            })
+    return entries
+
+
+def _sort_key(field: str):
+    """排序键：名称忽略大小写，大小和修改时间相同时再按名称"""
+    if field == 'name':
+        return lambda entry: (entry["name"].lower(), entry["name"])
+    return lambda entry: (entry[field], entry["name"].lower(), entry["name"])
+
+
+def _encode_cursor(offset: int, name: str) -> str:
+    payload = json.dumps([offset, name], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        offset, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(offset), str(name)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+class DirectoryLister:
+    """带短 TTL 缓存的目录列表"""
+
+    def __init__(self, ttl: float = LISTING_CACHE_TTL, max_entries: int = MAX_CACHED_LISTINGS):
+        """
+        初始化 DirectoryLister
+
+        Args:
+            ttl: 扫描结果的缓存时间（秒）
+            max_entries: 最多缓存的目录数
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # {(绝对路径, 排序字段, 方向, 过滤词): (扫描时间, 排好序的条目)}
+        self._views: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._scans: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entries(self, directory: str, scanner) -> Tuple[float, List[Dict[str, Any]]]:
+        """获取目录的扫描结果，超过 TTL 后重新扫描"""
+        key = os.path.abspath(directory)
+        now = time.time()
+        with self._lock:
+            cached = self._scans.get(key)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._scans.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        # 在锁外扫描，避免阻塞其他目录
+        scanned = (now, scanner(directory))
+        with self._lock:
+            self._scans[key] = scanned
+            self._scans.move_to_end(key)
+            while len(self._scans) > self.max_entries:
+                self._scans.popitem(last=False)
+        return scanned
+
+    def _get_view(self, directory: str, sort: str, order: str, query: str,
+                  scanner) -> List[Dict[str, Any]]:
+        """过滤并排序后的条目（目录在前），与扫描结果一起缓存"""
+        scanned_at, entries = self._get_entries(directory, scanner)
+        key = (os.path.abspath(directory), sort, order, query)
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None and cached[0] == scanned_at:
+                self._views.move_to_end(key)
+                return cached[1]
+
+        if query:
+            needle = query.lower()
+            entries = [entry for entry in entries if needle in entry["name"].lower()]
+        reverse = order == 'desc'
+        sort_key = _sort_key(sort)
+        directories = sorted((e for e in entries if e["type"] == "directory"),
+                             key=sort_key, reverse=reverse)
+        files = sorted((e for e in entries if e["type"] == "file"), key=sort_key, reverse=reverse)
+        view = directories + files
+
+        with self._lock:
+            self._views[key] = (scanned_at, view)
+            self._views.move_to_end(key)
+            while len(self._views) > self.max_entries * 4:
+                self._views.popitem(last=False)
+        return view
+
+    def list(self, directory: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+             sort: str = 'name', order: str = 'asc', query: str = '',
+             scanner=scan_directory) -> Dict[str, Any]:
+        """
+        列出一页目录条目
+
+        Args:
+            directory: 目录路径
+            cursor: 上一页返回的 next_cursor，None 表示第一页
+            limit: 每页条目数
+            sort: name / size / mtime
+            order: asc / desc
+            query: 名称过滤（忽略大小写的子串匹配）
+            scanner: 扫描函数，默认 scan_directory（上传目录可以改用内存索引）
+
+        Returns:
+            {"directories", "files", "total", "next_cursor"}
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"不支持的排序方向: {order}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        view = self._get_view(directory, sort, order, query or '', scanner)
+
+        start = 0
+        if cursor:
+            offset, name = _decode_cursor(cursor)
+            start = offset
+            if not (0 < offset <= len(view) and view[offset - 1]["name"] == name):
+                # 翻页期间目录有变化：按上一页最后一项的名称重新定位
+                for i, entry in enumerate(view):
+                    if entry["name"] == name:
+                        start = i + 1
+                        break
+            start = min(max(start, 0), len(view))
+
+        page = view[start:start + limit]
+        end = start + len(page)
+        return {
+            "directories": [entry for entry in page if entry["type"] == "directory"],
+            "files": [entry for entry in page if entry["type"] == "file"],
+            "total": len(view),
+            "next_cursor": _encode_cursor(end, page[-1]["name"]) if end < len(view) else None
+        }
+
+    def invalidate(self, directory: str):
+        """丢弃目录的缓存（目录内容被本服务修改时调用）"""
+        key = os.path.abspath(directory)
+        with self._lock:
+            self._scans.pop(key, None)
+            for view_key in [k for k in self._views if k[0] == key]:
+                del self._views[view_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "directories": len(self._scans),
+                "views": len(self._views),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class FooterPreviewer:
+    """批量读取 parquet footer 摘要（行数、列数、row group 数、压缩方式）"""
+
+    def __init__(self, max_workers: int = PREVIEW_WORKERS, max_entries: int = MAX_CACHED_PREVIEWS):
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def _read_preview(file_path: str) -> Dict[str, Any]:
+        """读取单个文件的 footer 摘要，不经过 footer 缓存，避免挤掉正在查看的文件"""
+        metadata = pq.read_metadata(file_path)
+        codecs = []
+        if metadata.num_row_groups > 0:
+            row_group = metadata.row_group(0)
+            for i in range(row_group.num_columns):
+                codec = row_group.column(i).compression
+                if codec not in codecs:
+                    codecs.append(codec)
+        return {
+            "num_rows": metadata.num_rows,
+            "num_columns": metadata.num_columns,
+            "num_row_groups": metadata.num_row_groups,
+            "compression": codecs,
+            "created_by": metadata.created_by
+        }
+
+    def _preview(self, file_path: str) -> Dict[str, Any]:
+        try:
+            stat = os.stat(file_path)
+            key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return {"error": "文件不存在"}
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        try:
+            preview = self._read_preview(file_path)
+        except Exception as e:
+            return {"error": str(e)}
+        with self._lock:
+            self._cache[key] = preview
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return preview
+
+    def previews(self, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        并行读取多个文件的 footer 摘要
+
+        Args:
+            paths: 文件路径列表（非 parquet 文件直接跳过）
+
+        Returns:
+            {路径: 摘要或 {"error": ...}}
+        """
+        if len(paths) > MAX_PREVIEW_FILES:
+            raise ValueError(f"单次最多预览 {MAX_PREVIEW_FILES} 个文件")
+        paths = [path for path in dict.fromkeys(paths) if path.lower().endswith('.parquet')]
+        if not paths:
+            return {}
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='footer-preview')
+            executor = self._executor
+        return dict(zip(paths, executor.map(self._preview, paths)))
+
+
+# 进程级共享实例
+directory_lister = DirectoryLister()
+footer_previewer = FooterPreviewer()
@@ -5,23 +5,49 @@
 
 import os
 import json
-import pandas as pd
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, Iterator, List, Optional
+import pyarrow as pa
 import pyarrow.parquet as pq
 
+from arrow_serializer import (column_to_pylist, preview_nested, records_to_columnar, table_to_columnar,
+                              table_to_records)
+from column_stats import collect_column_stats
+from dataset_reader import open_dataset
+from line_index import LineIndex, LineIndexPending, estimate_lines, read_lines_from_start
+from parquet_cache import parquet_file_cache
+from query_engine import resolve_type
+from row_group_index import iter_rows, read_rows
+
+
+# 小于该大小的文本文件在获取文件信息时直接扫描构建行索引以给出精确行数；
+# 更大的文件只给出估算行数，精确行数由后台任务（line_count）构建索引后得到
+LINE_INDEX_EAGER_BYTES = int(os.environ.get('LINE_INDEX_EAGER_BYTES', 32 * 1024 * 1024))
+
 
 class FileReader:
     """通用文件读取器"""
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, dataset_options: Optional[Dict[str, Any]] = None):
+        """
+        初始化 FileReader
+        
+        Args:
+            file_path: 文件路径；为目录时作为多分片 parquet 数据集打开
+            dataset_options: 数据集选项 {"pattern": 分片 glob 模式, "partitioning": "auto"/"hive"/None}
+        """
         self.file_path = file_path
+        self.dataset_options = dataset_options or {}
         self.file_type = self._detect_file_type()
+        self._dataset = None
     
     def _detect_file_type(self) -> str:
         """检测文件类型"""
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"文件不存在: {self.file_path}")
         
+        if os.path.isdir(self.file_path):
+            return 'dataset'
+        
         # 获取文件扩展名
         _, ext = os.path.splitext(self.file_path)
         ext = ext.lower()
@@ -39,11 +65,10 @@ class FileReader:
     def get_file_info(self) -> Dict[str, Any]:
         """获取文件基本信息"""
         try:
-            file_size = os.path.getsize(self.file_path)
-            file_size_mb = round(file_size / (1024 * 1024), 2)
-            
             if self.file_type == 'parquet':
                 return self._get_parquet_info()
+            elif self.file_type == 'dataset':
+                return self.dataset.get_info()
             elif self.file_type == 'json':
                 return self._get_json_info()
             else:
@@ -54,18 +79,24 @@ class FileReader:
     
     def _get_parquet_info(self) -> Dict[str, Any]:
         """获取parquet文件信息"""
-        parquet_file = pq.ParquetFile(self.file_path)
-        metadata = parquet_file.metadata
+        entry = parquet_file_cache.get(self.file_path)
+        metadata = entry.metadata
         
-        # 获取压缩信息
-        compression_info = self._get_compression_info(parquet_file)
+        with entry.open() as parquet_file:
+            # 获取压缩信息
+            compression_info = self._get_compression_info(parquet_file)
+            
+            # 顶层列名用于展示和列投影，叶子列路径用于嵌套字段投影
+            columns = parquet_file.schema_arrow.names
+        column_paths = [metadata.schema.column(i).path for i in range(metadata.num_columns)]
         
         return {
             "file_type": "parquet",
             "file_size_mb": round(os.path.getsize(self.file_path) / (1024 * 1024), 2),
             "total_rows": metadata.num_rows,
-            "num_columns": len(metadata.schema.names),
-            "columns": metadata.schema.names,
+            "num_columns": len(columns),
+            "columns": columns,
+            "column_paths": column_paths,
             "row_groups": metadata.num_row_groups,
             "compression": compression_info
         }
@@ -96,12 +127,15 @@ class FileReader:
                     # 单行JSON对象
                     columns = list(json_data.keys())
             
-            return {
+            info = {
                 "file_type": "json",
                 "file_size_mb": round(os.path.getsize(self.file_path) / (1024 * 1024), 2),
                 "columns": columns
-                # 不计算total_rows、num_columns、row_groups、compression等统计信息
+                # 不计算num_columns、row_groups、compression等统计信息
             }
+            
+            info.update(self._get_line_count_info())
+            return info
         except Exception as e:
             raise Exception(f"解析JSON文件失败: {str(e)}")
     
@@ -111,14 +145,29 @@ class FileReader:
             # 只读取文件大小，不读取内容
             file_size = os.path.getsize(self.file_path)
             
-            return {
+            info = {
                 "file_type": "text",
                 "file_size_mb": round(file_size / (1024 * 1024), 2)
-                # 不计算total_rows、num_columns、row_groups、compression等统计信息
+                # 不计算num_columns、row_groups、compression等统计信息
             }
+            
+            info.update(self._get_line_count_info())
+            return info
         except Exception as e:
             raise Exception(f"读取文本文件失败: {str(e)}")
     
+    def _get_line_count_info(self) -> Dict[str, Any]:
+        """
+        行数信息：行索引已存在或文件较小时给出精确行数 total_rows；
+        否则给出按样本估算的 approx_total_rows，并标记 total_rows_pending（需要后台构建索引）
+        """
+        index = LineIndex.load(self.file_path)
+        if index is None and os.path.getsize(self.file_path) <= LINE_INDEX_EAGER_BYTES:
+            index = LineIndex.load_or_build(self.file_path)
+        if index is not None:
+            return {"total_rows": index.total_lines}
+        return {"approx_total_rows": estimate_lines(self.file_path), "total_rows_pending": True}
+    
     def _get_compression_info(self, parquet_file) -> Dict[str, Any]:
         """获取压缩信息（仅用于parquet文件）"""
         metadata = parquet_file.metadata
@@ -151,27 +200,128 @@ class FileReader:
         
         return compression_info
     
-    def read_top_rows(self, num_rows: int = 10) -> List[Dict[str, Any]]:
-        """读取前N行数据"""
+    def read_top_rows(self, num_rows: int = 10, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """读取前N行数据，columns 为要读取的列（支持 "a.b.c" 形式的嵌套字段路径）"""
         try:
-            if self.file_type == 'parquet':
-                return self._read_parquet_top_rows(num_rows)
+            if self.file_type in ('parquet', 'dataset'):
+                return self._read_parquet_top_rows(num_rows, columns)
             elif self.file_type == 'json':
-                return self._read_json_top_rows(num_rows)
+                return self._project_records(self._read_json_top_rows(num_rows), columns)
             else:
                 return self._read_text_top_rows(num_rows)
         except Exception as e:
             raise Exception(f"读取数据失败: {str(e)}")
     
-    def _read_parquet_top_rows(self, num_rows: int) -> List[Dict[str, Any]]:
+    def _read_parquet_top_rows(self, num_rows: int, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """读取parquet文件前N行"""
-        parquet_file = pq.ParquetFile(self.file_path)
-        table = parquet_file.read_row_group(0)
-        df = table.to_pandas()
+        return self._read_parquet_slice(0, num_rows, columns)
+    
+    def _read_parquet_slice(self, start_row: int, num_rows: int,
+                            columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """读取parquet文件指定范围，按列直接从Arrow数组序列化为行记录"""
+        return table_to_records(self.read_table(start_row, num_rows, columns))
+    
+    def read_table(self, start_row: int, num_rows: int,
+                   columns: Optional[List[str]] = None) -> pa.Table:
+        """根据row group行偏移索引读取指定范围的Arrow Table，只解码覆盖该范围的row group和请求的列（仅支持parquet文件和数据集）"""
+        if self.file_type == 'dataset':
+            return self.dataset.read_table(start_row, num_rows, columns)
+        if self.file_type != 'parquet':
+            raise ValueError(f"仅支持parquet文件: {self.file_path}")
+        
+        entry = parquet_file_cache.get(self.file_path)
+        with entry.open() as parquet_file:
+            return read_rows(parquet_file, entry.index, start_row, num_rows, columns)
+    
+    def iter_batches(self, start_row: int, num_rows: int, columns: Optional[List[str]] = None,
+                     batch_size: int = 1024) -> Iterator[pa.RecordBatch]:
+        """
+        逐批读取指定范围的数据（仅支持parquet文件和数据集），用于流式响应
+
+        parquet 文件单独打开一个句柄并复用缓存的元数据，流式输出期间不占用缓存条目的锁；
+        数据集先按分片读取整个范围再分批输出（各分片的 schema 需要统一）
+        """
+        if self.file_type == 'dataset':
+            yield from self.dataset.read_table(start_row, num_rows, columns).to_batches(batch_size)
+            return
+        if self.file_type != 'parquet':
+            raise ValueError(f"仅支持parquet文件: {self.file_path}")
+        
+        entry = parquet_file_cache.get(self.file_path)
+        parquet_file = pq.ParquetFile(self.file_path, metadata=entry.metadata)
+        try:
+            yield from iter_rows(parquet_file, entry.index, start_row, num_rows, columns, batch_size)
+        finally:
+            parquet_file.close()
+    
+    def read_cell(self, row: int, column: str) -> Any:
+        """
+        读取单个单元格的完整值（仅支持parquet文件和数据集）
+
+        只读取该列（"a.b.c" 形式的路径只读取对应的叶子列）在该行所在 row group 中的数据
+
+        Args:
+            row: 全局行号（从0开始）
+            column: 列名或嵌套字段路径
+
+        Raises:
+            ValueError: 列不存在
+            IndexError: 行号超出范围
+        """
+        # 先按 schema 检查列路径，不存在时给出明确的错误而不是读取时的越界错误
+        if self.file_type == 'dataset':
+            schema = self.dataset.schema
+        else:
+            schema = parquet_file_cache.get(self.file_path).metadata.schema.to_arrow_schema()
+        resolve_type(schema, column)
+        table = self.read_table(row, 1, [column])
+        if table.num_rows == 0:
+            raise IndexError(f"行号超出范围: {row}")
+        if column in table.column_names:
+            return column_to_pylist(table.column(column))[0]
+        # 嵌套字段路径：读取结果为只含该字段的 struct，逐层取出
+        value = column_to_pylist(table.column(0))[0]
+        for part in column.split('.')[1:]:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+    
+    @property
+    def dataset(self):
+        """目录对应的 parquet 数据集（首次访问时打开，分片未变化时复用已构建的索引）"""
+        if self._dataset is None:
+            self._dataset = open_dataset(self.file_path,
+                                         pattern=self.dataset_options.get('pattern'),
+                                         partitioning=self.dataset_options.get('partitioning', 'auto'))
+        return self._dataset
+    
+    def read_columnar(self, start_row: int, num_rows: int, columns: Optional[List[str]] = None,
+                      preview_items: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取指定范围的数据，返回列式结构 {"columns": [...], "data": {列名: [...]}}
+
+        preview_items 不为 None 时（仅parquet文件和数据集）list 值只保留前 preview_items 个元素，
+        被截断的单元格在 "truncated" 中给出 {列名: [[行号, list 长度], ...]}，完整值通过 read_cell 读取
+        """
+        if self.file_type in ('parquet', 'dataset'):
+            try:
+                table = self.read_table(start_row, num_rows, columns)
+                truncated = None
+                if preview_items is not None:
+                    table, truncated = preview_nested(table, preview_items)
+                result = table_to_columnar(table)
+                if truncated:
+                    result["truncated"] = truncated
+                return result
+            except Exception as e:
+                raise Exception(f"读取切片数据失败: {str(e)}")
         
-        # 转换为字典列表
-        result = df.head(num_rows).to_dict('records')
-        return self._serialize_data(result)
+        if start_row == 0:
+            records = self.read_top_rows(num_rows, columns)
+        else:
+            records = self.read_slice(start_row, num_rows, columns)
+        return records_to_columnar(records)
     
     def _read_json_top_rows(self, num_rows: int) -> List[Dict[str, Any]]:
         """读取JSON文件前N行 - 优化版本，只读取需要的行数"""
@@ -218,6 +368,80 @@ class FileReader:
         
         return result
     
+    def line_index_pending(self, start_row: int) -> bool:
+        """读取该行是否需要等待后台构建行索引（文本/JSON 文件没有索引、文件较大且行号靠后）"""
+        if self.file_type not in ('json', 'text') or start_row <= 0:
+            return False
+        try:
+            self._read_raw_lines(start_row, 0)
+        except LineIndexPending:
+            return True
+        return False
+    
+    def _read_raw_lines(self, start_row: int, num_rows: int) -> List[bytes]:
+        """
+        读取原始行：有行索引时一次 seek 加短扫描；没有索引时小文件当场构建索引，
+        大文件不在请求线程中扫描整个文件，而是从开头顺序读取（行号过于靠后时抛出 LineIndexPending）
+        """
+        index = LineIndex.load(self.file_path)
+        if index is None and os.path.getsize(self.file_path) <= LINE_INDEX_EAGER_BYTES:
+            index = LineIndex.load_or_build(self.file_path)
+        if index is None:
+            return read_lines_from_start(self.file_path, start_row, num_rows)
+        return index.read_lines(self.file_path, start_row, num_rows)
+    
+    def _read_json_slice(self, start_row: int, num_rows: int) -> List[Any]:
+        """通过行索引读取JSON Lines文件的指定行"""
+        raw_lines = self._read_raw_lines(start_row, num_rows)
+        lines = [line.decode('utf-8', errors='replace').rstrip('\r\n') for line in raw_lines]
+        
+        json_data = self._parse_json_lines(lines)
+        if json_data is None:
+            raise Exception("无法解析JSON文件格式")
+        return json_data if isinstance(json_data, list) else [json_data]
+    
+    def _read_text_slice(self, start_row: int, num_rows: int) -> List[Dict[str, Any]]:
+        """通过行索引读取文本文件的指定行，只需一次seek加短扫描"""
+        raw_lines = self._read_raw_lines(start_row, num_rows)
+        
+        result = []
+        for i, line in enumerate(raw_lines):
+            content = line.decode('utf-8', errors='replace')
+            if content.endswith('\r\n'):
+                content = content[:-2] + '\n'
+            result.append({
+                "line_number": start_row + i + 1,
+                "content": content
+            })
+        return result
+    
+    def _project_records(self, records: List[Any], columns: Optional[List[str]]) -> List[Any]:
+        """按列投影JSON记录，支持 "a.b.c" 形式的嵌套字段路径"""
+        if not columns:
+            return records
+        
+        result = []
+        for record in records:
+            if not isinstance(record, dict):
+                result.append(record)
+                continue
+            projected = {}
+            for column in columns:
+                parts = column.split('.')
+                value = record
+                for part in parts:
+                    if not isinstance(value, dict) or part not in value:
+                        break
+                    value = value[part]
+                else:
+                    # 按路径重建嵌套结构，只保留请求的叶子字段
+                    target = projected
+                    for part in parts[:-1]:
+                        target = target.setdefault(part, {})
+                    target[parts[-1]] = value
+            result.append(projected)
+        return result
+    
     def _parse_json_file(self) -> Any:
         """解析JSON文件"""
         with open(self.file_path, 'r', encoding='utf-8') as f:
@@ -267,150 +491,45 @@ class FileReader:
         # 如果都失败，返回None
         return None
     
-    def _serialize_data(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """处理数据，确保可以JSON序列化"""
-        def convert_value(value):
-            if pd.isna(value):
-                return None
-            elif isinstance(value, (int, float, str, bool)):
-                return value
-            elif isinstance(value, (pd.Timestamp, pd.DatetimeTZDtype)):
-                return str(value)
-            elif hasattr(value, 'item'):  # numpy类型
-                return value.item()
-            elif isinstance(value, (list, tuple)):
-                # 处理列表和元组
-                return [convert_value(item) for item in value]
-            elif isinstance(value, dict):
-                # 处理字典
-                return {str(k): convert_value(v) for k, v in value.items()}
-            elif hasattr(value, '__dict__'):
-                # 处理对象
-                return str(value)
-            else:
-                return str(value)
-        
-        result = []
-        for row in data:
-            converted_row = {}
-            for key, value in row.items():
-                try:
-                    converted_row[str(key)] = convert_value(value)
-                except Exception as e:
-                    # 如果转换失败，记录错误并使用字符串表示
-                    print(f"Warning: Failed to convert value {value} of type {type(value)}: {e}")
-                    converted_row[str(key)] = str(value)
-            result.append(converted_row)
-        
-        return result
-    
-    def get_column_stats(self) -> Dict[str, Any]:
-        """获取列统计信息（仅支持parquet文件）"""
+    def get_column_stats(self, deep: bool = False,
+                         progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        获取列统计信息（仅支持parquet文件）
+
+        Args:
+            deep: 是否流式扫描全部 row group，计算精确空值数、近似去重数和缺失的 min/max
+            progress: 深度统计的进度回调 progress(已扫描行数, 总行数)
+        """
         if self.file_type != 'parquet':
             return {}
         
         try:
-            parquet_file = pq.ParquetFile(self.file_path)
-            metadata = parquet_file.metadata
-            
-            stats = {}
-            
-            # 获取schema信息
-            schema = metadata.schema
-            
-            # 遍历所有列
-            for i, column_name in enumerate(schema.names):
-                column = schema.column(i)
-                
-                # 获取列的基本信息
-                column_stats = {
-                    "dtype": str(column.physical_type),
-                    "logical_type": str(column.logical_type) if column.logical_type else None,
-                    "null_count": 0,
-                    "unique_count": None,
-                    "sample_values": [],
-                    "compression": None,
-                    "total_size": 0,
-                    "min_value": None,
-                    "max_value": None
-                }
-                
-                # 从所有row groups中收集统计信息
-                total_null_count = 0
-                total_size = 0
-                min_values = []
-                max_values = []
-                
-                for rg_idx in range(metadata.num_row_groups):
-                    row_group = metadata.row_group(rg_idx)
-                    col_chunk = row_group.column(i)
-                    
-                    if col_chunk.statistics:
-                        stats_info = col_chunk.statistics
-                        if hasattr(stats_info, 'null_count') and stats_info.null_count is not None:
-                            total_null_count += stats_info.null_count
-                        
-                        if hasattr(stats_info, 'min') and stats_info.min is not None:
-                            min_values.append(stats_info.min)
-                        if hasattr(stats_info, 'max') and stats_info.max is not None:
-                            max_values.append(stats_info.max)
-                    
-                    total_size += col_chunk.total_compressed_size
-                    
-                    if column_stats["compression"] is None:
-                        column_stats["compression"] = col_chunk.compression
-                
-                # 更新统计信息
-                column_stats["null_count"] = total_null_count
-                column_stats["total_size"] = total_size
-                
-                if min_values:
-                    column_stats["min_value"] = min(min_values)
-                if max_values:
-                    column_stats["max_value"] = max(max_values)
-                
-                # 尝试获取示例值
+            entry = parquet_file_cache.get(self.file_path)
+            if deep:
+                # 深度统计需要扫描整个文件，使用独立句柄，不阻塞同一文件的分页读取
+                parquet_file = pq.ParquetFile(self.file_path, metadata=entry.metadata)
                 try:
-                    if metadata.num_row_groups > 0:
-                        first_rg = metadata.row_group(0)
-                        if first_rg.num_rows > 0:
-                            sample_data = self.read_top_rows(min(5, first_rg.num_rows))
-                            if sample_data and column_name in sample_data[0]:
-                                sample_values = []
-                                for row in sample_data:
-                                    if column_name in row and row[column_name] is not None:
-                                        val = row[column_name]
-                                        if hasattr(val, 'item'):
-                                            sample_values.append(val.item())
-                                        else:
-                                            sample_values.append(val)
-                                        if len(sample_values) >= 3:
-                                            break
-                                column_stats["sample_values"] = sample_values
-                except:
-                    pass
-                
-                stats[column_name] = column_stats
+                    return collect_column_stats(parquet_file, deep=True, progress=progress)
+                finally:
+                    parquet_file.close()
             
-            return stats
+            with entry.open() as parquet_file:
+                return collect_column_stats(parquet_file)
             
         except Exception as e:
             raise Exception(f"获取列统计信息失败: {str(e)}")
     
-    def read_slice(self, start_row: int, num_rows: int) -> List[Dict[str, Any]]:
-        """读取指定范围的数据（仅支持parquet文件）"""
-        if self.file_type != 'parquet':
-            return self.read_top_rows(num_rows)
-        
+    def read_slice(self, start_row: int, num_rows: int,
+                   columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """读取指定范围的数据，文本和JSON Lines文件通过稀疏行索引定位"""
         try:
-            parquet_file = pq.ParquetFile(self.file_path)
-            table = parquet_file.read_row_group(0)
-            df = table.to_pandas()
-            
-            # 转换为字典列表
-            result = df.iloc[start_row:start_row + num_rows].to_dict('records')
-            return self._serialize_data(result)
-            
+            if self.file_type == 'json':
+                return self._project_records(self._read_json_slice(start_row, num_rows), columns)
+            elif self.file_type == 'text':
+                return self._read_text_slice(start_row, num_rows)
+            return self._read_parquet_slice(start_row, num_rows, columns)
+        except LineIndexPending:
+            raise
         except Exception as e:
             raise Exception(f"读取切片数据失败: {str(e)}")
 
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+后台分析任务
+
+整文件的分析（JSONL 精确行数、深度列统计、全文搜索等）提交到有界线程池中执行，
+请求线程立即返回任务 id，前端轮询任务的进度和阶段性结果，也可以取消任务。
+完成的结果按 (路径, 文件大小, 修改时间, 任务类型, 参数) 缓存，
+相同的分析再次提交时直接返回缓存结果；同一分析正在执行时复用同一个任务。
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    """任务已被取消，由进度回调抛出以中止执行"""
+
+
+class Job:
+    """单个后台任务"""
+
+    def __init__(self, job_type: str, file_path: str, params: Dict[str, Any], key: Tuple):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.file_path = file_path
+        self.params = params
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0
+        self.partial_result = None
+        self.result = None
+        self.error = None
+        self.cache_hit = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """请求取消，任务在下一次报告进度时中止"""
+        self._cancel_event.set()
+        with self._lock:
+            if self.status == PENDING:
+                self.status = CANCELLED
+                self.finished_at = time.time()
+
+    def report(self, done: float, total: float, partial: Any = None):
+        """
+        报告进度（由任务函数调用）
+
+        Args:
+            done: 已完成的工作量
+            total: 总工作量
+            partial: 阶段性结果，None 表示不更新
+
+        Raises:
+            JobCancelled: 任务已被取消
+        """
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.progress = min(1.0, done / total) if total else 0.0
+            if partial is not None:
+                self.partial_result = partial
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可 JSON 序列化的字典"""
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "type": self.type,
+                "file_path": self.file_path,
+                "params": self.params,
+                "status": self.status,
+                "cancel_requested": self.cancelled,
+                "progress": round(self.progress, 4),
+                "partial_result": self.partial_result if self.status == RUNNING else None,
+                "result": self.result,
+                "error": self.error,
+                "cache_hit": self.cache_hit,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_ms": round(((self.finished_at or time.time()) -
+                                     (self.started_at or self.created_at)) * 1000, 2)
+            }
+
+
+class JobManager:
+    """后台任务管理器"""
+
+    def __init__(self, max_workers: int = 4, max_cached_results: int = 128,
+                 max_finished_jobs: int = 256):
+        """
+        初始化 JobManager
+
+        Args:
+            max_workers: 同时执行的任务数
+            max_cached_results: 缓存的分析结果数量
+            max_finished_jobs: 保留的已结束任务数量（供轮询查询）
+        """
+        self.max_workers = max_workers
+        self.max_cached_results = max_cached_results
+        self.max_finished_jobs = max_finished_jobs
+        self._handlers: Dict[str, Callable] = {}
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active: Dict[Tuple, Job] = {}
+        self._results: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def configure(self, max_workers: int = None):
+        """调整线程池大小（仅在第一个任务提交前生效）"""
+        with self._lock:
+            if max_workers is not None and self._executor is None:
+                self.max_workers = max_workers
+
+    def register(self, job_type: str, handler: Callable[[str, Dict[str, Any], Job], Any]):
+        """
+        注册任务类型
+
+        Args:
+            job_type: 任务类型名称
+            handler: 任务函数 handler(file_path, params, job)，返回可 JSON 序列化的结果，
+                     执行中通过 job.report() 报告进度
+        """
+        self._handlers[job_type] = handler
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    @staticmethod
+    def _make_key(job_type: str, file_path: str, params: Dict[str, Any]) -> Tuple:
+        """结果缓存键：(绝对路径, 文件大小, 修改时间, 任务类型, 参数)"""
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, job_type,
+                json.dumps(params, sort_keys=True, ensure_ascii=False))
+
+    def submit(self, job_type: str, file_path: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        提交任务
+
+        Args:
+            job_type: 任务类型
+            file_path: 分析的文件路径
+            params: 任务参数
+
+        Returns:
+            Job（命中结果缓存时为已完成的任务）
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        params = params or {}
+        key = self._make_key(job_type, file_path, params)
+
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None and not active.cancelled:
+                return active
+
+            job = Job(job_type, file_path, params, key)
+            self._jobs[job.id] = job
+            if key in self._results:
+                self._results.move_to_end(key)
+                job.status = COMPLETED
+                job.progress = 1.0
+                job.result = self._results[key]
+                job.cache_hit = True
+                job.started_at = job.finished_at = job.created_at
+            else:
+                self._active[key] = job
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='analysis-job')
+                self._executor.submit(self._run, job)
+            self._prune_locked()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """按 id 获取任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务"""
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED_STATES:
+            job.cancel()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+        return job
+
+    def invalidate(self, file_path: str):
+        """丢弃某个文件的所有缓存结果（文件被删除时调用）"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [k for k in self._results if k[0] == path]:
+                del self._results[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """任务统计信息"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "jobs": counts,
+                "cached_results": len(self._results)
+            }
+
+    def _run(self, job: Job):
+        """在线程池中执行任务"""
+        with job._lock:
+            if job.status != PENDING:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+
+        status, result, error = COMPLETED, None, None
+        try:
+            result = self._handlers[job.type](job.file_path, job.params, job)
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            if status == COMPLETED:
+                self._results[job.key] = result
+                self._results.move_to_end(job.key)
+                while len(self._results) > self.max_cached_results:
+                    self._results.popitem(last=False)
+
+        with job._lock:
+            job.status = CANCELLED if job.cancelled else status
+            job.result = result if job.status == COMPLETED else None
+            job.error = error
+            if job.status == COMPLETED:
+                job.progress = 1.0
+            job.finished_at = time.time()
+
+    def _prune_locked(self):
+        """只保留最近的已结束任务"""
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+
+# 进程级共享任务管理器，并发数可通过环境变量或 app.py 中的配置调整
+job_manager = JobManager(max_workers=int(os.environ.get('ANALYSIS_JOB_WORKERS', 4)))
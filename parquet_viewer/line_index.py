@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+文本/JSONL 文件的稀疏行偏移索引
+
+用 mmap 按固定大小的块扫描文件，在块内用 NumPy 向量化查找换行符，
+每个块内每隔 stride 行记录一个 (行号, 起始字节偏移) 检查点；
+大文件的各个块分发到进程池并行扫描，接近磁盘带宽，不会把行加载为 Python 字符串。
+索引保存为紧凑的二进制旁路文件（文件头 + 两个 array('Q')），
+用文件大小和修改时间校验是否过期。定位第 K 行只需一次 seek 加不超过 stride 行的短扫描。
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# 每隔多少行记录一个检查点
+LINE_INDEX_STRIDE = 4096
+
+# 源文件所在目录不可写时，旁路索引文件的存放目录
+LINE_INDEX_DIR = os.environ.get(
+    'LINE_INDEX_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.line_index')
+)
+
+# 每个扫描块的大小
+SCAN_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 超过该大小的文件使用进程池并行扫描
+PARALLEL_SCAN_BYTES = 1024 * 1024 * 1024
+
+# 并行扫描的进程数
+SCAN_WORKERS = int(os.environ.get('LINE_INDEX_WORKERS', os.cpu_count() or 1))
+
+# 估算行数时读取的样本大小
+ESTIMATE_SAMPLE_BYTES = 4 * 1024 * 1024
+
+# 没有行索引时，最多从文件开头顺序跳过这么多行读取一页；更靠后的页需要等后台任务建好索引
+STREAM_MAX_SKIP_LINES = int(os.environ.get('LINE_STREAM_MAX_SKIP_LINES', 200000))
+
+
+class LineIndexPending(Exception):
+    """文件没有行索引且请求的行太靠后，需要先在后台构建索引"""
+
+    def __init__(self, file_path: str, start_line: int):
+        super().__init__(f"正在建立行索引，第 {start_line + 1} 行暂不可读，请稍后重试")
+        self.file_path = file_path
+        self.start_line = start_line
+
+
+def _scan_chunk(args: Tuple[str, int, int, int]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """
+    扫描文件的一个块（在子进程中执行）
+
+    Args:
+        args: (文件路径, 块起始偏移, 块结束偏移, stride)
+
+    Returns:
+        (块内换行符数量, 检查点的块内行号, 检查点的字节偏移)
+        块内行号 k 表示块内第 k 个换行符之后开始的行（从1开始）
+    """
+    file_path, start, end, stride = args
+    # mmap 的偏移必须按分配粒度对齐
+    aligned = start - start % mmap.ALLOCATIONGRANULARITY
+    with open(file_path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), end - aligned, offset=aligned, access=mmap.ACCESS_READ)
+        try:
+            view = np.frombuffer(mm, dtype=np.uint8, offset=start - aligned)
+            newlines = np.flatnonzero(view == 10)
+            del view
+        finally:
+            mm.close()
+
+    picked = newlines[::stride].astype(np.uint64)
+    local_lines = np.arange(1, len(newlines) + 1, stride, dtype=np.uint64)
+    return len(newlines), local_lines, picked + np.uint64(start + 1)
+
+
+def _chunk_ranges(file_size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """把文件切分为固定大小的块"""
+    return [(start, min(start + chunk_size, file_size))
+            for start in range(0, file_size, chunk_size)]
+
+
+def _map_chunks(file_path: str, file_size: int, stride: int):
+    """按顺序返回每个块的扫描结果，大文件使用进程池并行扫描"""
+    tasks = [(file_path, start, end, stride)
+             for start, end in _chunk_ranges(file_size, SCAN_CHUNK_SIZE)]
+    if file_size < PARALLEL_SCAN_BYTES or SCAN_WORKERS <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _scan_chunk(task)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=min(SCAN_WORKERS, len(tasks)))
+    try:
+        for result in pool.map(_scan_chunk, tasks):
+            yield result
+    finally:
+        # 提前结束（如后台任务被取消）时丢弃尚未开始扫描的块
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _last_byte(file_path: str, file_size: int) -> bytes:
+    """读取文件最后一个字节"""
+    with open(file_path, 'rb') as f:
+        f.seek(file_size - 1)
+        return f.read(1)
+
+
+def count_lines(file_path: str) -> int:
+    """
+    统计文件行数（最后一行没有换行符时也算一行）
+
+    Args:
+        file_path: 文本文件路径
+    """
+    return LineIndex.build(file_path).total_lines
+
+
+def read_lines_from_start(file_path: str, start_line: int, num_lines: int) -> List[bytes]:
+    """
+    不使用索引，从文件开头按块统计换行符跳过 start_line 行后读取 num_lines 行（保留换行符）
+
+    Raises:
+        LineIndexPending: start_line 超过 STREAM_MAX_SKIP_LINES
+    """
+    if start_line > STREAM_MAX_SKIP_LINES:
+        raise LineIndexPending(file_path, start_line)
+    if num_lines <= 0:
+        return []
+    with open(file_path, 'rb') as f:
+        remaining = start_line
+        offset = 0
+        while remaining > 0:
+            block = f.read(1024 * 1024)
+            if not block:
+                return []
+            count = block.count(b'\n')
+            if count < remaining:
+                remaining -= count
+                offset += len(block)
+                continue
+            # 第 remaining 个换行符之后即为起始行
+            pos = -1
+            for _ in range(remaining):
+                pos = block.find(b'\n', pos + 1)
+            offset += pos + 1
+            remaining = 0
+        f.seek(offset)
+        lines = []
+        for _ in range(num_lines):
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line)
+    return lines
+
+
+def estimate_lines(file_path: str, sample_bytes: int = ESTIMATE_SAMPLE_BYTES) -> int:
+    """
+    按文件开头样本的平均行长估算行数（不扫描整个文件）
+
+    Args:
+        file_path: 文本文件路径
+        sample_bytes: 读取的样本字节数
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return 0
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    newlines = sample.count(b'\n')
+    if len(sample) >= file_size:
+        return newlines + (0 if sample.endswith(b'\n') else 1)
+    if newlines == 0:
+        return 1
+    return max(1, round(file_size * newlines / len(sample)))
+
+
+class LineIndex:
+    """稀疏行偏移索引"""
+
+    MAGIC = b'LIDX'
+    VERSION = 2
+    # magic, version, stride, 文件大小, 修改时间(ns), 总行数, 检查点数量
+    HEADER = struct.Struct('<4sIIQqQQ')
+
+    def __init__(self, file_size: int, mtime_ns: int, stride: int,
+                 total_lines: int, lines: array, offsets: array):
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+        self.stride = stride
+        self.total_lines = total_lines
+        # 第 i 个检查点：第 lines[i] 行（从0开始）的起始字节偏移为 offsets[i]
+        # 相邻检查点之间最多相隔 stride 行
+        self.lines = lines
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, file_path: str, stride: int = LINE_INDEX_STRIDE,
+              progress: Optional[Callable[[int, int], None]] = None) -> 'LineIndex':
+        """
+        扫描文件构建索引
+
+        Args:
+            file_path: 文本文件路径
+            stride: 每隔多少行记录一个检查点
+            progress: 进度回调 progress(已扫描字节数, 文件大小)，每个块扫描完成后调用
+
+        Returns:
+            LineIndex
+        """
+        stat = os.stat(file_path)
+        file_size = stat.st_size
+        lines = array('Q', [0])
+        offsets = array('Q', [0])
+        total_newlines = 0
+        scanned = 0
+
+        for count, local_lines, chunk_offsets in _map_chunks(file_path, file_size, stride):
+            # 块内行号加上之前所有块的换行符数量即为全局行号
+            lines.frombytes((local_lines + np.uint64(total_newlines)).tobytes())
+            offsets.frombytes(chunk_offsets.tobytes())
+            total_newlines += count
+            if progress is not None:
+                scanned = min(scanned + SCAN_CHUNK_SIZE, file_size)
+                progress(scanned, file_size)
+
+        total_lines = total_newlines
+        # 最后一行没有换行符时也算一行
+        if file_size > 0 and _last_byte(file_path, file_size) != b'\n':
+            total_lines += 1
+        # 文件以换行符结尾时，最后一个检查点指向文件末尾，不是有效的行首
+        while len(offsets) > 1 and offsets[-1] >= file_size:
+            offsets.pop()
+            lines.pop()
+
+        return cls(file_size, stat.st_mtime_ns, stride, total_lines, lines, offsets)
+
+    @classmethod
+    def load(cls, file_path: str) -> Optional['LineIndex']:
+        """
+        加载旁路索引文件，索引不存在或已过期时返回 None
+
+        Args:
+            file_path: 文本文件路径
+        """
+        stat = os.stat(file_path)
+        for index_path in _index_paths(file_path):
+            try:
+                with open(index_path, 'rb') as f:
+                    header = f.read(cls.HEADER.size)
+                    if len(header) != cls.HEADER.size:
+                        continue
+                    (magic, version, stride, file_size, mtime_ns,
+                     total_lines, num_checkpoints) = cls.HEADER.unpack(header)
+                    if (magic != cls.MAGIC or version != cls.VERSION or
+                            file_size != stat.st_size or mtime_ns != stat.st_mtime_ns):
+                        continue
+                    lines = array('Q')
+                    offsets = array('Q')
+                    lines.fromfile(f, num_checkpoints)
+                    offsets.fromfile(f, num_checkpoints)
+                    return cls(file_size, mtime_ns, stride, total_lines, lines, offsets)
+            except (OSError, ValueError, EOFError):
+                continue
+        return None
+
+    @classmethod
+    def load_or_build(cls, file_path: str, stride: int = LINE_INDEX_STRIDE) -> 'LineIndex':
+        """加载索引，不存在或已过期时重新构建并保存"""
+        index = cls.load(file_path)
+        if index is None:
+            index = cls.build(file_path, stride)
+            index.save(file_path)
+        return index
+
+    def save(self, file_path: str):
+        """保存为旁路索引文件，先写临时文件再原子替换"""
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.stride, self.file_size,
+                                  self.mtime_ns, self.total_lines, len(self.offsets))
+        for index_path in _index_paths(file_path):
+            index_dir = os.path.dirname(index_path)
+            tmp_path = None
+            try:
+                os.makedirs(index_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(header)
+                    self.lines.tofile(f)
+                    self.offsets.tofile(f)
+                os.replace(tmp_path, index_path)
+                return
+            except OSError:
+                # 写入失败（如磁盘已满）时删除临时文件；目录不可写时尝试下一个位置
+                if tmp_path is not None:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                continue
+
+    def read_lines(self, file_path: str, start_line: int, num_lines: int) -> List[bytes]:
+        """
+        读取从 start_line 开始的 num_lines 行（保留行尾换行符）
+
+        Args:
+            file_path: 文本文件路径
+            start_line: 起始行号（从0开始）
+            num_lines: 行数
+        """
+        if start_line < 0 or start_line >= self.total_lines or num_lines <= 0:
+            return []
+
+        checkpoint = bisect.bisect_right(self.lines, start_line) - 1
+        lines = []
+        with open(file_path, 'rb') as f:
+            f.seek(self.offsets[checkpoint])
+            # 从最近的检查点向后跳过不足 stride 的行
+            for _ in range(start_line - self.lines[checkpoint]):
+                f.readline()
+            for _ in range(num_lines):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line)
+        return lines
+
+
+def _index_paths(file_path: str) -> List[str]:
+    """旁路索引文件的候选位置：源文件旁边的隐藏文件，其次是统一的索引目录"""
+    abs_path = os.path.abspath(file_path)
+    directory, name = os.path.split(abs_path)
+    digest = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()
+    return [
+        os.path.join(directory, f'.{name}.lineidx'),
+        os.path.join(LINE_INDEX_DIR, f'{digest}.lineidx')
+    ]
+
+
+def remove_line_index(file_path: str):
+    """删除文件对应的旁路索引"""
+    for index_path in _index_paths(file_path):
+        try:
+            os.remove(index_path)
+        except OSError:
+            pass
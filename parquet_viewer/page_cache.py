@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+序列化数据页缓存
+
+缓存 /api/read_data 已序列化好的响应体，以 (文件版本, 起始行, 行数, 列, 响应格式) 为键，
+文件版本为 (路径, 文件大小, 修改时间)（数据集为各分片的版本），文件被修改后自动失效。
+按字节预算 LRU 淘汰。
+
+返回第 N 页后在后台线程中预取第 N+1 页，顺序翻页时下一页通常已在缓存中。
+同一页正在预取时不会重复提交，预取线程数固定且很少，不与前台请求争抢 CPU。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 单个页面最多占用预算的比例，超过的页面不缓存（避免一个超大页面挤掉所有页面）
+MAX_PAGE_FRACTION = 4
+
+
+class PageCache:
+    """线程安全的序列化数据页 LRU 缓存，支持后台预取"""
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, prefetch_workers: int = 1):
+        """
+        初始化 PageCache
+
+        Args:
+            max_bytes: 缓存响应体的字节预算
+            prefetch_workers: 后台预取线程数，0 表示不预取
+        """
+        self.max_bytes = max_bytes
+        self.prefetch_workers = prefetch_workers
+        # {键: (响应体, 是否由预取生成且尚未被请求)}
+        self._pages: "OrderedDict[Tuple, Tuple[bytes, bool]]" = OrderedDict()
+        self._total_bytes = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetches = 0
+        self.prefetch_hits = 0
+        self.prefetch_errors = 0
+
+    def configure(self, max_bytes: int = None, prefetch_workers: int = None):
+        """调整缓存预算和预取线程数（线程数仅在第一次预取前生效）"""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+                self._evict_locked()
+            if prefetch_workers is not None and self._executor is None:
+                self.prefetch_workers = prefetch_workers
+
+    def accepts(self, nbytes: int) -> bool:
+        """该大小的页面是否会被缓存"""
+        return nbytes <= self.max_bytes // MAX_PAGE_FRACTION
+
+    def get(self, key: Tuple) -> Tuple[Optional[bytes], bool]:
+        """
+        获取缓存的页面
+
+        Returns:
+            (响应体, 是否为预取的页面)，未命中时响应体为 None
+        """
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is None:
+                self.misses += 1
+                return None, False
+            body, prefetched = cached
+            self._pages.move_to_end(key)
+            self.hits += 1
+            if prefetched:
+                self.prefetch_hits += 1
+                self._pages[key] = (body, False)
+            return body, prefetched
+
+    def put(self, key: Tuple, body: bytes, prefetched: bool = False):
+        """加入页面，超出预算时按 LRU 淘汰"""
+        if not self.accepts(len(body)):
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old[0])
+            self._pages[key] = (body, prefetched)
+            self._total_bytes += len(body)
+            self._evict_locked()
+
+    def prefetch(self, key: Tuple, loader: Callable[[], bytes]):
+        """
+        在后台生成页面并加入缓存（已缓存或正在预取时忽略）
+
+        Args:
+            key: 页面的缓存键
+            loader: 生成响应体的函数，在预取线程中执行
+        """
+        if self.prefetch_workers <= 0:
+            return
+        with self._lock:
+            if key in self._pages or key in self._pending:
+                return
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.prefetch_workers,
+                                                    thread_name_prefix='page-prefetch')
+            self.prefetches += 1
+            self._executor.submit(self._run_prefetch, key, loader)
+
+    def _run_prefetch(self, key: Tuple, loader: Callable[[], bytes]):
+        try:
+            body = loader()
+        except Exception:
+            with self._lock:
+                self.prefetch_errors += 1
+            body = None
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+        if body is not None:
+            self.put(key, body, prefetched=True)
+
+    def invalidate(self, file_path: str):
+        """移除某个文件的所有缓存页面（键的第一个元素为文件版本，其第一个元素为绝对路径）"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [k for k in self._pages if k[0][0] == path]:
+                self._total_bytes -= len(self._pages.pop(key)[0])
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._pages.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "prefetches": self.prefetches,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_errors": self.prefetch_errors,
+                "prefetch_pending": len(self._pending)
+            }
+
+    def _evict_locked(self):
+        while self._pages and self._total_bytes > self.max_bytes:
+            _, (body, _) = self._pages.popitem(last=False)
+            self._total_bytes -= len(body)
+            self.evictions += 1
+
+
+# 进程级共享缓存，预算可通过环境变量或 app.py 中的配置调整
+page_cache = PageCache(
+    max_bytes=int(os.environ.get('PAGE_CACHE_MAX_BYTES', 128 * 1024 * 1024)),
+    prefetch_workers=int(os.environ.get('PAGE_PREFETCH_WORKERS', 1))
+)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+进程级 parquet 文件句柄缓存
+
+缓存已打开的 ParquetFile、解析好的 footer 元数据和 row group 行偏移索引，
+以 (路径, 文件大小, 修改时间) 为键，文件被修改后自动失效。
+按条目数和 footer 字节数双重限制，超出后按 LRU 淘汰并关闭句柄。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+import pyarrow.parquet as pq
+
+from row_group_index import RowGroupIndex
+
+
+class ParquetFileEntry:
+    """缓存条目：打开的文件句柄及其元数据"""
+
+    def __init__(self, file_path: str, key: Tuple[str, int, int]):
+        self.file_path = file_path
+        self.key = key
+        self.parquet_file = pq.ParquetFile(file_path)
+        self.metadata = self.parquet_file.metadata
+        self.index = RowGroupIndex(self.metadata)
+        # 以 footer 序列化大小估算条目占用的内存
+        self.nbytes = self.metadata.serialized_size
+        # 同一句柄上的读取需要串行化
+        self.lock = threading.RLock()
+        self.closed = False
+
+    @contextmanager
+    def open(self):
+        """
+        获取可读的文件句柄
+
+        读取期间持有条目锁；条目已被淘汰关闭时，
+        复用已解析的元数据临时打开文件，无需重新解析 footer
+        """
+        with self.lock:
+            if not self.closed:
+                yield self.parquet_file
+                return
+
+        parquet_file = pq.ParquetFile(self.file_path, metadata=self.metadata)
+        try:
+            yield parquet_file
+        finally:
+            parquet_file.close()
+
+    def close(self):
+        """关闭文件句柄"""
+        with self.lock:
+            self.closed = True
+            try:
+                self.parquet_file.close()
+            except Exception:
+                pass
+
+
+def load_footer(file_path: str) -> ParquetFileEntry:
+    """
+    读取 footer 元数据和 row group 索引后立即关闭文件句柄
+
+    返回的条目不进入句柄缓存、不占用文件描述符，entry.open() 时复用元数据临时打开文件，
+    用于数据集的大量分片（分片数可能超过进程可打开的文件数）
+    """
+    stat = os.stat(file_path)
+    entry = ParquetFileEntry(file_path, (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns))
+    entry.close()
+    return entry
+
+
+class ParquetFileCache:
+    """线程安全的 ParquetFile 句柄 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化 ParquetFileCache
+
+        Args:
+            max_entries: 最多缓存的文件数
+            max_bytes: 缓存 footer 元数据的字节预算
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], ParquetFileEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_entries: int = None, max_bytes: int = None):
+        """调整缓存预算，超出部分立即淘汰"""
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            evicted = self._evict_locked()
+        self._close_all(evicted)
+
+    @staticmethod
+    def _make_key(file_path: str) -> Tuple[str, int, int]:
+        """生成缓存键：(绝对路径, 文件大小, 修改时间)"""
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, file_path: str) -> ParquetFileEntry:
+        """
+        获取文件对应的缓存条目，未命中时打开文件并解析 footer
+
+        Args:
+            file_path: parquet 文件路径
+
+        Returns:
+            ParquetFileEntry
+        """
+        key = self._make_key(file_path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 在全局锁外打开文件，避免阻塞其他文件的访问
+        new_entry = ParquetFileEntry(file_path, key)
+
+        stale = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # 其他线程已抢先加入
+                self._entries.move_to_end(key)
+                stale.append(new_entry)
+            else:
+                # 同一路径的旧版本条目已失效
+                for old_key in [k for k in self._entries if k[0] == key[0]]:
+                    stale.append(self._pop_locked(old_key))
+                entry = new_entry
+                self._entries[key] = entry
+                self._total_bytes += entry.nbytes
+                stale.extend(self._evict_locked(keep=key))
+        self._close_all(stale)
+        return entry
+
+    def invalidate(self, file_path: str):
+        """移除某个文件的所有缓存条目"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            removed = [self._pop_locked(k) for k in list(self._entries) if k[0] == path]
+        self._close_all(removed)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            removed = [self._pop_locked(k) for k in list(self._entries)]
+        self._close_all(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _pop_locked(self, key) -> ParquetFileEntry:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.nbytes
+        return entry
+
+    def _evict_locked(self, keep=None):
+        """按 LRU 淘汰超出预算的条目，返回被淘汰的条目（由调用方在锁外关闭）"""
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 self._total_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                # 单个条目超出预算时仍保留最新加入的条目
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(oldest)
+                continue
+            evicted.append(self._pop_locked(oldest))
+            self.evictions += 1
+        return evicted
+
+    @staticmethod
+    def _close_all(entries):
+        for entry in entries:
+            entry.close()
+
+
+# 进程级共享缓存，预算可通过环境变量或 app.py 中的配置调整
+parquet_file_cache = ParquetFileCache(
+    max_entries=int(os.environ.get('PARQUET_CACHE_MAX_ENTRIES', 64)),
+    max_bytes=int(os.environ.get('PARQUET_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+)
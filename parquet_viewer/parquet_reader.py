@@ -1,9 +1,12 @@
-import pandas as pd
 import pyarrow.parquet as pq
 import json
 from typing import Dict, List, Any, Optional
 import os
 
+from arrow_serializer import table_to_records
+from column_stats import collect_column_stats
+from row_group_index import RowGroupIndex, read_rows
+
 
 class ParquetReader:
     """Parquet 文件读取器，支持切片读取避免读取整个大文件"""
@@ -115,235 +118,66 @@ class ParquetReader:
                 "error": str(e)
             }
     
-    def read_top_rows(self, num_rows: int = 10) -> List[Dict[str, Any]]:
+    def read_top_rows(self, num_rows: int = 10, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         读取文件前 N 行数据，使用切片读取避免读取整个文件
         
         Args:
             num_rows: 要读取的行数，默认 10
+            columns: 要读取的列，None 表示全部列
             
         Returns:
             包含数据的字典列表
         """
         try:
-            # 使用 pyarrow 读取前 N 行
-            parquet_file = pq.ParquetFile(self.file_path)
-            
-            # 读取前 num_rows 行
-            table = parquet_file.read_row_group(0).slice(0, num_rows)
-            
-            # 如果第一个 row group 不够，继续读取后续的
-            if table.num_rows < num_rows:
-                remaining_rows = num_rows - table.num_rows
-                for i in range(1, min(parquet_file.num_row_groups, 3)):  # 最多读取前3个row group
-                    if remaining_rows <= 0:
-                        break
-                    next_table = parquet_file.read_row_group(i).slice(0, remaining_rows)
-                    table = table.concat_tables([next_table])
-                    remaining_rows -= next_table.num_rows
-            
-            # 转换为 pandas DataFrame
-            df = table.to_pandas()
-            
-            # 转换为字典列表
-            result = df.head(num_rows).to_dict('records')
-            
-            # 处理数据类型，确保可以 JSON 序列化
-            return self._serialize_data(result)
-            
+            return self.read_slice(0, num_rows, columns)
         except Exception as e:
             raise Exception(f"读取数据失败: {str(e)}")
     
-    def read_slice(self, start_row: int, num_rows: int) -> List[Dict[str, Any]]:
+    def read_slice(self, start_row: int, num_rows: int,
+                   columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         读取指定范围的行数据
         
+        通过 row group 行偏移索引二分定位，只解码覆盖该范围的 row group，
+        并且只读取请求的列
+        
         Args:
             start_row: 起始行号（从0开始）
             num_rows: 要读取的行数
+            columns: 要读取的列，None 表示全部列；支持 "a.b.c" 形式的嵌套字段路径
             
         Returns:
             包含数据的字典列表
         """
         try:
             parquet_file = pq.ParquetFile(self.file_path)
+            index = RowGroupIndex(parquet_file.metadata)
+            table = read_rows(parquet_file, index, start_row, num_rows, columns)
             
-            # 计算需要读取的 row groups
-            current_row = 0
-            tables = []
-            
-            for i in range(parquet_file.num_row_groups):
-                row_group = parquet_file.read_row_group(i)
-                row_group_size = row_group.num_rows
-                
-                # 检查这个 row group 是否包含我们需要的行
-                if current_row + row_group_size > start_row:
-                    # 计算在这个 row group 中的起始和结束位置
-                    local_start = max(0, start_row - current_row)
-                    local_end = min(row_group_size, start_row + num_rows - current_row)
-                    
-                    if local_end > local_start:
-                        slice_table = row_group.slice(local_start, local_end - local_start)
-                        tables.append(slice_table)
-                
-                current_row += row_group_size
-                
-                # 如果已经读取了足够的行，就停止
-                if len(tables) > 0 and sum(t.num_rows for t in tables) >= num_rows:
-                    break
-            
-            if not tables:
-                return []
-            
-            # 合并所有表格
-            if len(tables) == 1:
-                table = tables[0]
-            else:
-                table = tables[0].concat_tables(tables[1:])
-            
-            # 转换为 pandas DataFrame
-            df = table.to_pandas()
-            
-            # 转换为字典列表
-            result = df.head(num_rows).to_dict('records')
-            
-            return self._serialize_data(result)
+            # 按列直接从 Arrow 数组转换为可 JSON 序列化的字典列表
+            return table_to_records(table)
             
         except Exception as e:
             raise Exception(f"读取切片数据失败: {str(e)}")
     
-    def _serialize_data(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def get_column_stats(self, deep: bool = False) -> Dict[str, Any]:
         """
-        处理数据，确保可以 JSON 序列化
+        从parquet文件元数据获取列统计信息
         
         Args:
-            data: 原始数据
-            
-        Returns:
-            处理后的数据
-        """
-        def convert_value(value):
-            """转换单个值，确保可以 JSON 序列化"""
-            if pd.isna(value):
-                return None
-            elif isinstance(value, (int, float, str, bool)):
-                return value
-            elif isinstance(value, (pd.Timestamp, pd.DatetimeTZDtype)):
-                return str(value)
-            elif hasattr(value, 'item'):  # numpy 类型
-                return value.item()
-            else:
-                return str(value)
-        
-        result = []
-        for row in data:
-            converted_row = {}
-            for key, value in row.items():
-                converted_row[str(key)] = convert_value(value)
-            result.append(converted_row)
-        
-        return result
-    
-    def get_column_stats(self) -> Dict[str, Any]:
-        """
-        从parquet文件元数据获取列统计信息
+            deep: 是否流式扫描全部 row group，计算精确空值数、近似去重数和缺失的 min/max
         
         Returns:
             列统计信息
         """
         try:
             parquet_file = pq.ParquetFile(self.file_path)
-            metadata = parquet_file.metadata
-            
-            stats = {}
-            
-            # 获取schema信息
-            schema = metadata.schema
-            
-            # 遍历所有列
-            for i, column_name in enumerate(schema.names):
-                column = schema.column(i)
-                
-                # 获取列的基本信息
-                column_stats = {
-                    "dtype": str(column.physical_type),
-                    "logical_type": str(column.logical_type) if column.logical_type else None,
-                    "null_count": 0,
-                    "unique_count": None,  # 元数据中通常不包含唯一值统计
-                    "sample_values": [],
-                    "compression": None,
-                    "total_size": 0,
-                    "min_value": None,
-                    "max_value": None
-                }
-                
-                # 从所有row groups中收集统计信息
-                total_null_count = 0
-                total_size = 0
-                min_values = []
-                max_values = []
-                
-                for rg_idx in range(metadata.num_row_groups):
-                    row_group = metadata.row_group(rg_idx)
-                    
-                    # 获取该列在row group中的统计信息
-                    col_chunk = row_group.column(i)
-                    
-                    # 累加空值数量
-                    if col_chunk.statistics:
-                        stats_info = col_chunk.statistics
-                        if hasattr(stats_info, 'null_count'):
-                            total_null_count += stats_info.null_count
-                        
-                        # 收集最小值和最大值
-                        if hasattr(stats_info, 'min') and stats_info.min is not None:
-                            min_values.append(stats_info.min)
-                        if hasattr(stats_info, 'max') and stats_info.max is not None:
-                            max_values.append(stats_info.max)
-                    
-                    # 累加大小
-                    total_size += col_chunk.total_compressed_size
-                    
-                    # 获取压缩信息
-                    if column_stats["compression"] is None:
-                        column_stats["compression"] = col_chunk.compression
-                
-                # 更新统计信息
-                column_stats["null_count"] = total_null_count
-                column_stats["total_size"] = total_size
-                
-                # 计算全局最小值和最大值
-                if min_values:
-                    column_stats["min_value"] = min(min_values)
-                if max_values:
-                    column_stats["max_value"] = max(max_values)
-                
-                # 尝试获取一些示例值（从第一个row group）
-                try:
-                    if metadata.num_row_groups > 0:
-                        first_rg = metadata.row_group(0)
-                        if first_rg.num_rows > 0:
-                            # 读取前几行来获取示例值
-                            sample_data = self.read_top_rows(min(5, first_rg.num_rows))
-                            if sample_data and column_name in sample_data[0]:
-                                sample_values = []
-                                for row in sample_data:
-                                    if column_name in row and row[column_name] is not None:
-                                        val = row[column_name]
-                                        if hasattr(val, 'item'):  # numpy类型
-                                            sample_values.append(val.item())
-                                        else:
-                                            sample_values.append(val)
-                                        if len(sample_values) >= 3:  # 最多3个示例值
-                                            break
-                                column_stats["sample_values"] = sample_values
-                except:
-                    # 如果获取示例值失败，忽略
-                    pass
-                
-                stats[column_name] = column_stats
-            
-            return stats
+            try:
+                # 元数据只遍历一次，示例值来自所有列共享的一个小批次
+                return collect_column_stats(parquet_file, deep=deep)
+            finally:
+                parquet_file.close()
             
         except Exception as e:
             raise Exception(f"获取列统计信息失败: {str(e)}")
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+parquet 过滤查询
+
+先用 footer 中每个 row group 的列统计（min/max/null_count）排除不可能命中的 row group，
+对字典编码的列再用字典页排除，最后只对剩余 row group 读取谓词列并用 pyarrow.compute 求值，
+命中的行再按需读取输出列。多个谓词之间为 AND 关系。
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from arrow_serializer import table_to_records
+from parquet_cache import parquet_file_cache
+
+# 支持的谓词操作符
+SUPPORTED_OPS = {'=', '!=', '<', '<=', '>', '>=', 'between', 'in',
+                 'is_null', 'is_not_null', 'prefix'}
+
+# 可以用字典页判断是否命中的操作符
+DICTIONARY_OPS = {'=', 'in', 'prefix'}
+
+
+def _decode(array):
+    """字典编码的数组解码为普通数组"""
+    if pa.types.is_dictionary(array.type):
+        return array.cast(array.type.value_type)
+    return array
+
+
+def column_array(table: pa.Table, column: str):
+    """从表中取出列，嵌套字段路径（a.b.c）通过逐层展开 struct 获取"""
+    while column not in table.column_names:
+        if not any(pa.types.is_struct(field.type) for field in table.schema):
+            raise ValueError(f"列不存在: {column}")
+        table = table.flatten()
+    return table.column(column)
+
+
+def resolve_type(schema: pa.Schema, column: str) -> pa.DataType:
+    """解析列路径对应的 Arrow 类型"""
+    parts = column.split('.')
+    if parts[0] not in schema.names:
+        # 顶层列名本身可能包含点号
+        if column in schema.names:
+            return schema.field(column).type
+        raise ValueError(f"列不存在: {column}")
+    data_type = schema.field(parts[0]).type
+    for part in parts[1:]:
+        if not pa.types.is_struct(data_type) or data_type.get_field_index(part) < 0:
+            raise ValueError(f"列不存在: {column}")
+        data_type = data_type.field(part).type
+    return data_type
+
+
+def supports_length(data_type: pa.DataType) -> bool:
+    """是否可以计算长度：字符串、二进制的长度或 list 的元素个数"""
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return (pa.types.is_string(data_type) or pa.types.is_large_string(data_type) or
+            pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type) or
+            pa.types.is_list(data_type) or pa.types.is_large_list(data_type))
+
+
+def value_lengths(array):
+    """计算字符串/二进制的长度或 list 的元素个数，空值保持为空"""
+    array = _decode(array)
+    data_type = array.type
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return pc.utf8_length(array)
+    if pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+        return pc.binary_length(array)
+    return pc.list_value_length(array)
+
+
+class Predicate:
+    """单个过滤条件"""
+
+    def __init__(self, spec: Dict[str, Any], schema: pa.Schema):
+        """
+        初始化 Predicate
+
+        Args:
+            spec: {"column": 列名, "op": 操作符, "value": 值}
+            schema: 文件的 Arrow schema
+        """
+        self.column = spec.get('column')
+        self.op = spec.get('op')
+        self.value = spec.get('value')
+
+        if not self.column:
+            raise ValueError("过滤条件缺少 column")
+        if self.op not in SUPPORTED_OPS:
+            raise ValueError(f"不支持的操作符: {self.op}")
+
+        self.type = resolve_type(schema, self.column)
+        value_type = self.type.value_type if pa.types.is_dictionary(self.type) else self.type
+
+        if self.op == 'between':
+            if not isinstance(self.value, list) or len(self.value) != 2:
+                raise ValueError("between 的值必须是 [下界, 上界]")
+            self.scalars = [self._coerce(v, value_type) for v in self.value]
+        elif self.op == 'in':
+            if not isinstance(self.value, list):
+                raise ValueError("in 的值必须是数组")
+            self.value_set = pa.array(self.value).cast(value_type)
+            self.scalars = self.value_set.to_pylist()
+        elif self.op == 'prefix':
+            if not (pa.types.is_string(value_type) or pa.types.is_large_string(value_type)):
+                raise ValueError(f"prefix 仅支持字符串列: {self.column}")
+            self.scalars = [str(self.value)]
+        elif self.op in ('is_null', 'is_not_null'):
+            self.scalars = []
+        else:
+            self.scalars = [self._coerce(self.value, value_type)]
+
+    @staticmethod
+    def _coerce(value: Any, data_type: pa.DataType) -> Any:
+        """把 JSON 值转换为列类型对应的 Python 值（如字符串转时间戳）"""
+        if value is None:
+            raise ValueError("比较值不能为 null，请使用 is_null")
+        return pa.array([value]).cast(data_type)[0].as_py()
+
+    def can_match(self, statistics, num_rows: int) -> bool:
+        """
+        根据 row group 的列统计判断是否可能命中
+
+        无法判断时返回 True，保证不会错误排除
+        """
+        if statistics is None:
+            return True
+
+        null_count = statistics.null_count if statistics.has_null_count else None
+        if self.op == 'is_null':
+            return null_count is None or null_count > 0
+        if self.op == 'is_not_null':
+            return null_count is None or null_count < num_rows
+
+        if not statistics.has_min_max:
+            # 没有 min/max 且全部为空值时，比较类条件不可能命中
+            return not (null_count is not None and null_count >= num_rows)
+
+        lo, hi = statistics.min, statistics.max
+        try:
+            if self.op == '=':
+                return lo <= self.scalars[0] <= hi
+            if self.op == '!=':
+                return not (lo == hi == self.scalars[0] and not null_count)
+            if self.op == '<':
+                return lo < self.scalars[0]
+            if self.op == '<=':
+                return lo <= self.scalars[0]
+            if self.op == '>':
+                return hi > self.scalars[0]
+            if self.op == '>=':
+                return hi >= self.scalars[0]
+            if self.op == 'between':
+                return hi >= self.scalars[0] and lo <= self.scalars[1]
+            if self.op == 'in':
+                return any(lo <= v <= hi for v in self.scalars if v is not None)
+            if self.op == 'prefix':
+                prefix = self.scalars[0]
+                return hi >= prefix and (lo < prefix or lo.startswith(prefix))
+        except TypeError:
+            # 统计值类型无法比较（如 binary 列），不做排除
+            return True
+        return True
+
+    def matches_dictionary(self, dictionary: pa.Array) -> bool:
+        """判断字典中是否存在满足条件的值"""
+        mask = self.evaluate(dictionary)
+        return pc.any(mask).as_py() is True
+
+    def evaluate(self, array) -> pa.Array:
+        """对数组求值，返回布尔掩码（null 视为不命中）"""
+        array = _decode(array)
+        if self.op == 'is_null':
+            return pc.is_null(array)
+        if self.op == 'is_not_null':
+            return pc.is_valid(array)
+
+        if self.op == '=':
+            mask = pc.equal(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == '!=':
+            mask = pc.not_equal(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == '<':
+            mask = pc.less(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == '<=':
+            mask = pc.less_equal(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == '>':
+            mask = pc.greater(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == '>=':
+            mask = pc.greater_equal(array, pa.scalar(self.scalars[0], array.type))
+        elif self.op == 'between':
+            mask = pc.and_(pc.greater_equal(array, pa.scalar(self.scalars[0], array.type)),
+                           pc.less_equal(array, pa.scalar(self.scalars[1], array.type)))
+        elif self.op == 'in':
+            mask = pc.is_in(array, value_set=self.value_set.cast(array.type))
+        else:
+            mask = pc.starts_with(array, pattern=self.scalars[0])
+        return pc.fill_null(mask, False)
+
+
+def leaf_column_indices(metadata) -> Dict[str, int]:
+    """叶子列路径到列序号的映射"""
+    return {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+
+
+def query_parquet(file_path: str, predicates: List[Dict[str, Any]], offset: int = 0,
+                  limit: int = 100, columns: Optional[List[str]] = None,
+                  count_total: bool = False) -> Dict[str, Any]:
+    """
+    过滤查询 parquet 文件
+
+    Args:
+        file_path: parquet 文件路径
+        predicates: 过滤条件列表，条件之间为 AND 关系
+        offset: 跳过的命中行数（分页）
+        limit: 返回的最大行数
+        columns: 输出列，None 表示全部列
+        count_total: 是否扫描全部 row group 统计命中总数
+
+    Returns:
+        查询结果，包含命中的行、行号和 row group 排除情况
+    """
+    started = time.perf_counter()
+    entry = parquet_file_cache.get(file_path)
+    metadata = entry.metadata
+    with entry.open() as parquet_file:
+        schema = parquet_file.schema_arrow
+
+    parsed = [Predicate(spec, schema) for spec in predicates]
+    leaf_indices = leaf_column_indices(metadata)
+    predicate_columns = list(dict.fromkeys(p.column for p in parsed))
+
+    # 只有顶层的字典编码列可以用字典页排除
+    dictionary_columns = [p.column for p in parsed
+                          if p.op in DICTIONARY_OPS and p.column in schema.names
+                          and p.column in leaf_indices]
+    dictionary_file = None
+    if dictionary_columns:
+        dictionary_file = pq.ParquetFile(file_path, metadata=metadata,
+                                         read_dictionary=dictionary_columns)
+
+    stats = {
+        "row_groups_total": metadata.num_row_groups,
+        "pruned_by_statistics": 0,
+        "pruned_by_dictionary": 0,
+        "scanned": 0,
+        "not_visited": 0
+    }
+    tables = []
+    row_numbers = []
+    matched = 0
+    remaining = limit
+
+    try:
+        for rg_idx in range(metadata.num_row_groups):
+            if remaining <= 0 and not count_total:
+                stats["not_visited"] = metadata.num_row_groups - rg_idx
+                break
+
+            row_group = metadata.row_group(rg_idx)
+
+            # 第一步：footer 列统计
+            if not all(p.can_match(row_group.column(leaf_indices[p.column]).statistics,
+                                   row_group.num_rows)
+                       for p in parsed if p.column in leaf_indices):
+                stats["pruned_by_statistics"] += 1
+                continue
+
+            # 第二步：字典页
+            pruned = False
+            for p in parsed:
+                if (dictionary_file is None or p.column not in dictionary_columns or
+                        not row_group.column(leaf_indices[p.column]).has_dictionary_page):
+                    continue
+                dict_column = dictionary_file.read_row_group(rg_idx, columns=[p.column]).column(0)
+                if all(pa.types.is_dictionary(chunk.type) and
+                       not p.matches_dictionary(chunk.dictionary)
+                       for chunk in dict_column.chunks):
+                    pruned = True
+                    break
+            if pruned:
+                stats["pruned_by_dictionary"] += 1
+                continue
+
+            # 第三步：读取谓词列求值
+            stats["scanned"] += 1
+            with entry.open() as parquet_file:
+                predicate_table = parquet_file.read_row_group(rg_idx, columns=predicate_columns)
+            mask = None
+            for p in parsed:
+                p_mask = p.evaluate(column_array(predicate_table, p.column))
+                mask = p_mask if mask is None else pc.and_(mask, p_mask)
+            hits = pc.indices_nonzero(mask)
+            hit_count = len(hits)
+
+            # 分页：跳过 offset 之前的命中行
+            skip = min(hit_count, max(0, offset - matched))
+            take = min(hit_count - skip, remaining)
+            matched += hit_count
+            if take > 0:
+                local_rows = hits.slice(skip, take)
+                with entry.open() as parquet_file:
+                    output = parquet_file.read_row_group(rg_idx, columns=columns).take(local_rows)
+                tables.append(output)
+                base = entry.index.offsets[rg_idx]
+                row_numbers.extend(base + i for i in local_rows.to_pylist())
+                remaining -= take
+    finally:
+        if dictionary_file is not None:
+            dictionary_file.close()
+
+    rows = []
+    for table in tables:
+        rows.extend(table_to_records(table))
+
+    exhausted = stats["not_visited"] == 0
+    return {
+        "rows": rows,
+        "row_numbers": row_numbers,
+        "offset": offset,
+        "limit": limit,
+        "total_matches": matched if exhausted else None,
+        "has_more": matched > offset + len(rows) or not exhausted,
+        "row_groups": stats,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
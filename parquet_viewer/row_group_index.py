@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Row group 行偏移索引
+
+根据 footer 元数据中每个 row group 的行数构建累计行偏移，
+通过二分查找把全局行号映射到 (row group, 组内偏移)，
+读取任意区间时只解码覆盖该区间的一两个 row group。
+"""
+
+import bisect
+from typing import Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+
+class RowGroupIndex:
+    """parquet 文件的 row group 累计行偏移索引"""
+
+    def __init__(self, metadata):
+        """
+        初始化 RowGroupIndex
+
+        Args:
+            metadata: pyarrow FileMetaData 对象
+        """
+        # offsets[i] 为第 i 个 row group 的起始行号，最后一个元素为总行数
+        offsets = [0]
+        for i in range(metadata.num_row_groups):
+            offsets.append(offsets[-1] + metadata.row_group(i).num_rows)
+        self.offsets = offsets
+
+    @property
+    def total_rows(self) -> int:
+        """文件总行数"""
+        return self.offsets[-1]
+
+    @property
+    def num_row_groups(self) -> int:
+        """row group 数量"""
+        return len(self.offsets) - 1
+
+    def locate(self, row: int) -> Tuple[int, int]:
+        """
+        定位全局行号所在的 row group
+
+        Args:
+            row: 全局行号（从0开始）
+
+        Returns:
+            (row group 序号, 组内偏移)
+        """
+        if row < 0 or row >= self.total_rows:
+            raise IndexError(f"行号超出范围: {row}")
+        rg_idx = bisect.bisect_right(self.offsets, row) - 1
+        return rg_idx, row - self.offsets[rg_idx]
+
+    def row_groups_for_range(self, start_row: int, num_rows: int) -> Tuple[List[int], int]:
+        """
+        计算覆盖 [start_row, start_row + num_rows) 的 row group
+
+        Args:
+            start_row: 起始行号（从0开始）
+            num_rows: 行数
+
+        Returns:
+            (row group 序号列表, 第一个 row group 内的起始偏移)
+        """
+        start_row = max(0, start_row)
+        end_row = min(self.total_rows, start_row + max(0, num_rows))
+        if start_row >= end_row:
+            return [], 0
+
+        first_rg, local_start = self.locate(start_row)
+        last_rg, _ = self.locate(end_row - 1)
+        return list(range(first_rg, last_rg + 1)), local_start
+
+
+def read_rows(parquet_file, index: RowGroupIndex, start_row: int, num_rows: int,
+              columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    按全局行号读取区间数据，只解码覆盖该区间的 row group
+
+    Args:
+        parquet_file: pyarrow ParquetFile 对象
+        index: 该文件的 RowGroupIndex
+        start_row: 起始行号（从0开始）
+        num_rows: 要读取的行数
+        columns: 要读取的列，None 表示全部列；支持嵌套字段路径，如 "a.b.c"
+
+    Returns:
+        pyarrow Table
+    """
+    row_groups, local_start = index.row_groups_for_range(start_row, num_rows)
+    if not row_groups:
+        return parquet_file.read_row_groups([], columns=columns)
+
+    # 只读取请求的列，未请求的列块不会从磁盘读取和解压
+    table = parquet_file.read_row_groups(row_groups, columns=columns)
+    return table.slice(local_start, num_rows)
+
+
+def iter_rows(parquet_file, index: RowGroupIndex, start_row: int, num_rows: int,
+              columns: Optional[List[str]] = None, batch_size: int = 1024) -> Iterator[pa.RecordBatch]:
+    """
+    按全局行号逐批读取区间数据，每解码 batch_size 行产出一批，不必等整个区间解码完
+
+    Args:
+        parquet_file: pyarrow ParquetFile 对象
+        index: 该文件的 RowGroupIndex
+        start_row: 起始行号（从0开始）
+        num_rows: 要读取的行数
+        columns: 要读取的列，None 表示全部列；支持嵌套字段路径，如 "a.b.c"
+        batch_size: 每批的最大行数
+
+    Yields:
+        pyarrow RecordBatch
+    """
+    row_groups, skip = index.row_groups_for_range(start_row, num_rows)
+    if not row_groups:
+        return
+
+    remaining = num_rows
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups,
+                                           columns=columns):
+        # 第一个 row group 中起始行之前的部分整批跳过
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        batch = batch.slice(skip, remaining)
+        skip = 0
+        remaining -= batch.num_rows
+        yield batch
+        if remaining <= 0:
+            break
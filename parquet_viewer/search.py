@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+全文/正则搜索
+
+文本/JSONL 文件按换行符对齐切分为块，每个块用 mmap 映射后在子进程中扫描：
+区分大小写的字面量直接在 mmap 上用 bytes.find，不会把行加载为 Python 字符串；
+正则和忽略大小写的搜索把块解码为 str 后匹配，. 和字符类、IGNORECASE 按字符（含中文）而不是按字节生效，
+与 parquet 的 RE2 按值匹配一致；
+块内的行号用 NumPy 统计换行符得到，汇总时加上之前各块的行数即为全局行号。
+parquet 文件逐个 row group 读取字符串列，用 pyarrow.compute.match_substring[_regex] 求值。
+
+结果按文件顺序逐条产出，调用方可以边搜索边流式返回。
+"""
+
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from parquet_cache import parquet_file_cache
+
+# 每个搜索块的大小
+SEARCH_CHUNK_SIZE = 32 * 1024 * 1024
+
+# 超过该大小的文件使用进程池并行搜索
+PARALLEL_SEARCH_BYTES = 128 * 1024 * 1024
+
+# 并行搜索的进程数
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', os.cpu_count() or 1))
+
+# 默认最多返回的命中数
+DEFAULT_SEARCH_LIMIT = 1000
+
+# 片段中命中位置前后保留的字节数/字符数
+SNIPPET_CONTEXT = 60
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """进程池在第一次并行搜索时创建，之后复用"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SEARCH_WORKERS)
+        return _pool
+
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = False):
+    """
+    编译文本文件使用的模式
+
+    Returns:
+        字面量且区分大小写时返回 bytes（使用 find），否则返回编译后的 str 正则（在解码后的块上匹配）
+
+    Raises:
+        ValueError: 模式为空或正则无效
+    """
+    if not pattern:
+        raise ValueError("搜索内容不能为空")
+    if not regex and not ignore_case:
+        return pattern.encode('utf-8')
+    # 正则在整个块上搜索，MULTILINE 使 ^ 和 $ 匹配每一行的行首和行尾（与 parquet 按值匹配一致）
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    try:
+        return re.compile(pattern if regex else re.escape(pattern), flags)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式: {e}")
+
+
+def _chunk_ranges(file_path: str, file_size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """切分为固定大小的块，块边界向后对齐到换行符之后，保证每行只属于一个块"""
+    ranges = []
+    start = 0
+    with open(file_path, 'rb') as f:
+        while start < file_size:
+            end = start + chunk_size
+            if end >= file_size:
+                end = file_size
+            else:
+                f.seek(end)
+                while True:
+                    block = f.read(64 * 1024)
+                    if not block:
+                        end = file_size
+                        break
+                    pos = block.find(b'\n')
+                    if pos >= 0:
+                        end += pos + 1
+                        break
+                    end += len(block)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _to_text(data) -> str:
+    """bytes 按 UTF-8 解码；由 surrogateescape 解码得到的 str 把无效字节替换为 U+FFFD"""
+    if isinstance(data, str):
+        return data.encode('utf-8', errors='surrogateescape').decode('utf-8', errors='replace')
+    return bytes(data).decode('utf-8', errors='replace')
+
+
+def _snippet(buffer, line_start: int, line_end: int, match_start: int,
+             match_end: int) -> Dict[str, Any]:
+    """
+    截取命中位置附近的片段，返回片段文本及命中在片段中的字符位置
+
+    buffer 为 mmap（位置为字节偏移）或解码后的块（位置为字符偏移）
+    """
+    snippet_start = max(line_start, match_start - SNIPPET_CONTEXT)
+    snippet_end = min(line_end, match_end + SNIPPET_CONTEXT)
+    before = _to_text(buffer[snippet_start:match_start])
+    matched = _to_text(buffer[match_start:match_end])
+    after = _to_text(buffer[match_end:snippet_end])
+    return {
+        "snippet": before + matched + after.rstrip('\r\n'),
+        "match_start": len(before),
+        "match_length": len(matched),
+        "truncated_before": snippet_start > line_start,
+        "truncated_after": snippet_end < line_end
+    }
+
+
+def _search_decoded(text: str, base_offset: int, pattern, max_matches: int) -> List[Dict[str, Any]]:
+    """
+    在解码后的块上用 str 正则搜索
+
+    匹配位置是字符偏移，按顺序累加其前面文本的 UTF-8 字节数换算回文件中的字节偏移
+    （surrogateescape 解码保证与原始字节一一对应），整个块只编码一遍
+
+    Args:
+        text: 块内容（surrogateescape 解码）
+        base_offset: 块在文件中的起始字节偏移
+        pattern: 编译后的 str 正则
+        max_matches: 最多命中行数
+    """
+    matches = []
+    line_number = 0
+    # 已换算到的 (字符位置, 字节偏移)
+    char_pos, byte_pos = 0, base_offset
+
+    def to_byte(position):
+        nonlocal char_pos, byte_pos
+        byte_pos += len(text[char_pos:position].encode('utf-8', errors='surrogateescape'))
+        char_pos = position
+        return byte_pos
+
+    pos = 0
+    end = len(text)
+    while pos < end and len(matches) < max_matches:
+        match = pattern.search(text, pos)
+        if match is None:
+            break
+        match_start, match_end = match.span()
+        line_start = text.rfind('\n', 0, match_start) + 1
+        line_end = text.find('\n', match_start)
+        line_end = end if line_end < 0 else line_end + 1
+
+        line_number += text.count('\n', char_pos, line_start)
+        line_offset = to_byte(line_start)
+        result = {
+            "line": line_number,
+            "byte_offset": line_offset + len(text[line_start:match_start].encode('utf-8', errors='surrogateescape')),
+            "line_offset": line_offset
+        }
+        result.update(_snippet(text, line_start, line_end, match_start, match_end))
+        matches.append(result)
+        # 每行只报告第一个命中
+        pos = line_end
+    return matches
+
+
+def _search_chunk(args) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    搜索文件的一个块（在子进程中执行）
+
+    Args:
+        args: (文件路径, 块起始偏移, 块结束偏移, 模式, 最多命中行数)
+
+    Returns:
+        (块内换行符数量, 命中列表)，命中的 line 为块内行号（从0开始）
+    """
+    file_path, start, end, pattern, max_matches = args
+    if end <= start:
+        return 0, []
+
+    aligned = start - start % mmap.ALLOCATIONGRANULARITY
+    matches = []
+    with open(file_path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), end - aligned, offset=aligned, access=mmap.ACCESS_READ)
+        try:
+            view = np.frombuffer(mm, dtype=np.uint8)
+            lo, hi = start - aligned, end - aligned
+            newline_count = int(np.count_nonzero(view[lo:hi] == 10))
+            if not isinstance(pattern, bytes):
+                del view
+                text = mm[lo:hi].decode('utf-8', errors='surrogateescape')
+                return newline_count, _search_decoded(text, start, pattern, max_matches)
+
+            counted_pos = lo
+            line_number = 0
+            pos = lo
+            while pos < hi and len(matches) < max_matches:
+                match_start = mm.find(pattern, pos, hi)
+                if match_start < 0:
+                    break
+                match_end = match_start + len(pattern)
+
+                line_start = mm.rfind(b'\n', lo, match_start) + 1
+                if line_start == 0:
+                    line_start = lo
+                line_end = mm.find(b'\n', match_start, hi)
+                line_end = hi if line_end < 0 else line_end + 1
+
+                # 增量统计换行符，得到块内行号
+                line_number += int(np.count_nonzero(view[counted_pos:line_start] == 10))
+                counted_pos = line_start
+
+                result = {
+                    "line": line_number,
+                    "byte_offset": aligned + match_start,
+                    "line_offset": aligned + line_start
+                }
+                result.update(_snippet(mm, line_start, line_end, match_start, match_end))
+                matches.append(result)
+                # 每行只报告第一个命中
+                pos = line_end
+            del view
+        finally:
+            mm.close()
+    return newline_count, matches
+
+
+def search_text_file(file_path: str, pattern: str, regex: bool = False,
+                     ignore_case: bool = False, limit: int = DEFAULT_SEARCH_LIMIT,
+                     progress: Optional[Callable[[int, int], None]] = None
+                     ) -> Iterator[Dict[str, Any]]:
+    """
+    搜索文本/JSONL 文件，按文件顺序逐条产出命中的行
+
+    Args:
+        file_path: 文件路径
+        pattern: 搜索内容
+        regex: 是否为正则表达式
+        ignore_case: 是否忽略大小写
+        limit: 最多返回的命中行数
+        progress: 进度回调 progress(已扫描字节数, 文件大小)
+
+    Returns:
+        命中的迭代器，每项为 {"row": 行号(从0开始), "byte_offset", "line_offset",
+        "snippet", "match_start", "match_length", ...}
+
+    Raises:
+        ValueError: 模式为空或正则无效（在开始扫描前抛出）
+    """
+    compiled = compile_pattern(pattern, regex, ignore_case)
+    return _iter_text_matches(file_path, compiled, limit, progress)
+
+
+def _iter_text_matches(file_path: str, compiled, limit: int,
+                       progress: Optional[Callable[[int, int], None]]) -> Iterator[Dict[str, Any]]:
+    """逐块搜索文本文件，按文件顺序产出命中"""
+    file_size = os.path.getsize(file_path)
+    if file_size == 0 or limit <= 0:
+        return
+
+    ranges = _chunk_ranges(file_path, file_size, SEARCH_CHUNK_SIZE)
+    tasks = [(file_path, start, end, compiled, limit) for start, end in ranges]
+
+    if file_size < PARALLEL_SEARCH_BYTES or SEARCH_WORKERS <= 1 or len(tasks) <= 1:
+        results = (_search_chunk(task) for task in tasks)
+        pending = None
+    else:
+        # 按顺序取结果，同时最多提交 2 倍进程数的块，命中数够了就不再提交
+        pool = _get_pool()
+        pending = []
+        window = SEARCH_WORKERS * 2
+
+        def ordered_results():
+            next_task = 0
+            while next_task < len(tasks) or pending:
+                while next_task < len(tasks) and len(pending) < window:
+                    pending.append(pool.submit(_search_chunk, tasks[next_task]))
+                    next_task += 1
+                yield pending.pop(0).result()
+
+        results = ordered_results()
+
+    emitted = 0
+    lines_before = 0
+    try:
+        for (start, end), (newline_count, matches) in zip(ranges, results):
+            for match in matches:
+                match["row"] = lines_before + match.pop("line")
+                yield match
+                emitted += 1
+                if emitted >= limit:
+                    return
+            lines_before += newline_count
+            if progress is not None:
+                progress(end, file_size)
+    finally:
+        if pending:
+            for future in pending:
+                future.cancel()
+
+
+def _string_columns(schema: pa.Schema, columns: Optional[List[str]]) -> List[str]:
+    """可搜索的顶层字符串列（包括字典编码的字符串列）"""
+    names = []
+    for field in schema:
+        data_type = field.type
+        if pa.types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        if not (pa.types.is_string(data_type) or pa.types.is_large_string(data_type)):
+            continue
+        if columns is None or field.name in columns:
+            names.append(field.name)
+    return names
+
+
+def search_parquet_file(file_path: str, pattern: str, regex: bool = False,
+                        ignore_case: bool = False, columns: Optional[List[str]] = None,
+                        limit: int = DEFAULT_SEARCH_LIMIT,
+                        progress: Optional[Callable[[int, int], None]] = None
+                        ) -> Iterator[Dict[str, Any]]:
+    """
+    搜索 parquet 文件的字符串列，逐个 row group 求值，按行号顺序逐条产出命中的行
+
+    Args:
+        file_path: parquet 文件路径
+        pattern: 搜索内容（正则为 RE2 语法）
+        regex: 是否为正则表达式
+        ignore_case: 是否忽略大小写
+        columns: 搜索的列，None 表示全部字符串列
+        limit: 最多返回的命中行数
+        progress: 进度回调 progress(已扫描 row group 数, row group 总数)
+
+    Returns:
+        命中的迭代器，每项为 {"row": 行号(从0开始), "column": 第一个命中的列,
+        "columns": 全部命中的列, "snippet", ...}
+
+    Raises:
+        ValueError: 模式为空、正则无效或没有可搜索的列（在开始扫描前抛出）
+    """
+    if not pattern:
+        raise ValueError("搜索内容不能为空")
+
+    entry = parquet_file_cache.get(file_path)
+    with entry.open() as parquet_file:
+        schema = parquet_file.schema_arrow
+    search_columns = _string_columns(schema, columns)
+    if not search_columns:
+        raise ValueError("没有可搜索的字符串列")
+
+    match_kernel = pc.match_substring_regex if regex else pc.match_substring
+    try:
+        # 提前校验正则，避免在流式输出过程中才报错
+        match_kernel(pa.array([''], pa.string()), pattern=pattern, ignore_case=ignore_case)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"无效的正则表达式: {e}")
+
+    options = (match_kernel, pattern, regex, ignore_case)
+    return _iter_parquet_matches(entry, search_columns, options, limit, progress)
+
+
+def _iter_parquet_matches(entry, search_columns: List[str], options: tuple, limit: int,
+                          progress: Optional[Callable[[int, int], None]]) -> Iterator[Dict[str, Any]]:
+    """逐个 row group 搜索 parquet 文件，按行号顺序产出命中"""
+    match_kernel, pattern, regex, ignore_case = options
+    metadata = entry.metadata
+    emitted = 0
+    for rg_idx in range(metadata.num_row_groups):
+        with entry.open() as parquet_file:
+            table = parquet_file.read_row_group(rg_idx, columns=search_columns)
+
+        masks = []
+        for name in search_columns:
+            column = table.column(name)
+            if pa.types.is_dictionary(column.type):
+                column = column.cast(column.type.value_type)
+            masks.append(pc.fill_null(match_kernel(column, pattern=pattern,
+                                                   ignore_case=ignore_case), False))
+        combined = masks[0]
+        for mask in masks[1:]:
+            combined = pc.or_(combined, mask)
+
+        hits = pc.indices_nonzero(combined).to_pylist()
+        base = entry.index.offsets[rg_idx]
+        for local_row in hits[:limit - emitted]:
+            matched_columns = [name for name, mask in zip(search_columns, masks)
+                               if mask[local_row].as_py()]
+            value = table.column(matched_columns[0])[local_row].as_py()
+            yield {
+                "row": base + local_row,
+                "column": matched_columns[0],
+                "columns": matched_columns,
+                **_value_snippet(value, pattern, regex, ignore_case)
+            }
+            emitted += 1
+        if emitted >= limit:
+            return
+        if progress is not None:
+            progress(rg_idx + 1, metadata.num_row_groups)
+
+
+def _value_snippet(value: str, pattern: str, regex: bool, ignore_case: bool) -> Dict[str, Any]:
+    """截取单元格中命中位置附近的片段"""
+    flags = re.IGNORECASE if ignore_case else 0
+    try:
+        match = re.search(pattern if regex else re.escape(pattern), value, flags)
+    except re.error:
+        # RE2 与 Python 正则语法不完全一致，无法定位时从开头截取
+        match = None
+    start, end = match.span() if match else (0, 0)
+    snippet_start = max(0, start - SNIPPET_CONTEXT)
+    snippet_end = min(len(value), end + SNIPPET_CONTEXT)
+    return {
+        "snippet": value[snippet_start:snippet_end],
+        "match_start": start - snippet_start,
+        "match_length": end - start,
+        "truncated_before": snippet_start > 0,
+        "truncated_after": snippet_end < len(value)
+    }
+
+
+def search_file(file_path: str, file_type: str, pattern: str, regex: bool = False,
+                ignore_case: bool = False, columns: Optional[List[str]] = None,
+                limit: int = DEFAULT_SEARCH_LIMIT,
+                progress: Optional[Callable[[int, int], None]] = None
+                ) -> Iterator[Dict[str, Any]]:
+    """按文件类型分派搜索，参数同 search_text_file / search_parquet_file"""
+    if file_type == 'dataset':
+        raise ValueError("数据集暂不支持搜索，请打开单个分片搜索")
+    if file_type == 'parquet':
+        return search_parquet_file(file_path, pattern, regex, ignore_case, columns, limit, progress)
+    return search_text_file(file_path, pattern, regex, ignore_case, limit, progress)
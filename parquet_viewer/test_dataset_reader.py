@@ -0,0 +1,35 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from dataset_reader import open_dataset
+
+resource = pytest.importorskip('resource')
+
+
+def write_shards(directory, count, rows_per_shard=3):
+    for i in range(count):
+        start = i * rows_per_shard
+        pq.write_table(pa.table({'x': list(range(start, start + rows_per_shard))}),
+                       os.path.join(directory, f'part-{i:04d}.parquet'))
+
+
+def test_open_dataset_with_more_shards_than_fd_limit(tmp_path):
+    shards = 300
+    write_shards(str(tmp_path), shards)
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # 只比当前已打开的文件多留少量余量，远小于分片数
+    limit = len(os.listdir('/proc/self/fd')) + 64 if os.path.isdir('/proc/self/fd') else 128
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit, soft), hard))
+    try:
+        dataset = open_dataset(str(tmp_path))
+        assert len(dataset.shards) == shards
+        assert dataset.total_rows == shards * 3
+        # 跨越全部分片读取
+        table = dataset.read_table(0, shards * 3, ['x'])
+        assert table.column('x').to_pylist() == list(range(shards * 3))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
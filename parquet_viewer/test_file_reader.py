@@ -0,0 +1,62 @@
+import json
+import os
+from array import array
+
+import pytest
+
+import file_reader
+import line_index
+from file_reader import FileReader
+from line_index import LineIndex, LineIndexPending
+
+
+@pytest.fixture
+def large_jsonl(tmp_path, monkeypatch):
+    # 把“大文件”阈值调小，模拟没有行索引的大文件
+    monkeypatch.setattr(file_reader, 'LINE_INDEX_EAGER_BYTES', 1024)
+    monkeypatch.setattr(line_index, 'STREAM_MAX_SKIP_LINES', 5000)
+    path = tmp_path / 'big.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(10000):
+            f.write(json.dumps({"i": i, "text": "第%d行" % i}, ensure_ascii=False) + '\n')
+    return str(path)
+
+
+def test_slice_without_index_streams_from_start(large_jsonl):
+    reader = FileReader(large_jsonl)
+    assert [record["i"] for record in reader.read_slice(4000, 3)] == [4000, 4001, 4002]
+    lines = reader.read_slice(4000, 2)
+    assert lines[0]["text"] == "第4000行"
+    # 请求线程中不构建行索引
+    assert LineIndex.load(large_jsonl) is None
+
+
+def test_far_slice_without_index_is_pending(large_jsonl):
+    reader = FileReader(large_jsonl)
+    assert reader.line_index_pending(9000)
+    with pytest.raises(LineIndexPending):
+        reader.read_slice(9000, 3)
+
+    LineIndex.build(large_jsonl).save(large_jsonl)
+    assert not reader.line_index_pending(9000)
+    assert [record["i"] for record in reader.read_slice(9998, 5)] == [9998, 9999]
+
+
+def test_line_index_save_removes_temp_file_on_write_error(tmp_path, monkeypatch):
+    path = tmp_path / 'data.txt'
+    path.write_text('a\nb\n', encoding='utf-8')
+    index = LineIndex.build(str(path))
+    other_dir = tmp_path / 'fallback'
+    monkeypatch.setattr(line_index, '_index_paths',
+                        lambda file_path: [str(tmp_path / '.data.txt.lineidx'),
+                                           str(other_dir / 'data.lineidx')])
+
+    class FullDisk(array):
+        def tofile(self, f):
+            raise OSError(28, 'No space left on device')
+
+    index.offsets = FullDisk('Q', index.offsets)
+
+    index.save(str(path))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    assert not os.path.exists(other_dir) or not os.listdir(other_dir)
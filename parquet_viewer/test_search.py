@@ -0,0 +1,52 @@
+import json
+
+from search import search_file
+
+
+def write_jsonl(path, count):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            f.write(json.dumps({"i": i, "meta": {"n": i}}) + '\n')
+
+
+def test_anchored_regex_matches_each_line(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    write_jsonl(path, 20)
+
+    starts = list(search_file(str(path), 'jsonl', r'^\{"i": 5,', regex=True))
+    assert [match["row"] for match in starts] == [5]
+    assert starts[0]["match_start"] == 0
+
+    ends = list(search_file(str(path), 'jsonl', r'5}}$', regex=True))
+    assert [match["row"] for match in ends] == [5, 15]
+
+
+def test_anchored_regex_ignore_case(tmp_path):
+    path = tmp_path / 'data.txt'
+    path.write_text('alpha\nBeta\nbeta gamma\n', encoding='utf-8')
+
+    matches = list(search_file(str(path), 'text', r'^beta$', regex=True, ignore_case=True))
+    assert [match["row"] for match in matches] == [1]
+
+
+def test_regex_matches_cjk_characters(tmp_path):
+    path = tmp_path / 'zh.txt'
+    lines = ['第一章 开始', '第二章 继续', '没有命中', 'ÄBC 结束']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    raw = path.read_bytes()
+
+    matches = list(search_file(str(path), 'text', '第.章', regex=True))
+    assert [match["row"] for match in matches] == [0, 1]
+    assert matches[1]["snippet"] == '第二章 继续'
+    assert matches[1]["match_length"] == 3
+    # 字节偏移指向文件中的原始位置
+    assert raw[matches[1]["byte_offset"]:].startswith('第二章'.encode('utf-8'))
+    assert matches[1]["line_offset"] == raw.index('第二章'.encode('utf-8'))
+
+    words = list(search_file(str(path), 'text', r'\w+章', regex=True))
+    assert [match["row"] for match in words] == [0, 1]
+
+    # 忽略大小写对非 ASCII 字符同样生效
+    folded = list(search_file(str(path), 'text', 'äbc', ignore_case=True))
+    assert [match["row"] for match in folded] == [3]
+    assert raw[folded[0]["byte_offset"]:].startswith('ÄBC'.encode('utf-8'))
@@ -0,0 +1,26 @@
+import io
+
+import pytest
+
+from upload_store import UploadError, UploadStore
+
+
+def test_concurrent_sessions_cannot_exceed_budget(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=100)
+    first = store.create_session('a.jsonl', 60)
+    assert store.stats()['reserved_bytes'] == 60
+
+    # 第一个会话的预留还在，第二个会话不能再占 60 字节
+    with pytest.raises(UploadError):
+        store.create_session('b.jsonl', 60)
+
+    store.abort(first.id)
+    assert store.stats()['reserved_bytes'] == 0
+    second = store.create_session('b.jsonl', 60)
+    assert store.stats()['reserved_bytes'] == 60
+
+    second.write_chunk(0, io.BytesIO(b'x' * 60))
+    store.complete(second.id)
+    stats = store.stats()
+    assert stats['reserved_bytes'] == 0
+    assert stats['bytes'] == 60
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+按列排序取前 K 行
+
+逐个 row group 只读取排序列，用 pyarrow.compute.select_k_unstable 选出每个 row group 的候选，
+再合并到大小为 K 的堆中，内存只与 K 和单个 row group 的排序列大小有关，与文件大小无关。
+按值排序时，row group 按 footer 中的 max（降序）/min（升序）统计从最有希望的开始访问，
+堆满后统计值不可能进入堆的 row group 直接跳过。最后只对胜出的行读取完整的输出列。
+"""
+
+import heapq
+import time
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrow_serializer import column_to_pylist, table_to_records
+from parquet_cache import parquet_file_cache
+from query_engine import (column_array, leaf_column_indices, resolve_type, supports_length,
+                          value_lengths)
+
+# K 的上限
+MAX_TOP_K = 10000
+
+# 排序方式：value 按值排序，length 按字符串/二进制的长度或 list 的元素个数排序
+SORT_MODES = ('value', 'length')
+
+
+class _HeapEntry:
+    """堆中的一行，堆顶为当前最差的候选"""
+
+    __slots__ = ('key', 'row', 'descending')
+
+    def __init__(self, key: Any, row: int, descending: bool):
+        self.key = key
+        self.row = row
+        self.descending = descending
+
+    def __lt__(self, other: '_HeapEntry') -> bool:
+        # a < b 表示 a 比 b 差；排序值相同时行号小的优先
+        if self.key != other.key:
+            return self.key < other.key if self.descending else self.key > other.key
+        return self.row > other.row
+
+
+def _sort_keys(array: pa.Array, mode: str) -> pa.Array:
+    """计算排序键"""
+    if mode == 'length':
+        return value_lengths(array)
+    if pa.types.is_dictionary(array.type):
+        array = array.cast(array.type.value_type)
+    return array
+
+
+def _validate_type(data_type: pa.DataType, column: str, mode: str):
+    """检查列类型是否支持该排序方式"""
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    if mode == 'length':
+        if not supports_length(data_type):
+            raise ValueError(f"按长度排序仅支持字符串、二进制和 list 列: {column}")
+    elif (pa.types.is_nested(data_type) or pa.types.is_null(data_type) or
+          pa.types.is_boolean(data_type)):
+        raise ValueError(f"该列类型不支持按值排序: {column} ({data_type})")
+
+
+def _can_enter(bound: Any, worst: _HeapEntry) -> bool:
+    """row group 的统计边界值是否可能进入已满的堆"""
+    try:
+        if worst.descending:
+            return bound >= worst.key
+        return bound <= worst.key
+    except TypeError:
+        # 统计值与排序键无法比较时不做排除
+        return True
+
+
+def top_k_parquet(file_path: str, column: str, k: int = 100, order: str = 'desc',
+                  mode: str = 'value', columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    按列排序取前 K 行（空值和 NaN 不参与排序）
+
+    Args:
+        file_path: parquet 文件路径
+        column: 排序列（支持 "a.b.c" 形式的嵌套字段路径）
+        k: 返回的行数
+        order: desc 取最大的 K 行，asc 取最小的 K 行
+        mode: value 按值排序，length 按长度排序
+        columns: 输出列，None 表示全部列
+
+    Returns:
+        按排序结果排列的行、行号、排序键以及 row group 访问情况
+    """
+    started = time.perf_counter()
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"不支持的排序方向: {order}")
+    if mode not in SORT_MODES:
+        raise ValueError(f"不支持的排序方式: {mode}")
+    if k <= 0 or k > MAX_TOP_K:
+        raise ValueError(f"k 必须在 1 到 {MAX_TOP_K} 之间")
+    descending = order == 'desc'
+
+    entry = parquet_file_cache.get(file_path)
+    metadata = entry.metadata
+    with entry.open() as parquet_file:
+        schema = parquet_file.schema_arrow
+    _validate_type(resolve_type(schema, column), column, mode)
+
+    # 按值排序时用 footer 统计确定访问顺序和可跳过的 row group
+    leaf_index = leaf_column_indices(metadata).get(column) if mode == 'value' else None
+    bounded, unbounded = [], []
+    for rg_idx in range(metadata.num_row_groups):
+        statistics = None
+        if leaf_index is not None:
+            statistics = metadata.row_group(rg_idx).column(leaf_index).statistics
+        if statistics is not None and statistics.has_min_max:
+            bounded.append((statistics.max if descending else statistics.min, rg_idx))
+        else:
+            unbounded.append((None, rg_idx))
+    try:
+        bounded.sort(key=lambda item: item[0], reverse=descending)
+    except TypeError:
+        pass
+    visit_order = bounded + unbounded
+
+    stats = {
+        "row_groups_total": metadata.num_row_groups,
+        "pruned_by_statistics": 0,
+        "scanned": 0
+    }
+    heap: List[_HeapEntry] = []
+    key_type = None
+    sort_direction = 'descending' if descending else 'ascending'
+
+    for bound, rg_idx in visit_order:
+        if len(heap) >= k and bound is not None and not _can_enter(bound, heap[0]):
+            stats["pruned_by_statistics"] += 1
+            continue
+
+        stats["scanned"] += 1
+        with entry.open() as parquet_file:
+            table = parquet_file.read_row_group(rg_idx, columns=[column])
+        keys = _sort_keys(column_array(table, column).combine_chunks(), mode)
+        key_type = keys.type
+
+        mask = pc.is_valid(keys)
+        if pa.types.is_floating(keys.type):
+            mask = pc.and_(mask, pc.invert(pc.is_nan(keys)))
+        if len(heap) >= k:
+            # 堆满后只保留不比当前最差候选更差的值
+            threshold = pa.scalar(heap[0].key, keys.type)
+            compare = pc.greater_equal if descending else pc.less_equal
+            mask = pc.and_(mask, compare(keys, threshold))
+        candidates = pc.indices_nonzero(pc.fill_null(mask, False))
+        if len(candidates) == 0:
+            continue
+
+        candidate_keys = keys.take(candidates)
+        if len(candidates) > k:
+            selected = pc.select_k_unstable(candidate_keys, k=k,
+                                            sort_keys=[('dummy', sort_direction)])
+            candidates = candidates.take(selected)
+            candidate_keys = candidate_keys.take(selected)
+
+        base = entry.index.offsets[rg_idx]
+        for key, local_row in zip(candidate_keys.to_pylist(), candidates.to_pylist()):
+            item = _HeapEntry(key, base + local_row, descending)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif heap[0] < item:
+                heapq.heapreplace(heap, item)
+
+    winners = sorted(heap, reverse=True)
+    rows = _fetch_rows(entry, [item.row for item in winners], columns)
+
+    return {
+        "column": column,
+        "order": order,
+        "mode": mode,
+        "k": k,
+        "rows": rows,
+        "row_numbers": [item.row for item in winners],
+        "sort_values": column_to_pylist(pa.array([item.key for item in winners],
+                                                 type=key_type or pa.null())),
+        "row_groups": stats,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def _fetch_rows(entry, row_numbers: List[int], columns: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """按行号读取胜出行的完整输出列，每个 row group 只读取一次，结果保持给定顺序"""
+    by_row_group: Dict[int, List[int]] = {}
+    for position, row in enumerate(row_numbers):
+        rg_idx, _ = entry.index.locate(row)
+        by_row_group.setdefault(rg_idx, []).append(position)
+
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(row_numbers)
+    for rg_idx, positions in by_row_group.items():
+        base = entry.index.offsets[rg_idx]
+        local_rows = pa.array([row_numbers[p] - base for p in positions], pa.int64())
+        with entry.open() as parquet_file:
+            table = parquet_file.read_row_group(rg_idx, columns=columns).take(local_rows)
+        for position, record in zip(positions, table_to_records(table)):
+            rows[position] = record
+    return rows
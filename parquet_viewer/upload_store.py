@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+分块续传上传
+
+上传分为 init / 逐块写入 / complete 三步，每块按偏移顺序追加到 .partial 目录下的临时文件，
+写入的同时增量计算 sha256；断线后查询会话即可从已接收的偏移继续。
+parquet 文件在第一块到达时检查文件头 magic，客户端还可以先单独发送文件尾部，
+服务端立即检查 footer 长度并解析 footer，损坏或非 parquet 的文件在传输正文前就失败。
+完成后的文件以内容哈希命名（{sha256 前 32 位}_{文件名}），相同内容只保存一份。
+
+上传目录有字节预算：内存中维护已保存文件的索引（大小、内容哈希、最近访问时间），
+查找和列目录不再逐次访问文件系统；超出预算时按最近访问时间淘汰，
+同时使 footer 缓存、行索引和分析任务结果失效。访问时间定期写回文件的 atime，重启后仍然有效。
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from jobs import job_manager
+from line_index import remove_line_index
+from page_cache import page_cache
+from parquet_cache import parquet_file_cache
+
+# 建议的分块大小
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 从请求流读取、写入磁盘的缓冲区大小
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+# 未完成的上传会话保留时间（秒）
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# 客户端预先发送的文件尾部最大字节数
+MAX_TAIL_SIZE = 16 * 1024 * 1024
+
+PARQUET_MAGIC = b'PAR1'
+
+# 未完成上传的临时目录（以 . 开头，文件列表中不显示）
+PARTIAL_DIR = '.partial'
+
+# 上传目录默认的字节预算
+DEFAULT_UPLOAD_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+# 访问时间写回文件 atime 的最小间隔（秒）
+ACCESS_PERSIST_INTERVAL = 60
+
+# 以内容哈希命名的文件名前缀长度
+DIGEST_PREFIX_LENGTH = 32
+
+
+class UploadError(Exception):
+    """上传请求无效（对应 400）"""
+
+
+class UploadConflict(UploadError):
+    """写入偏移与已接收的字节数不一致（对应 409），客户端应按 received 续传"""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+def check_parquet_tail(tail: bytes, total_size: int):
+    """
+    检查 parquet 文件尾部：magic、footer 长度，footer 完整时解析 footer 并检查 row group 范围
+
+    Args:
+        tail: 文件末尾的若干字节
+        total_size: 文件总大小
+
+    Raises:
+        UploadError: 不是有效的 parquet 文件
+    """
+    if total_size < 12 or len(tail) < 8:
+        raise UploadError("文件太小，不是有效的 parquet 文件")
+    if tail[-4:] != PARQUET_MAGIC:
+        raise UploadError("文件尾部缺少 PAR1 标识，不是有效的 parquet 文件")
+    footer_length = struct.unpack('<I', tail[-8:-4])[0]
+    if footer_length + 12 > total_size:
+        raise UploadError(f"footer 长度 {footer_length} 超出文件大小，文件已损坏")
+    if footer_length + 8 > len(tail):
+        # 尾部不包含完整的 footer，留到上传完成后再解析
+        return None
+
+    # footer 前后拼上 magic 即可在内存中单独解析 footer
+    footer = tail[-(footer_length + 8):-8]
+    buffer = PARQUET_MAGIC + footer + tail[-8:]
+    try:
+        metadata = pq.read_metadata(pa.BufferReader(buffer))
+    except Exception as e:
+        raise UploadError(f"parquet footer 解析失败: {e}")
+
+    data_end = total_size - footer_length - 8
+    for rg_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_idx)
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            start = column.dictionary_page_offset or column.data_page_offset
+            if start is not None and start + column.total_compressed_size > data_end:
+                raise UploadError("footer 中的列数据范围超出文件大小，文件已损坏")
+    return metadata
+
+
+class UploadSession:
+    """一次分块上传，状态保存在 .partial/{upload_id}.json，数据在 .partial/{upload_id}.part"""
+
+    def __init__(self, store: 'UploadStore', upload_id: str, info: Dict[str, Any]):
+        self.store = store
+        self.id = upload_id
+        self.filename = info['filename']
+        self.size = info['size']
+        self.created_at = info['created_at']
+        self.tail_checked = info.get('tail_checked', False)
+        self.lock = threading.RLock()
+        self._hasher = None
+        self._hashed = 0
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.store.partial_dir, f"{self.id}.part")
+
+    @property
+    def info_path(self) -> str:
+        return os.path.join(self.store.partial_dir, f"{self.id}.json")
+
+    @property
+    def is_parquet(self) -> bool:
+        return self.filename.lower().endswith('.parquet')
+
+    @property
+    def received(self) -> int:
+        """已接收的字节数（以磁盘上的临时文件为准，进程重启后仍然有效）"""
+        try:
+            return os.path.getsize(self.data_path)
+        except OSError:
+            return 0
+
+    def save(self):
+        """保存会话信息"""
+        info = {
+            "filename": self.filename,
+            "size": self.size,
+            "created_at": self.created_at,
+            "tail_checked": self.tail_checked
+        }
+        tmp_path = self.info_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(tmp_path, self.info_path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        received = self.received
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "received": received,
+            "complete": received == self.size,
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+            "tail_checked": self.tail_checked
+        }
+
+    def _sync_hasher(self):
+        """确保哈希状态覆盖已接收的全部字节（进程重启或写入失败后从临时文件重新计算）"""
+        received = self.received
+        if self._hasher is not None and self._hashed == received:
+            return
+        self._hasher = hashlib.sha256()
+        self._hashed = 0
+        with open(self.data_path, 'ab+') as f:
+            f.seek(0)
+            while self._hashed < received:
+                block = f.read(min(STREAM_BUFFER_SIZE, received - self._hashed))
+                if not block:
+                    break
+                self._hasher.update(block)
+                self._hashed += len(block)
+
+    def write_chunk(self, offset: int, stream, length: Optional[int] = None) -> int:
+        """
+        从 offset 处追加一块数据，边读边写盘并更新哈希
+
+        Args:
+            offset: 块在文件中的起始偏移，必须等于已接收的字节数
+            stream: 可 read() 的请求体
+            length: 块长度（Content-Length），None 表示读到流结束
+
+        Returns:
+            写入后已接收的字节数
+        """
+        with self.lock:
+            received = self.received
+            if offset != received:
+                raise UploadConflict(f"偏移 {offset} 与已接收的 {received} 字节不一致", received)
+            if length is not None and self.size is not None and offset + length > self.size:
+                raise UploadError(f"数据超出声明的文件大小 {self.size}")
+            self._sync_hasher()
+
+            written = 0
+            first_block = offset == 0
+            try:
+                with open(self.data_path, 'ab') as f:
+                    while True:
+                        to_read = STREAM_BUFFER_SIZE if length is None else \
+                            min(STREAM_BUFFER_SIZE, length - written)
+                        if to_read <= 0:
+                            break
+                        block = stream.read(to_read)
+                        if not block:
+                            break
+                        if self.size is not None and offset + written + len(block) > self.size:
+                            raise UploadError(f"数据超出声明的文件大小 {self.size}")
+                        if first_block and self.is_parquet and written < 4:
+                            head = block[:4 - written]
+                            if head != PARQUET_MAGIC[written:written + len(head)]:
+                                raise UploadError("文件头缺少 PAR1 标识，不是有效的 parquet 文件")
+                        f.write(block)
+                        self._hasher.update(block)
+                        self._hashed += len(block)
+                        written += len(block)
+            except UploadError:
+                # 无效的块整体丢弃；连接中断时已写入的部分保留，客户端按 received 续传
+                with open(self.data_path, 'ab') as f:
+                    f.truncate(offset)
+                self._hasher = None
+                raise
+            return offset + written
+
+    def check_tail(self, tail: bytes):
+        """检查客户端预先发送的文件尾部"""
+        if len(tail) > min(self.size, MAX_TAIL_SIZE):
+            raise UploadError("文件尾部超出允许的大小")
+        if self.is_parquet:
+            check_parquet_tail(tail, self.size)
+        with self.lock:
+            self.tail_checked = True
+            self.save()
+
+    def digest(self) -> str:
+        """全部数据的 sha256"""
+        with self.lock:
+            self._sync_hasher()
+            return self._hasher.hexdigest()
+
+    def remove(self):
+        """删除临时文件和会话信息"""
+        for path in (self.data_path, self.info_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class StoredFile:
+    """上传目录中的一个已保存文件"""
+
+    __slots__ = ('path', 'name', 'size', 'mtime_ns', 'digest', 'last_access', 'persisted_access')
+
+    def __init__(self, path: str, stat: os.stat_result):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        prefix = self.name[:DIGEST_PREFIX_LENGTH]
+        is_digest = (len(self.name) > DIGEST_PREFIX_LENGTH and
+                     self.name[DIGEST_PREFIX_LENGTH] == '_' and
+                     all(c in '0123456789abcdef' for c in prefix))
+        self.digest = prefix if is_digest else None
+        self.last_access = max(stat.st_atime, stat.st_mtime)
+        self.persisted_access = self.last_access
+
+
+class UploadStore:
+    """上传文件存储：分块续传会话、按内容哈希去重和按字节预算 LRU 淘汰的完成文件"""
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_UPLOAD_MAX_BYTES):
+        """
+        初始化 UploadStore
+
+        Args:
+            root: 上传目录
+            max_bytes: 已保存文件的总字节预算
+        """
+        self.root = root
+        self.partial_dir = os.path.join(root, PARTIAL_DIR)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+        # 已保存文件的索引，按最近访问时间从旧到新排列
+        self._files: "OrderedDict[str, StoredFile]" = OrderedDict()
+        self._by_digest: Dict[str, str] = {}
+        self._total_bytes = 0
+        # 未完成上传预留的字节数，按 upload_id 记录，会话完成或放弃时释放
+        self._reserved: Dict[str, int] = {}
+        self._reserved_bytes = 0
+        self._root_mtime_ns = None
+        self.evictions = 0
+        self.evicted_bytes = 0
+        with self._lock:
+            self._scan_locked()
+
+    def configure(self, max_bytes: int = None):
+        """调整字节预算，超出部分立即淘汰"""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            evicted = self._evict_locked()
+        self._remove_files(evicted)
+
+    # ---------- 文件索引 ----------
+
+    def _scan_locked(self):
+        """扫描上传目录重建索引，保留已知文件在内存中的访问时间"""
+        previous = self._files
+        found = []
+        try:
+            self._root_mtime_ns = os.stat(self.root).st_mtime_ns
+            with os.scandir(self.root) as entries:
+                for item in entries:
+                    if item.name.startswith('.') or not item.is_file(follow_symlinks=False):
+                        continue
+                    path = os.path.abspath(item.path)
+                    stored = StoredFile(path, item.stat(follow_symlinks=False))
+                    known = previous.get(path)
+                    if known is not None and known.mtime_ns == stored.mtime_ns:
+                        stored.last_access = known.last_access
+                        stored.persisted_access = known.persisted_access
+                    found.append(stored)
+        except OSError:
+            pass
+
+        found.sort(key=lambda stored: stored.last_access)
+        self._files = OrderedDict((stored.path, stored) for stored in found)
+        self._by_digest = {stored.digest: stored.path for stored in found if stored.digest}
+        self._total_bytes = sum(stored.size for stored in found)
+
+    def _refresh_locked(self):
+        """上传目录被外部修改（目录 mtime 变化）时重新扫描"""
+        try:
+            mtime_ns = os.stat(self.root).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns != self._root_mtime_ns:
+            self._scan_locked()
+
+    def _add_locked(self, path: str) -> StoredFile:
+        """把新保存的文件加入索引"""
+        path = os.path.abspath(path)
+        stored = StoredFile(path, os.stat(path))
+        stored.last_access = stored.persisted_access = time.time()
+        old = self._files.pop(path, None)
+        if old is not None:
+            self._total_bytes -= old.size
+        self._files[path] = stored
+        self._total_bytes += stored.size
+        if stored.digest:
+            self._by_digest[stored.digest] = path
+        self._root_mtime_ns = os.stat(self.root).st_mtime_ns
+        return stored
+
+    def touch(self, file_path: str):
+        """记录一次访问（查看文件时调用），非上传目录中的文件直接忽略"""
+        path = os.path.abspath(file_path)
+        now = time.time()
+        with self._lock:
+            stored = self._files.get(path)
+            if stored is None:
+                return
+            self._files.move_to_end(path)
+            stored.last_access = now
+            if now - stored.persisted_access < ACCESS_PERSIST_INTERVAL:
+                return
+            stored.persisted_access = now
+        try:
+            # 只修改 atime，保留 mtime（footer 缓存等以 mtime 为键）
+            os.utime(path, ns=(int(now * 1e9), stored.mtime_ns))
+        except OSError:
+            pass
+
+    def is_managed(self, directory: str) -> bool:
+        """目录是否为上传目录"""
+        return os.path.abspath(directory) == os.path.abspath(self.root)
+
+    def list_files(self) -> List[Dict[str, Any]]:
+        """从索引列出已保存的文件"""
+        with self._lock:
+            self._refresh_locked()
+            return [{
+                "name": stored.name,
+                "path": os.path.join(self.root, stored.name),
+                "size": stored.size,
+                "mtime": stored.mtime_ns / 1e9,
+                "last_access": stored.last_access
+            } for stored in self._files.values()]
+
+    def find_by_digest(self, digest: str) -> Optional[str]:
+        """按内容哈希查找已保存的文件"""
+        with self._lock:
+            return self._find_by_digest_locked(digest)
+
+    def _find_by_digest_locked(self, digest: str) -> Optional[str]:
+        path = self._by_digest.get(digest[:DIGEST_PREFIX_LENGTH])
+        if path is not None and not os.path.exists(path):
+            # 文件已被外部删除
+            self._scan_locked()
+            path = self._by_digest.get(digest[:DIGEST_PREFIX_LENGTH])
+        return path
+
+    # ---------- 容量和淘汰 ----------
+
+    def _evict_locked(self, incoming: int = 0, keep: Optional[str] = None) -> List[StoredFile]:
+        """按最近访问时间淘汰文件，直到加上预留字节和 incoming 字节后不超出预算，返回被淘汰的文件"""
+        evicted = []
+        for path in list(self._files):
+            if self._total_bytes + self._reserved_bytes + incoming <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            stored = self._files.pop(path)
+            self._total_bytes -= stored.size
+            if self._by_digest.get(stored.digest) == path:
+                del self._by_digest[stored.digest]
+            self.evictions += 1
+            self.evicted_bytes += stored.size
+            evicted.append(stored)
+        return evicted
+
+    def _remove_files(self, files: List[StoredFile]):
+        """删除被淘汰的文件，并使 footer 缓存、行索引和分析结果失效"""
+        for stored in files:
+            try:
+                os.remove(stored.path)
+            except OSError:
+                pass
+            parquet_file_cache.invalidate(stored.path)
+            page_cache.invalidate(stored.path)
+            remove_line_index(stored.path)
+            job_manager.invalidate(stored.path)
+        if files:
+            with self._lock:
+                try:
+                    self._root_mtime_ns = os.stat(self.root).st_mtime_ns
+                except OSError:
+                    pass
+
+    def reserve(self, upload_id: str, size: int):
+        """为即将上传的 size 字节腾出空间并记录预留，直到会话完成或放弃"""
+        if size > self.max_bytes:
+            raise UploadError(f"文件大小超出上传目录的容量 {self.max_bytes} 字节")
+        with self._lock:
+            if self._reserved_bytes + size > self.max_bytes:
+                raise UploadError(
+                    f"上传目录剩余容量不足：其他上传已预留 {self._reserved_bytes} 字节，请稍后重试")
+            evicted = self._evict_locked(incoming=size)
+            self._reserve_locked(upload_id, size)
+        self._remove_files(evicted)
+
+    def _reserve_locked(self, upload_id: str, size: int):
+        self._release_locked(upload_id)
+        self._reserved[upload_id] = size
+        self._reserved_bytes += size
+
+    def _release_locked(self, upload_id: str):
+        self._reserved_bytes -= self._reserved.pop(upload_id, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """上传目录统计信息"""
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self._total_bytes,
+                "reserved_bytes": self._reserved_bytes,
+                "max_bytes": self.max_bytes,
+                "active_uploads": len(self._sessions),
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes
+            }
+
+    # ---------- 分块上传 ----------
+
+    def create_session(self, filename: str, size: int) -> UploadSession:
+        """
+        创建上传会话
+
+        Args:
+            filename: 安全的文件名
+            size: 文件总大小，None 表示未知（一次性上传时写入完成后再确定）
+        """
+        if size is not None and size < 0:
+            raise UploadError("文件大小无效")
+        self.cleanup_expired()
+        upload_id = uuid.uuid4().hex
+        if size is not None:
+            self.reserve(upload_id, size)
+        session = UploadSession(self, upload_id, {
+            "filename": filename,
+            "size": size,
+            "created_at": time.time()
+        })
+        try:
+            open(session.data_path, 'wb').close()
+            session.save()
+        except OSError:
+            with self._lock:
+                self._release_locked(upload_id)
+            raise
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get_session(self, upload_id: str) -> Optional[UploadSession]:
+        """获取上传会话（进程重启后从 .partial 目录恢复）"""
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session
+            info_path = os.path.join(self.partial_dir, f"{upload_id}.json")
+            try:
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                return None
+            session = UploadSession(self, upload_id, info)
+            self._sessions[upload_id] = session
+            # 进程重启后恢复的会话重新计入预留
+            if session.size is not None:
+                self._reserve_locked(upload_id, session.size)
+            return session
+
+    def abort(self, upload_id: str) -> bool:
+        """放弃上传会话"""
+        session = self.get_session(upload_id)
+        if session is None:
+            return False
+        with session.lock:
+            session.remove()
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+            self._release_locked(upload_id)
+        return True
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """
+        完成上传：检查大小和 parquet footer，按内容哈希去重后移动到上传目录，超出预算时淘汰旧文件
+
+        Returns:
+            {"file_path", "original_name", "size", "sha256", "deduplicated"}
+        """
+        session = self.get_session(upload_id)
+        if session is None:
+            raise UploadError("上传会话不存在")
+
+        with session.lock:
+            received = session.received
+            if received != session.size:
+                raise UploadConflict(
+                    f"文件未上传完整：已接收 {received} / {session.size} 字节", received)
+
+            if session.is_parquet:
+                try:
+                    pq.read_metadata(session.data_path)
+                except Exception as e:
+                    self.abort(upload_id)
+                    raise UploadError(f"不是有效的 parquet 文件: {e}")
+
+            digest = session.digest()
+            with self._lock:
+                existing = self._find_by_digest_locked(digest)
+                deduplicated = existing is not None
+                if deduplicated:
+                    file_path = os.path.join(self.root, os.path.basename(existing))
+                else:
+                    file_path = os.path.join(
+                        self.root, f"{digest[:DIGEST_PREFIX_LENGTH]}_{session.filename}")
+                    shutil.move(session.data_path, file_path)
+                    self._add_locked(file_path)
+                session.remove()
+                self._sessions.pop(upload_id, None)
+                self._release_locked(upload_id)
+                evicted = self._evict_locked(keep=os.path.abspath(file_path))
+        self._remove_files(evicted)
+        if deduplicated:
+            self.touch(file_path)
+
+        return {
+            "file_path": file_path,
+            "original_name": session.filename,
+            "size": session.size,
+            "sha256": digest,
+            "deduplicated": deduplicated
+        }
+
+    def save_stream(self, filename: str, stream) -> Dict[str, Any]:
+        """一次性保存整个文件（兼容非分块上传），同样按内容哈希去重"""
+        session = self.create_session(filename, size=None)
+        try:
+            session.write_chunk(0, stream)
+            session.size = session.received
+            session.save()
+            return self.complete(session.id)
+        except Exception:
+            self.abort(session.id)
+            raise
+
+    def cleanup_expired(self):
+        """删除过期的未完成上传"""
+        deadline = time.time() - UPLOAD_SESSION_TTL
+        for info_path in glob.glob(os.path.join(glob.escape(self.partial_dir), '*.json')):
+            upload_id = os.path.basename(info_path)[:-len('.json')]
+            data_path = os.path.join(self.partial_dir, f"{upload_id}.part")
+            try:
+                # 以最后一次写入数据的时间为准
+                last_write = os.path.getmtime(data_path if os.path.exists(data_path) else info_path)
+            except OSError:
+                continue
+            if last_write < deadline:
+                self.abort(upload_id)